@@ -1,30 +1,86 @@
 import pygame
 import os
+import functools
+import hashlib
+import inspect
+import math
+
+try:
+    import numpy  # 任意: あればグラデーションや格子を配列で一度に書き込む
+except ImportError:
+    numpy = None
 
 # Amazonカラー
 AMAZON_ORANGE = (255, 153, 0)  # Amazon's orange color
 AMAZON_BLUE = (35, 47, 62)     # Amazon's dark blue color
 AMAZON_LIGHT_BLUE = (0, 119, 182)  # Amazon's light blue color
+AMAZON_LIGHT_ORANGE = (255, 184, 77)  # ボタンのホバー色
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
 
-def create_amazon_tile(size, number, font):
+# タイルアトラスの PNG キャッシュ
+ATLAS_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+
+# ウィンドウサイズを変えた時に作り直さずに済むよう、最近使った大きさを保持する
+SCALE_CACHE_SIZE = 8
+BACKGROUND_STEP = 256  # 背景はこの単位で切り上げた大きさで作る
+
+def get_bezier_points(start_pos, control_point, end_pos):
     """
-    Amazonスタイルのタイルを作成する
+    二次ベジェ曲線上の 21 点 (t = 0, 0.05, ..., 1)
+    """
+    if numpy is not None:
+        t = numpy.arange(0, 101, 5) / 100
+        x = (1-t)**2 * start_pos[0] + 2*(1-t)*t * control_point[0] + t**2 * end_pos[0]
+        y = (1-t)**2 * start_pos[1] + 2*(1-t)*t * control_point[1] + t**2 * end_pos[1]
+        return list(zip(x.astype(int).tolist(), y.astype(int).tolist()))
+
+    points = []
+    for t in range(0, 101, 5):
+        t = t / 100
+        # 二次ベジェ曲線の計算
+        x = (1-t)**2 * start_pos[0] + 2*(1-t)*t * control_point[0] + t**2 * end_pos[0]
+        y = (1-t)**2 * start_pos[1] + 2*(1-t)*t * control_point[1] + t**2 * end_pos[1]
+        points.append((int(x), int(y)))
+    return points
+
+def create_tile_base(size):
+    """
+    番号以外のタイルの見た目 (グラデーション・枠線・スマイル)。全タイルで共通
     """
-    # タイルのサーフェスを作成
     tile_surf = pygame.Surface((size, size))
 
     # グラデーション効果
-    for i in range(size):
-        color_value = 255 - int(i * 0.5)
-        if color_value < 0:
-            color_value = 0
-        pygame.draw.rect(tile_surf, (color_value, color_value, color_value), (0, i, size, 1))
+    if numpy is not None:
+        values = numpy.maximum(255 - (numpy.arange(size) * 0.5).astype(int), 0)
+        pixels = pygame.surfarray.pixels3d(tile_surf)
+        pixels[:] = values[numpy.newaxis, :, numpy.newaxis]  # surfarray は [x][y] の順
+        del pixels  # サーフェスのロックを解除
+    else:
+        for i in range(size):
+            color_value = 255 - int(i * 0.5)
+            if color_value < 0:
+                color_value = 0
+            pygame.draw.rect(tile_surf, (color_value, color_value, color_value), (0, i, size, 1))
 
     # タイルの枠線
     pygame.draw.rect(tile_surf, AMAZON_ORANGE, (0, 0, size, size), 2)
 
+    # Amazonスマイルのような曲線を描画 (数字の円とは重ならない)
+    start_pos = (size // 5, size * 3 // 4)
+    end_pos = (size * 4 // 5, size * 3 // 4)
+    control_point = (size // 2, size * 7 // 8)
+    pygame.draw.lines(tile_surf, AMAZON_ORANGE, False, get_bezier_points(start_pos, control_point, end_pos), 2)
+
+    return tile_surf
+
+def create_amazon_tile(size, number, font, base=None):
+    """
+    Amazonスタイルのタイルを作成する (base: create_tile_base() の結果を使い回す場合)
+    """
+    # タイルのサーフェスを作成
+    tile_surf = base.copy() if base is not None else create_tile_base(size)
+
     # 数字を描画
     if number is not None:
         text_surf = font.render(str(number), True, WHITE)
@@ -34,22 +90,6 @@ def create_amazon_tile(size, number, font):
         pygame.draw.circle(tile_surf, AMAZON_BLUE, (size // 2, size // 2), size // 4)
         tile_surf.blit(text_surf, text_rect)
 
-    # Amazonスマイルのような曲線を描画
-    start_pos = (size // 5, size * 3 // 4)
-    end_pos = (size * 4 // 5, size * 3 // 4)
-    control_point = (size // 2, size * 7 // 8)
-
-    points = []
-    for t in range(0, 101, 5):
-        t = t / 100
-        # 二次ベジェ曲線の計算
-        x = (1-t)**2 * start_pos[0] + 2*(1-t)*t * control_point[0] + t**2 * end_pos[0]
-        y = (1-t)**2 * start_pos[1] + 2*(1-t)*t * control_point[1] + t**2 * end_pos[1]
-        points.append((int(x), int(y)))
-
-    if len(points) > 1:
-        pygame.draw.lines(tile_surf, AMAZON_ORANGE, False, points, 2)
-
     return tile_surf
 
 def create_amazon_background(width, height):
@@ -60,6 +100,15 @@ def create_amazon_background(width, height):
     bg_surf.fill(AMAZON_BLUE)
 
     # 背景にAmazonスタイルのパターンを追加
+    if numpy is not None:
+        # 格子の画素だけを直接書き換える
+        pixels = pygame.surfarray.pixels2d(bg_surf)
+        line_color = bg_surf.map_rgb((45, 57, 72))
+        pixels[::20, :] = line_color
+        pixels[:, ::20] = line_color
+        del pixels
+        return bg_surf
+
     for i in range(0, width, 20):
         pygame.draw.line(bg_surf, (45, 57, 72), (i, 0), (i, height), 1)
 
@@ -68,12 +117,12 @@ def create_amazon_background(width, height):
 
     return bg_surf
 
-def create_amazon_button(width, height, text, font):
+def create_amazon_button(width, height, text, font, hover=False):
     """
-    Amazonスタイルのボタンを作成する
+    Amazonスタイルのボタンを作成する (hover=True でマウスが乗った時の見た目)
     """
     button_surf = pygame.Surface((width, height))
-    button_surf.fill(AMAZON_ORANGE)
+    button_surf.fill(AMAZON_LIGHT_ORANGE if hover else AMAZON_ORANGE)
 
     # ボタンの枠線
     pygame.draw.rect(button_surf, WHITE, (0, 0, width, height), 1)
@@ -102,16 +151,8 @@ def create_amazon_logo(width, height):
     end_pos = (width * 3 // 4, height * 2 // 3)
     control_point = (width // 2, height * 5 // 6)
 
-    points = []
-    for t in range(0, 101, 5):
-        t = t / 100
-        # 二次ベジェ曲線の計算
-        x = (1-t)**2 * start_pos[0] + 2*(1-t)*t * control_point[0] + t**2 * end_pos[0]
-        y = (1-t)**2 * start_pos[1] + 2*(1-t)*t * control_point[1] + t**2 * end_pos[1]
-        points.append((int(x), int(y)))
-
-    if len(points) > 1:
-        pygame.draw.lines(logo_surf, AMAZON_ORANGE, False, points, 2)
+    points = get_bezier_points(start_pos, control_point, end_pos)
+    pygame.draw.lines(logo_surf, AMAZON_ORANGE, False, points, 2)
 
     # 矢印
     arrow_start = points[0]
@@ -119,3 +160,125 @@ def create_amazon_logo(width, height):
     pygame.draw.line(logo_surf, AMAZON_ORANGE, arrow_start, arrow_end, 2)
 
     return logo_surf
+
+def convert_surface(surface):
+    """
+    表示用のピクセル形式に変換する (画面がまだ無い場合はそのまま返す)
+    """
+    if pygame.display.get_surface() is None:
+        return surface
+    if surface.get_flags() & pygame.SRCALPHA:
+        return surface.convert_alpha()
+    return surface.convert()
+
+def get_style_hash(size, count, font_name, font_size):
+    """
+    タイルの見た目を決めるもの (描画コード・色・サイズ・フォント) のハッシュ
+    同じフォント名でも実際のファイルが変わることがあるので、解決したパスも含める
+    (numpy の有無では画素は変わらない: test_amazon_style.py で確認)
+    """
+    key = repr((size, count, font_name, pygame.font.match_font(font_name), font_size, pygame.version.ver,
+                AMAZON_ORANGE, AMAZON_BLUE, WHITE,
+                inspect.getsource(create_tile_base), inspect.getsource(create_amazon_tile)))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+class TileAtlas:
+    """
+    全タイルを 1 枚のサーフェスに並べたアトラス (タイル番号 1 から count - 1)
+    """
+
+    def __init__(self, surface, size, count):
+        self.surface = surface
+        self.size = size
+        self.columns = math.ceil(math.sqrt(count))
+        self.rects = {}
+        for number in range(1, count):
+            row, column = divmod(number - 1, self.columns)
+            self.rects[number] = pygame.Rect(column * size, row * size, size, size)
+
+    def blit(self, target, number, position):
+        target.blit(self.surface, position, self.rects[number])
+
+    def get_tile(self, number):
+        # The tile as a subsurface sharing the atlas pixels
+        return self.surface.subsurface(self.rects[number])
+
+def create_tile_atlas(size, count, font):
+    """
+    タイルを順に描いてアトラスを作る
+    """
+    columns = math.ceil(math.sqrt(count))
+    rows = math.ceil((count - 1) / columns)
+    atlas_surf = pygame.Surface((columns * size, max(1, rows) * size))
+    atlas = TileAtlas(atlas_surf, size, count)
+    base = create_tile_base(size)
+    for number, rect in atlas.rects.items():
+        atlas_surf.blit(create_amazon_tile(size, number, font, base), rect)
+    return atlas
+
+def load_tile_atlas(size, count, font_name='Arial', font_size=20, cache_dir=ATLAS_CACHE_DIR):
+    """
+    アトラスをキャッシュの PNG から読み込む (無ければ作って保存する)
+    """
+    path = None
+    if cache_dir:
+        path = os.path.join(cache_dir, f'tiles_{get_style_hash(size, count, font_name, font_size)}.png')
+    if path and os.path.exists(path):
+        try:
+            return TileAtlas(convert_surface(pygame.image.load(path)), size, count)
+        except pygame.error:
+            pass  # 壊れたキャッシュは作り直す
+
+    font = pygame.font.SysFont(font_name, font_size)
+    atlas = create_tile_atlas(size, count, font)
+    if path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            pygame.image.save(atlas.surface, path)
+        except (OSError, pygame.error):
+            pass  # キャッシュできなくても表示には影響しない
+    return TileAtlas(convert_surface(atlas.surface), size, count)
+
+@functools.lru_cache(maxsize=SCALE_CACHE_SIZE)
+def get_font(size, bold=False):
+    """
+    大きさごとの Arial フォント
+    """
+    return pygame.font.SysFont('Arial', size, bold=bold)
+
+@functools.lru_cache(maxsize=SCALE_CACHE_SIZE)
+def get_tile_atlas(size, count, font_size=20):
+    """
+    大きさごとのタイルアトラス (最近使った大きさはメモリに残る)
+    """
+    return load_tile_atlas(size, count, font_size=font_size)
+
+def get_background(width, height):
+    """
+    背景は格子模様なので、切り上げた大きさで作ったものを左上から使う
+    """
+    return _get_background(-(-width // BACKGROUND_STEP) * BACKGROUND_STEP,
+                           -(-height // BACKGROUND_STEP) * BACKGROUND_STEP)
+
+@functools.lru_cache(maxsize=SCALE_CACHE_SIZE)
+def _get_background(width, height):
+    return convert_surface(create_amazon_background(width, height))
+
+@functools.lru_cache(maxsize=SCALE_CACHE_SIZE * 8)
+def get_button(width, height, text, font_size, hover=False):
+    """
+    大きさごとのボタン (表示用の形式に変換済み)
+    """
+    return convert_surface(create_amazon_button(width, height, text, get_font(font_size), hover))
+
+@functools.lru_cache(maxsize=SCALE_CACHE_SIZE)
+def get_logo(width, height):
+    return convert_surface(create_amazon_logo(width, height))
+
+def clear_caches():
+    """
+    フォントと表示用サーフェスのキャッシュを捨てる
+    pygame を終了したり画面を作り直したりすると古いセッションのものは使えない
+    """
+    for cached in (get_font, get_tile_atlas, _get_background, get_button, get_logo):
+        cached.cache_clear()
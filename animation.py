@@ -0,0 +1,92 @@
+from collections import deque
+
+# 時間ベースのスライドアニメーション (pygame には依存しない)
+# The game applies every move to its board immediately; the animator keeps a
+# separate visual copy that catches up with the queued moves as time passes.
+# A queued slide may shift several tiles of a row or column; they all move
+# together in one animation.
+
+MAX_PENDING = 8
+
+
+class SlideAnimator:
+    # Plays queued moves on a visual copy of the board, driven by elapsed time
+
+    def __init__(self, board, max_pending=MAX_PENDING):
+        self.board = board.copy()
+        self.queue = deque()
+        self.current = None  # (move, duration, message, count)
+        self.progress = 0.0
+        # With more than max_pending queued moves playback speeds up in
+        # proportion, so several moves can complete within one frame
+        self.max_pending = max_pending
+
+    def reset(self, board):
+        # Drop pending animations and show board as it is
+        self.board = board.copy()
+        self.queue.clear()
+        self.current = None
+        self.progress = 0.0
+
+    def push(self, move, duration, message='', count=1):
+        # Queue a slide of count tiles that takes duration seconds
+        self.queue.append((move, duration, message, count))
+
+    @property
+    def busy(self):
+        return self.current is not None or bool(self.queue)
+
+    @property
+    def message(self):
+        # Message attached to the move being animated
+        if self.current is None:
+            return ''
+        return self.current[2]
+
+    def motion(self):
+        # (((from_index, to_index), ...), progress) of the tiles in flight, or None
+        if self.current is None:
+            return None
+        move, duration, message, count = self.current
+        return (self.board.get_slide_indexes(move, count), self.progress)
+
+    def _finish_current(self):
+        self.board.apply_slide(self.current[0], self.current[3])
+        self.current = None
+        self.progress = 0.0
+
+    def finish(self):
+        # Fast-forward: apply every pending move at once
+        if self.current is not None:
+            self._finish_current()
+        while self.queue:
+            move, duration, message, count = self.queue.popleft()
+            self.board.apply_slide(move, count)
+
+    def update(self, elapsed):
+        # Advance the animation by elapsed seconds; returns True if anything moved
+        if not self.busy:
+            return False
+
+        # 手が溜まっている時は速度を上げ、1 フレームで複数の手を進める
+        if self.max_pending and len(self.queue) > self.max_pending:
+            elapsed *= len(self.queue) / self.max_pending
+
+        while True:
+            if self.current is None:
+                if not self.queue:
+                    break
+                self.current = self.queue.popleft()
+                self.progress = 0.0
+            duration = self.current[1]
+            if duration <= 0:
+                self._finish_current()
+                continue
+            step = elapsed / duration
+            if self.progress + step < 1.0:
+                self.progress += step
+                break
+            # The tile arrives during this frame; carry the rest of the time over
+            elapsed -= (1.0 - self.progress) * duration
+            self._finish_current()
+        return True
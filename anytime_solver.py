@@ -0,0 +1,218 @@
+import argparse
+import heapq
+import itertools
+import sys
+import time
+
+import puzzle_core
+import solver
+from puzzle_core import ALL_MOVES, OPPOSITE_CODES, PuzzleState
+
+# 時間内に解を改善し続ける (anytime) ソルバー
+#
+# Weighted A* (f = g + w * h) finds a solution after a small fraction of the
+# nodes an optimal search needs; it is at most w times longer than optimal,
+# in practice much closer. ARA* then lowers w and carries on with the same
+# boards and g-values: the open list plus the boards whose g improved after
+# they were expanded are re-keyed, so each pass only repairs what the smaller
+# weight changes. Every shorter solution is reported through a callback as
+# soon as the goal is generated, together with a proven lower bound on the
+# optimal length (the smallest g + h still open). Passes with the last weight
+# (1, plain A*) repeat until that bound reaches the best length, which is
+# then optimal; a time budget or a node limit stops earlier with the best
+# solution so far.
+
+# 2.5: about 10ms and 1.4x optimal for the first 4x4 solution, 1.15x after 0.2s
+WEIGHTS = (2.5, 2.0, 1.5, 1.25, 1.1, 1.0)
+MAX_NODES = 2000000    # boards kept in memory before giving up on improving (after a first solution)
+CHECK_MASK = 255       # time and cancel checks once every CHECK_MASK + 1 expansions
+
+
+class AnytimeSolver:
+    # ARA*: solutions that get shorter until the time budget runs out
+
+    def __init__(self, heuristic=None, weights=WEIGHTS, max_nodes=MAX_NODES):
+        self.heuristic = heuristic
+        self.weights = weights
+        self.max_nodes = max_nodes
+        self.nodes = 0          # boards expanded
+        self.weight = 0.0       # weight of the current pass
+        self.lower_bound = 0    # proven lower bound on the optimal length
+        self.optimal = False    # the best solution is proven shortest
+        self.solutions = []     # (seconds, length) of each improvement
+        self.elapsed = 0.0
+        self.cancelled = False
+
+    def cancel(self):
+        # Stop a running solve (safe to call from another thread)
+        self.cancelled = True
+
+    def check_cancelled(self):
+        # Called periodically during the search (also a hook for progress)
+        if self.cancelled:
+            raise solver.SolverCancelled()
+
+    def solve(self, state, budget=None, callback=None):
+        # Return the best move list found. budget (seconds, None for no limit)
+        # and max_nodes only apply once there is a solution, so one is always
+        # returned;
+        # callback(moves, lower_bound) is called with every shorter solution
+        if isinstance(state, list):
+            state = PuzzleState.from_columns(state)
+        if not state.is_solvable():
+            raise ValueError('puzzle is not solvable')
+        heuristic = self.heuristic
+        if heuristic is None:
+            heuristic = solver.get_heuristic(state.width, state.height)
+        child_info = heuristic.child_info
+        table = puzzle_core.get_move_table(state.width, state.height)
+
+        start = time.perf_counter()
+        deadline = None if budget is None else start + budget
+        self.nodes = 0
+        self.solutions = []
+        self.optimal = False
+
+        root = bytes(state.tiles)
+        h, lines = heuristic.root_info(root)
+        self.lower_bound = h
+        if h == 0:
+            self.optimal = True
+            self.elapsed = time.perf_counter() - start
+            return []
+        # board -> (g, h, parent board, move code from the parent, blank
+        # index, the heuristic's keys for updating h incrementally)
+        info = {root: (0, h, None, 4, state.blank, lines)}
+        best = None        # length of the best solution
+        best_moves = None
+        open_boards = {root}
+        closed = set()
+        incons = set()
+
+        try:
+            for number in itertools.count():
+                # 重みを使い切ったら最後の重みで繰り返す (h が無矛盾でなくても最短に届く)
+                weight = self.weights[min(number, len(self.weights) - 1)]
+                self.weight = weight
+                # 開いている盤面と改善された盤面を新しい重みで並べ直す
+                heap = []
+                for board in open_boards | incons:
+                    g, h = info[board][:2]
+                    if best is None or g + h < best:
+                        heap.append((g + weight * h, -g, board))
+                heapq.heapify(heap)
+                closed = set()
+                incons = set()
+
+                while heap:
+                    key, negative_g, board = heap[0]
+                    if best is not None and key >= best:
+                        break
+                    heapq.heappop(heap)
+                    g, h, parent, last, blank, lines = info[board]
+                    if g != -negative_g or board in closed:
+                        continue  # 古いエントリ
+                    closed.add(board)
+                    self.nodes += 1
+                    if not self.nodes & CHECK_MASK:
+                        self.check_cancelled()
+                        # 最初の解が見つかるまでは時間・メモリの上限を適用しない
+                        if best is not None:
+                            if deadline is not None and time.perf_counter() > deadline:
+                                return best_moves
+                            if len(info) > self.max_nodes:
+                                return best_moves
+
+                    child_g = g + 1
+                    for code, target in enumerate(table[blank]):
+                        if target < 0 or code == OPPOSITE_CODES[last]:
+                            continue
+                        tiles = bytearray(board)
+                        tiles[blank] = tiles[target]
+                        tiles[target] = 0
+                        child = bytes(tiles)
+                        old = info.get(child)
+                        if old is None:
+                            child_h, child_lines = child_info(h, lines, tiles[blank], blank, target)
+                        elif old[0] <= child_g:
+                            continue
+                        else:
+                            child_h, child_lines = old[1], old[5]
+                        info[child] = (child_g, child_h, board, code, target, child_lines)
+                        if child_h == 0:
+                            # ゴールは生成した時点で報告する
+                            if best is None or child_g < best:
+                                best = child_g
+                                best_moves = self._get_moves(info, child)
+                                self.solutions.append((time.perf_counter() - start, best))
+                                if callback is not None:
+                                    callback(best_moves, self.lower_bound)
+                            continue
+                        if best is not None and child_g + child_h >= best:
+                            continue  # h is admissible: no shorter solution through it
+                        if child in closed:
+                            incons.add(child)
+                        else:
+                            heapq.heappush(heap, (child_g + weight * child_h, -child_g, child))
+
+                # 残った盤面の g + h の最小値が最短手数の下界になる
+                open_boards = {board for key, negative_g, board in heap if info[board][0] == -negative_g}
+                open_boards -= closed
+                lower = best
+                for board in open_boards | incons:
+                    g, h = info[board][:2]
+                    if g + h < lower:
+                        lower = g + h
+                self.lower_bound = max(self.lower_bound, lower)
+                if self.lower_bound >= best:
+                    self.optimal = True
+                    break
+                if deadline is not None and time.perf_counter() > deadline:
+                    break
+        finally:
+            self.elapsed = time.perf_counter() - start
+        return best_moves
+
+    @staticmethod
+    def _get_moves(info, board):
+        # Moves from the root to board along the parent links
+        codes = []
+        while True:
+            parent, code = info[board][2:4]
+            if parent is None:
+                break
+            codes.append(code)
+            board = parent
+        return [ALL_MOVES[code] for code in reversed(codes)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Solve boards with anytime weighted A* and show each improvement')
+    parser.add_argument('boards', nargs='*', help='boards as row-major tiles (default: one per line on stdin)')
+    parser.add_argument('--korf', help="Korf 15-puzzle instances instead, e.g. '1-10,55'")
+    parser.add_argument('--budget', type=float, default=1.0, help='seconds to keep improving')
+    parser.add_argument('--weights', default=','.join(map(str, WEIGHTS)), help='weights of the passes')
+    args = parser.parse_args(argv)
+
+    if args.korf:
+        import benchmark
+        instances = benchmark.load_korf()
+        numbers = set(benchmark.parse_korf(args.korf, instances))
+        states = [(f'korf {number} ({length})', state) for number, state, length in instances
+                  if number in numbers]
+    else:
+        lines = args.boards or [line for line in sys.stdin if line.strip()]
+        states = [(line.strip(), PuzzleState.from_text(line)) for line in lines]
+
+    weights = tuple(float(weight) for weight in args.weights.split(','))
+    for name, state in states:
+        search = AnytimeSolver(weights=weights)
+        moves = search.solve(state, args.budget)
+        steps = ', '.join(f'{length} at {seconds * 1000:.0f}ms' for seconds, length in search.solutions)
+        proof = 'optimal' if search.optimal else f'optimal >= {search.lower_bound}'
+        print(f'{name}: {len(moves)} moves ({proof}), {search.nodes} nodes in {search.elapsed:.2f}s: {steps}',
+              flush=True)
+
+
+if __name__ == '__main__':
+    main()
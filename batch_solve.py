@@ -0,0 +1,121 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import engines
+import puzzle_core
+import solver
+from puzzle_core import PuzzleState
+
+# 大量の盤面をまとめて解く (ウィンドウは開かない)
+# Boards are read one per line (the to_text() form, e.g. from generator.py)
+# and solved by a process pool. Results stream out as JSON Lines in input
+# order. The tables are built or loaded once in the parent before the pool
+# starts; pattern databases and state tables are memory-mapped read-only, so
+# every worker reads the same pages of the page cache instead of a copy.
+
+_size = None
+_slides = False
+
+
+def _init_worker(size, slides=False):
+    global _size, _slides
+    _size = size
+    _slides = slides
+
+
+def solve_line(item):
+    # Solve one input line; returns the JSON record as a dict
+    number, text = item
+    record = {'line': number}
+    try:
+        width, height = _size or (None, None)
+        state = PuzzleState.from_text(text, width, height)
+        record['board'] = state.to_text()
+        search = engines.create_solver(state.width, state.height)
+        start = time.perf_counter()
+        moves = search.solve(state)
+        record['seconds'] = round(time.perf_counter() - start, 6)
+        record['length'] = len(moves)
+        record['optimal'] = engines.is_optimal(state.width, state.height)
+        record['moves'] = puzzle_core.moves_to_text(moves)
+        if _slides:
+            # 同じ向きの手を行・列のスライドにまとめた形 ('L3UR2')
+            record['slides'] = puzzle_core.slides_to_text(puzzle_core.compress_moves(moves))
+        record['nodes'] = search.nodes
+    except Exception as e:
+        # 1 盤面の失敗でバッチ全体を止めない (どの入力か分かるよう元の行も残す)
+        record['input'] = text
+        record['error'] = str(e) or type(e).__name__
+    return record
+
+
+def read_boards(lines):
+    # (line number, text) for every non-empty, non-comment line
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield number, line
+
+
+def preload(width, height):
+    # Load (or build) the tables of one size before the workers fork
+    if engines.get_state_table(width, height) is None and engines.is_optimal(width, height):
+        solver.get_heuristic(width, height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Solve boards from a file or stdin, one per line, '
+                                                 'and print JSON Lines in input order')
+    parser.add_argument('input', nargs='?', help='board file (default: stdin)')
+    parser.add_argument('--size', type=puzzle_core.parse_size,
+                        help='board size, e.g. 4x4 (default: square boards by tile count)')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--chunksize', type=int, default=1, help='boards sent to a worker at a time')
+    parser.add_argument('--output', help='output file (default: stdout)')
+    parser.add_argument('--slides', action='store_true',
+                        help='also print the solution as multi-tile slides, e.g. L3UR2')
+    args = parser.parse_args(argv)
+
+    source = open(args.input) if args.input else sys.stdin
+    output = open(args.output, 'w') if args.output else sys.stdout
+    boards = read_boards(source)
+    try:
+        # 最初の盤面の大きさでテーブルを読み込んでおく
+        first = next(boards, None)
+        if first is None:
+            return
+        try:
+            state = PuzzleState.from_text(first[1], *(args.size or ()))
+            preload(state.width, state.height)
+        except ValueError:
+            pass
+        boards = itertools.chain([first], boards)
+
+        if args.jobs <= 1:
+            _init_worker(args.size, args.slides)
+            results = map(solve_line, boards)
+            pool = None
+        else:
+            pool = multiprocessing.Pool(args.jobs, _init_worker, (args.size, args.slides))
+            results = pool.imap(solve_line, boards, args.chunksize)
+        try:
+            for record in results:
+                output.write(json.dumps(record) + '\n')
+                output.flush()
+        finally:
+            if pool is not None:
+                pool.terminate()
+    finally:
+        if args.input:
+            source.close()
+        if args.output:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import generator
+import puzzle_core
+import solver
+import transposition
+from puzzle_core import PuzzleState
+
+# ベンチマーク (結果は JSON で保存してコミット間で比較する)
+# Every benchmark uses seeded inputs, so two runs on the same machine measure
+# the same work. Throughputs are the best of several rounds; the pygame ones
+# run on the dummy SDL video driver so no window is needed.
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+KORF_PATH = os.path.join(DATA_DIR, 'korf100.txt')
+ROUNDS = 5
+
+# Korf instances that solve in about a second each (optimal length <= 45)
+KORF_QUICK_MAX_LENGTH = 45
+
+
+def best_time(func, rounds=ROUNDS):
+    # Fastest wall time of several calls of func()
+    best = None
+    for i in range(rounds):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def random_move_sequence(count, rng):
+    # A valid move sequence from the solved 4x4 board (and the boards it visits)
+    state = PuzzleState()
+    return state.scramble(count, rng)
+
+
+def bench_moves(rng, count=20000):
+    # make_move/is_valid_move on list boards and PuzzleState.apply
+    moves = random_move_sequence(count, rng)
+
+    def list_moves():
+        board = puzzle_core.get_starting_board()
+        for move in moves:
+            if puzzle_core.is_valid_move(board, move):
+                puzzle_core.make_move(board, move)
+
+    def state_moves():
+        state = PuzzleState()
+        for move in moves:
+            if state.is_valid_move(move):
+                state.apply(move)
+
+    return {
+        'list_moves_per_second': round(count / best_time(list_moves)),
+        'state_moves_per_second': round(count / best_time(state_moves)),
+    }
+
+
+def bench_blank_position(rng, count=20000):
+    states = [generator.uniform_state(rng=rng) for i in range(100)]
+    boards = [state.to_columns() for state in states]
+    repeat = count // len(boards)
+
+    def list_blank():
+        for i in range(repeat):
+            for board in boards:
+                puzzle_core.get_blank_position(board)
+
+    def state_blank():
+        for i in range(repeat):
+            for state in states:
+                state.get_blank_position()
+
+    return {
+        'list_calls_per_second': round(repeat * len(boards) / best_time(list_blank)),
+        'state_calls_per_second': round(repeat * len(states) / best_time(state_blank)),
+    }
+
+
+def create_game():
+    # A SlidingPuzzle on the dummy video driver; close it after use
+    import main
+    return main, main.SlidingPuzzle(headless=True)
+
+
+def bench_generate(rng, count=200):
+    main, game = create_game()
+    random.seed(rng.random())
+
+    def generate():
+        for i in range(count):
+            game.generate_new_puzzle(main.SCRAMBLE_MOVES)
+
+    try:
+        return {'generate_ms': round(best_time(generate) * 1000 / count, 4)}
+    finally:
+        game.close()
+
+
+def bench_draw(rng, count=100):
+    main, game = create_game()
+    random.seed(rng.random())
+    game.generate_new_puzzle(main.SCRAMBLE_MOVES)
+
+    def draw():
+        for i in range(count):
+            game.draw_board('Solving...')
+
+    def refresh():
+        # Full-window redraws including display updates
+        for i in range(count):
+            game.invalidate()
+            game.refresh('Solving...')
+
+    try:
+        return {
+            'draw_board_ms': round(best_time(draw) * 1000 / count, 4),
+            'full_refresh_ms': round(best_time(refresh) * 1000 / count, 4),
+        }
+    finally:
+        game.close()
+
+
+def load_korf(path=KORF_PATH):
+    # [(number, PuzzleState, optimal length)] converted to this repo's goal
+    instances = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip() or line.startswith('#'):
+                continue
+            values = [int(value) for value in line.split()]
+            instances.append((len(instances) + 1, from_korf(values[:16]), values[16]))
+    return instances
+
+
+def from_korf(tiles):
+    # Korf's goal has the blank top-left; turning the board by 180 degrees
+    # and renumbering tile t as 16 - t maps it onto ours (lengths unchanged)
+    count = len(tiles)
+    converted = [0] * count
+    for index, tile in enumerate(tiles):
+        converted[count - 1 - index] = count - tile if tile else 0
+    return PuzzleState(converted, 4, 4)
+
+
+def parse_korf(text, instances):
+    # 'quick', 'all' or numbers and ranges such as '1-10,55'
+    if text == 'all':
+        return [number for number, state, length in instances]
+    if text == 'quick':
+        return [number for number, state, length in instances if length <= KORF_QUICK_MAX_LENGTH]
+    numbers = []
+    for part in text.split(','):
+        first, _, last = part.partition('-')
+        numbers.extend(range(int(first), int(last or first) + 1))
+    return numbers
+
+
+def bench_solver(numbers, report=print, table_bytes=0, pruner_length=0):
+    # IDA* time and nodes on Korf instances (uses pdb/4x4.pdb when present),
+    # optionally with a transposition table and a move pruner
+    instances = {number: (state, length) for number, state, length in load_korf()}
+    table = transposition.TranspositionTable(4, 4, table_bytes) if table_bytes else None
+    pruner = transposition.get_move_pruner(pruner_length) if pruner_length else None
+    results = []
+    for number in numbers:
+        state, length = instances[number]
+        if table is not None:
+            table.clear()
+        search = solver.IDAStarSolver(table=table, pruner=pruner)
+        moves = search.solve(state)
+        result = {'instance': number, 'length': len(moves), 'optimal': length,
+                  'nodes': search.nodes, 'seconds': round(search.elapsed, 4)}
+        line = f'  korf {number}: {len(moves)} moves, {search.nodes} nodes, {search.elapsed:.2f}s'
+        if table is not None:
+            result['table_hit_rate'] = round(table.stats()['hit_rate'], 4)
+            line += f", table hit rate {result['table_hit_rate']:.1%}"
+        if len(moves) != length:
+            result['error'] = 'length differs from the published optimum'
+        results.append(result)
+        report(line)
+    summary = {
+        'heuristic': type(solver.get_heuristic(4, 4)).__name__,
+        'total_nodes': sum(result['nodes'] for result in results),
+        'total_seconds': round(sum(result['seconds'] for result in results), 4),
+        'instances': results,
+    }
+    if table is not None:
+        summary['table_bytes'] = table.get_size_bytes()
+    if pruner is not None:
+        summary['pruner_states'] = len(pruner)
+    return summary
+
+
+def get_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return None
+
+
+def compare(old, new, report=print):
+    # Print the relative change of every numeric result
+    for name, values in new['results'].items():
+        for key, value in values.items():
+            previous = old.get('results', {}).get(name, {}).get(key)
+            if isinstance(value, (int, float)) and isinstance(previous, (int, float)) and previous:
+                report(f'{name}.{key}: {previous} -> {value} ({(value - previous) / previous:+.1%})')
+
+
+BENCHMARKS = ('moves', 'blank', 'generate', 'draw', 'solver')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the benchmark suite and save the results as JSON')
+    parser.add_argument('names', nargs='*', metavar='name',
+                        help=f'benchmarks to run (default: all of {", ".join(BENCHMARKS)})')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--korf', default='quick', help="Korf instances: quick, all or e.g. '1-10,55'")
+    parser.add_argument('--table-mb', type=float, default=0,
+                        help='solver: transposition table of this many MiB (default: none)')
+    parser.add_argument('--pruner-length', type=int, default=0,
+                        help='solver: move pruner for duplicate sequences up to this length (default: none)')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='results of an earlier run to compare with')
+    args = parser.parse_args(argv)
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error(f'unknown benchmark {name!r}')
+
+    results = {}
+    for name in args.names or BENCHMARKS:
+        rng = random.Random(args.seed)
+        print(f'{name}...', flush=True)
+        if name == 'moves':
+            results[name] = bench_moves(rng)
+        elif name == 'blank':
+            results[name] = bench_blank_position(rng)
+        elif name == 'generate':
+            results[name] = bench_generate(rng)
+        elif name == 'draw':
+            results[name] = bench_draw(rng)
+        elif name == 'solver':
+            results[name] = bench_solver(parse_korf(args.korf, load_korf()),
+                                         table_bytes=int(args.table_mb * (1 << 20)),
+                                         pruner_length=args.pruner_length)
+        summary = {key: value for key, value in results[name].items() if key != 'instances'}
+        print(f'  {summary}')
+
+    run = {
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'korf': args.korf,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(run, f, indent=2)
+            f.write('\n')
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), run)
+
+
+if __name__ == '__main__':
+    main()
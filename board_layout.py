@@ -0,0 +1,76 @@
+from puzzle_core import UP, DOWN, LEFT, RIGHT
+
+# 画面座標から盤面のマスやボタンを引く (pygame には依存しない)
+# A cell is found by integer division of the pointer offset from the board's
+# top-left corner. Buttons are registered in a coarse grid of screen buckets
+# when the layout changes, so a click or hover test only looks at the one or
+# two regions in the pointer's bucket, whatever the board or window size.
+
+BUCKET_SIZE = 32  # pixels per side of a region bucket
+
+
+class BoardLayout:
+    # Screen geometry of the board: tile size and top-left corner
+
+    def __init__(self, width, height, tile_size, left=0, top=0):
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.left = left
+        self.top = top
+
+    def cell_at(self, x, y):
+        # (tilex, tiley) under a window position, or None outside the board
+        tilex = (x - self.left) // self.tile_size
+        tiley = (y - self.top) // self.tile_size
+        if 0 <= tilex < self.width and 0 <= tiley < self.height:
+            return (tilex, tiley)
+        return None
+
+    def index_at(self, x, y):
+        # Row-major board index under a window position, or None
+        cell = self.cell_at(x, y)
+        if cell is None:
+            return None
+        return cell[1] * self.width + cell[0]
+
+    def left_top(self, tilex, tiley):
+        return (self.left + tilex * self.tile_size, self.top + tiley * self.tile_size)
+
+
+class RegionIndex:
+    # Named rectangles looked up by point through a bucket grid
+
+    def __init__(self, bucket_size=BUCKET_SIZE):
+        self.bucket_size = bucket_size
+        self.buckets = {}
+
+    def add(self, name, rect):
+        # rect: (left, top, width, height); later regions win where they overlap
+        left, top, width, height = rect
+        if width <= 0 or height <= 0:
+            return
+        size = self.bucket_size
+        entry = (name, left, top, left + width, top + height)
+        for bucket_y in range(top // size, (top + height - 1) // size + 1):
+            for bucket_x in range(left // size, (left + width - 1) // size + 1):
+                self.buckets.setdefault((bucket_x, bucket_y), []).insert(0, entry)
+
+    def find(self, x, y):
+        # Name of the region containing (x, y), or None
+        for name, left, top, right, bottom in self.buckets.get((x // self.bucket_size, y // self.bucket_size), ()):
+            if left <= x < right and top <= y < bottom:
+                return name
+        return None
+
+
+def get_slide(blank, cell):
+    # (move, count) that shifts every tile between cell and the blank one step
+    # toward the blank, or None unless they share a row or column
+    blankx, blanky = blank
+    tilex, tiley = cell
+    if tiley == blanky and tilex != blankx:
+        return (LEFT if tilex > blankx else RIGHT, abs(tilex - blankx))
+    if tilex == blankx and tiley != blanky:
+        return (UP if tiley > blanky else DOWN, abs(tiley - blanky))
+    return None
@@ -1,9 +1,9 @@
 import main
 
 def print_board(board):
-    for y in range(main.BOARD_SIZE):
+    for y in range(len(board[0])):
         row = []
-        for x in range(main.BOARD_SIZE):
+        for x in range(len(board)):
             value = board[x][y]
             if value is None:
                 row.append("None")
@@ -12,5 +12,10 @@ def print_board(board):
         print(' '.join(row))
 
 game = main.SlidingPuzzle()
-print('Solved board:')
-print_board(game.solved_board)
+try:
+    print('Solved board:')
+    print_board(game.solved_board)
+finally:
+    # ヒントの先読みで始まった探索とワーカーを止める
+    game.close()
+
@@ -0,0 +1,249 @@
+import argparse
+import multiprocessing
+import os
+import random
+import signal
+import time
+from collections import deque
+
+import engines
+import generator
+import solver
+import state_table
+import puzzle_core
+from puzzle_core import BOARD_SIZE, PuzzleState
+
+# 最短手数を指定したパズル生成 (pygame には依存しない)
+#
+# Shallow distances come from a backward BFS of the solved board. Deeper ones
+# solve a random board optimally and walk along the solution: the board that
+# is `distance` moves away from the goal on an optimal path is exactly
+# `distance` moves from solved. Boards are kept in per-distance pools so the
+# game can take one in constant time. An empty bucket is refilled in a
+# separate process (deep 4x4 distances can take minutes); until then the game
+# gets a random-walk board that is at most `distance` moves from solved.
+# Boards taken or generated by the game are written back to the pool file
+# on close, so the next launch continues where this one stopped.
+
+POOL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pools')
+BFS_MAX_DEPTH = 12
+REFILL_COUNT = 5   # boards a bucket is refilled to in the background
+
+_bfs_layers = {}
+
+
+def get_default_path(width, height=None):
+    if height is None:
+        height = width
+    return os.path.join(POOL_DIR, f'{width}x{height}.txt')
+
+
+def get_bfs_layers(width, height=None, max_depth=BFS_MAX_DEPTH):
+    # layers[d] = tile bytes of every board exactly d moves from solved
+    if height is None:
+        height = width
+    layers = _bfs_layers.get((width, height))
+    if layers is None or len(layers) <= max_depth:
+        start = PuzzleState(width=width, height=height)
+        layers = [[start.key()]]
+        seen = {start.key()}
+        for depth in range(max_depth):
+            layer = []
+            for key in layers[-1]:
+                state = PuzzleState(key, width, height)
+                for move in state.get_valid_moves():
+                    child = state.copy()
+                    child.apply(move)
+                    child_key = child.key()
+                    if child_key not in seen:
+                        seen.add(child_key)
+                        layer.append(child_key)
+            layers.append(layer)
+        _bfs_layers[(width, height)] = layers
+    return layers
+
+
+def board_at_distance(distance, width=BOARD_SIZE, height=None, rng=random, search=None):
+    # Return a board whose optimal solution is exactly distance moves
+    if height is None:
+        height = width
+    if width * height <= state_table.MAX_TILES:
+        # 小さな盤面は全状態テーブルから直接選ぶ
+        return state_table.StateTable.load_default(width, height).random_state(distance, rng)
+    if distance <= BFS_MAX_DEPTH:
+        layers = get_bfs_layers(width, height)
+        if distance >= len(layers) or not layers[distance]:
+            raise ValueError(f'no {width}x{height} board is {distance} moves from solved')
+        return PuzzleState(rng.choice(layers[distance]), width, height)
+    if not engines.is_optimal(width, height):
+        # 最短手数を求められない大きさでは深い距離の盤面を選べない
+        raise ValueError(f'no optimal solver for {width}x{height} boards beyond {BFS_MAX_DEPTH} moves')
+
+    if search is None:
+        search = solver.IDAStarSolver()
+    while True:
+        # ランダムウォークは浅くなりがちなので、深い距離は一様な盤面から探す
+        if distance <= width * height * 5 // 2:
+            state, sequence = generator.random_walk_state(distance * 2, width, height, rng)
+        else:
+            state = generator.uniform_state(width, height, rng)
+        solution = search.solve(state)
+        if len(solution) >= distance:
+            for move in solution[:len(solution) - distance]:
+                state.apply(move)
+            return state
+
+
+def _init_worker():
+    # pygame (SDL) in the forked game process turns SIGTERM into a quit
+    # event; restore the default so close() can stop a long search
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def _generate(distance, width, height, seed):
+    # Worker side of DifficultyPool.refill: tiles of one board (a ValueError
+    # is raised again by AsyncResult.get in collect)
+    return board_at_distance(distance, width, height, random.Random(seed)).key()
+
+
+class DifficultyPool:
+    # Precomputed boards grouped by optimal solution length
+
+    def __init__(self, width=BOARD_SIZE, height=None):
+        if height is None:
+            height = width
+        self.width = width
+        self.height = height
+        self.buckets = {}
+        self.path = None       # pool file the boards are saved back to on close
+        self.changed = False   # boards were taken or added since loading
+        self.failed = {}       # distance -> why no board can be generated for it
+        self._pool = None      # process generating boards for empty buckets
+        self._pending = {}     # distance -> AsyncResult of the board being generated
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.buckets.values())
+
+    def count(self, distance):
+        return len(self.buckets.get(distance, ()))
+
+    def add(self, distance, state):
+        self.buckets.setdefault(distance, deque()).append(state.key())
+        self.changed = True
+
+    def take(self, distance, rng=random):
+        # Pop a board from the pool: (state, exact). While the bucket is empty
+        # the board comes from a random walk of distance moves (exact is
+        # False) and the bucket is refilled in the background
+        self.collect()
+        bucket = self.buckets.get(distance)
+        if bucket:
+            state, exact = PuzzleState(bucket.popleft(), self.width, self.height), True
+            self.changed = True
+        else:
+            state, sequence = generator.random_walk_state(distance, self.width, self.height, rng)
+            exact = False
+        self.refill(distance, rng=rng)
+        return state, exact
+
+    def refill(self, distance, count=REFILL_COUNT, rng=random):
+        # Generate boards in the background until the bucket holds count
+        if distance in self._pending or distance in self.failed or self.count(distance) >= count:
+            return
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(1, _init_worker)
+        self._pending[distance] = self._pool.apply_async(
+            _generate, (distance, self.width, self.height, rng.getrandbits(64)))
+
+    def collect(self):
+        # Add the boards finished in the background; refills continue one at a time
+        for distance, result in list(self._pending.items()):
+            if not result.ready():
+                continue
+            del self._pending[distance]
+            try:
+                key = result.get()
+            except ValueError as e:
+                self.failed[distance] = str(e)
+                continue
+            self.add(distance, PuzzleState(key, self.width, self.height))
+            self.refill(distance)
+
+    def close(self):
+        # Stop the background generation and save the pool if it changed
+        self.collect()
+        if self.changed and self.path:
+            self.save(self.path)
+            self.changed = False
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        self._pending = {}
+
+    def fill(self, distance, count, rng=random, report=None):
+        # Generate boards until the bucket holds count of them
+        search = solver.IDAStarSolver()
+        while self.count(distance) < count:
+            start = time.perf_counter()
+            self.add(distance, board_at_distance(distance, self.width, self.height, rng, search))
+            if report is not None:
+                report(distance, self.count(distance), time.perf_counter() - start)
+
+    def save(self, path=None):
+        # One line per board: "<distance> <row-major tiles>"
+        if path is None:
+            path = get_default_path(self.width, self.height)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as f:
+            for distance in sorted(self.buckets):
+                for key in self.buckets[distance]:
+                    f.write(f'{distance} {" ".join(map(str, key))}\n')
+        return path
+
+    @classmethod
+    def load(cls, path=None, width=BOARD_SIZE, height=None):
+        # Read a pool file; returns an empty pool if the file does not exist
+        pool = cls(width, height)
+        if path is None:
+            path = get_default_path(pool.width, pool.height)
+        pool.path = path
+        if not os.path.exists(path):
+            return pool
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    distance, _, tiles = line.partition(' ')
+                    state = PuzzleState.from_text(tiles, pool.width, pool.height)
+                    pool.add(int(distance), state)
+        pool.changed = False
+        return pool
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build pools of puzzles by optimal solution length')
+    parser.add_argument('distances', type=int, nargs='+', help='optimal lengths, e.g. 30 45 60')
+    parser.add_argument('--count', type=int, default=20, help='boards per distance')
+    parser.add_argument('--size', type=puzzle_core.parse_size, default=(BOARD_SIZE, BOARD_SIZE),
+                        help='board size, e.g. 3 or 3x4')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--output', help='pool file (default: pools/<size>.txt)')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    path = args.output or get_default_path(*args.size)
+    pool = DifficultyPool.load(path, *args.size)
+
+    def report(distance, count, elapsed):
+        print(f'{distance} moves: {count}/{args.count} ({elapsed:.2f}s)', flush=True)
+
+    for distance in args.distances:
+        pool.fill(distance, args.count, rng, report)
+        pool.save(path)
+    print(f'{len(pool)} boards in {path}')
+
+
+if __name__ == '__main__':
+    main()
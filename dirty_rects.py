@@ -0,0 +1,40 @@
+import pygame
+
+# 画面の変化した領域だけを display.update() に渡すための管理クラス
+
+
+class DirtyRects:
+    # Collects the screen regions that changed since the last update
+
+    def __init__(self, bounds):
+        self.bounds = pygame.Rect(bounds)
+        self.rects = []
+        self.full = True
+
+    def add(self, rect):
+        rect = pygame.Rect(rect).clip(self.bounds)
+        if rect.width and rect.height:
+            self.rects.append(rect)
+
+    def add_all(self):
+        self.full = True
+
+    def __bool__(self):
+        return self.full or bool(self.rects)
+
+    def pop(self):
+        # Return merged dirty rects and start a new frame
+        if self.full:
+            rects = [self.bounds.copy()]
+        else:
+            rects = []
+            for rect in self.rects:
+                # 重なる矩形は一つにまとめる
+                index = rect.collidelist(rects)
+                while index != -1:
+                    rect = rect.union(rects.pop(index))
+                    index = rect.collidelist(rects)
+                rects.append(rect)
+        self.rects = []
+        self.full = False
+        return rects
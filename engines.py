@@ -0,0 +1,68 @@
+import os
+
+import anytime_solver
+import pattern_db
+import reduction_solver
+import solver
+import state_table
+
+# 盤面サイズに合わせてソルバーを選ぶ
+# Boards up to 3x3 are read from their full state table, and sizes up to 16
+# tiles with a pattern database in pdb/ are solved optimally by IDA*. Without
+# a database, Manhattan distance plus linear conflict is far too weak beyond
+# 9 tiles (a 3x5 or 2x8 board takes minutes), so every other size uses the
+# row/column reduction solver, which is not optimal but finishes in
+# milliseconds even at 8x8. When a quick answer matters more than the
+# shortest one, the IDA* sizes can use the anytime solver instead (see
+# create_anytime_solver).
+
+OPTIMAL_MAX_TILES = 16
+
+_tables = {}
+
+
+def is_optimal(width, height=None):
+    # True if solutions for this size are the shortest possible
+    if height is None:
+        height = width
+    if width * height <= state_table.MAX_TILES:
+        return True
+    # 9 枚より大きい盤面はパターンデータベースがある場合だけ最短で解ける
+    return width * height <= OPTIMAL_MAX_TILES and os.path.exists(pattern_db.get_default_path(width, height))
+
+
+def get_state_table(width, height=None):
+    # Shared state table for a small board (built on first use), or None
+    if height is None:
+        height = width
+    if width * height > state_table.MAX_TILES:
+        return None
+    if (width, height) not in _tables:
+        _tables[(width, height)] = state_table.StateTable.load_default(width, height)
+    return _tables[(width, height)]
+
+
+def create_solver(width, height=None, search_class=solver.IDAStarSolver):
+    # Solver for one board size; search_class is the optimal search engine
+    table = get_state_table(width, height)
+    if table is not None:
+        return table
+    if is_optimal(width, height):
+        return search_class()
+    # 最後に残る 3x3 以下の領域はテーブルで解く
+    return reduction_solver.ReductionSolver(solve)
+
+
+def create_anytime_solver(width, height=None, search_class=anytime_solver.AnytimeSolver):
+    # Anytime solver for the sizes IDA* would take long on, or None where
+    # create_solver is already fast (state tables and the reduction solver)
+    if height is None:
+        height = width
+    if width * height <= state_table.MAX_TILES or not is_optimal(width, height):
+        return None
+    return search_class()
+
+
+def solve(state):
+    # Return a list of moves that solves the board with the engine for its size
+    return create_solver(state.width, state.height).solve(state)
@@ -0,0 +1,103 @@
+import json
+import os
+import time
+from collections import deque
+
+# フレームごとの処理時間の計測 (pygame には依存しない)
+# The game loop calls mark(name) after each stage; the time since the
+# previous mark is charged to that stage. While disabled mark() returns at
+# once, so the calls can stay in the loop. Recorded frames can be written as
+# a Chrome trace (chrome://tracing or https://ui.perfetto.dev).
+
+PROFILE_ENV = 'PUZZLE_PROFILE'          # 1 enables profiling at start-up
+TRACE_ENV = 'PUZZLE_PROFILE_TRACE'      # trace file written when the game exits
+
+WINDOW_FRAMES = 120    # frames in the rolling statistics
+TRACE_FRAMES = 100000  # frames kept for the trace file
+
+
+def percentile(values, fraction):
+    # Nearest-rank percentile of a non-empty sequence
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+class FrameProfiler:
+    # Per-stage timings of the last frames
+
+    def __init__(self, enabled=False, window=WINDOW_FRAMES, trace_frames=TRACE_FRAMES):
+        self.enabled = enabled
+        self.frames = deque(maxlen=window)       # [(stage, seconds), ...] per frame
+        self.trace = deque(maxlen=trace_frames)  # (frame start, [(stage, seconds), ...])
+        self.frame_start = None
+        self.last_mark = None
+        self.stages = []
+
+    @classmethod
+    def from_environment(cls):
+        return cls(enabled=os.environ.get(PROFILE_ENV, '') not in ('', '0'))
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.frame_start = None
+        return self.enabled
+
+    def mark(self, stage):
+        # Charge the time since the previous mark (or frame start) to stage
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self.frame_start is None:
+            self.frame_start = self.last_mark = now
+        self.stages.append((stage, now - self.last_mark))
+        self.last_mark = now
+
+    def end_frame(self):
+        # Close the frame; the next mark starts a new one
+        if not self.enabled:
+            return
+        if self.stages:
+            self.frames.append(self.stages)
+            self.trace.append((self.frame_start, self.stages))
+        self.stages = []
+        self.frame_start = self.last_mark
+
+    def frame_times(self):
+        return [sum(seconds for stage, seconds in stages) for stages in self.frames]
+
+    def fps(self):
+        # Frames per second over the rolling window
+        total = sum(self.frame_times())
+        return len(self.frames) / total if total else 0.0
+
+    def stage_times(self, stage):
+        return [sum(seconds for name, seconds in stages if name == stage) for stages in self.frames]
+
+    def summary(self):
+        # {'frame': (p50, p95, p99), stage: (...)} in milliseconds
+        if not self.frames:
+            return {}
+        result = {}
+        names = ['frame'] + list(dict.fromkeys(name for stages in self.frames for name, seconds in stages))
+        for name in names:
+            values = self.frame_times() if name == 'frame' else self.stage_times(name)
+            result[name] = tuple(percentile(values, fraction) * 1000 for fraction in (0.5, 0.95, 0.99))
+        return result
+
+    def dump(self, path):
+        # Write the recorded frames as Chrome trace events (microseconds)
+        events = []
+        for number, (start, stages) in enumerate(self.trace):
+            position = start
+            duration = sum(seconds for stage, seconds in stages)
+            events.append({'name': 'frame', 'ph': 'X', 'pid': 0, 'tid': 0,
+                           'ts': round(start * 1e6, 1), 'dur': round(duration * 1e6, 1),
+                           'args': {'frame': number}})
+            for stage, seconds in stages:
+                events.append({'name': stage, 'ph': 'X', 'pid': 0, 'tid': 0,
+                               'ts': round(position * 1e6, 1), 'dur': round(seconds * 1e6, 1)})
+                position += seconds
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        return len(self.trace)
@@ -0,0 +1,62 @@
+import argparse
+import random
+import sys
+
+import puzzle_core
+from puzzle_core import BOARD_SIZE, PuzzleState
+
+# 描画なしでパズルを生成する (pygame には依存しない)
+
+# Generation modes
+RANDOM_WALK = 'walk'    # random non-reversing moves from the solved board
+UNIFORM = 'uniform'     # uniformly random over all solvable boards
+MODES = (RANDOM_WALK, UNIFORM)
+
+
+def random_walk_state(num_slides, width=BOARD_SIZE, height=None, rng=random):
+    # Return (state, sequence) after num_slides random moves from solved
+    state = PuzzleState(width=width, height=height)
+    sequence = state.scramble(num_slides, rng)
+    return state, sequence
+
+
+def uniform_state(width=BOARD_SIZE, height=None, rng=random):
+    # Return a board drawn uniformly from the solvable permutations
+    if height is None:
+        height = width
+    tiles = list(range(width * height))
+    rng.shuffle(tiles)
+    if not puzzle_core.is_solvable(tiles, width, height):
+        # 2 枚のタイルを入れ替えると偶奇が反転する (可解/不可解は 1 対 1 に対応)
+        first, second = [index for index, tile in enumerate(tiles) if tile][:2]
+        tiles[first], tiles[second] = tiles[second], tiles[first]
+    return PuzzleState(tiles, width, height)
+
+
+def generate(mode=RANDOM_WALK, num_slides=80, width=BOARD_SIZE, height=None, rng=random):
+    # Return (state, sequence); sequence is empty for uniform boards
+    if mode == RANDOM_WALK:
+        return random_walk_state(num_slides, width, height, rng)
+    if mode == UNIFORM:
+        return uniform_state(width, height, rng), []
+    raise ValueError(f'unknown generation mode: {mode!r}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Print random puzzles, one board per line')
+    parser.add_argument('count', type=int, nargs='?', default=1)
+    parser.add_argument('--mode', choices=MODES, default=UNIFORM)
+    parser.add_argument('--moves', type=int, default=80, help='random walk length')
+    parser.add_argument('--size', type=puzzle_core.parse_size, default=(BOARD_SIZE, BOARD_SIZE),
+                        help='board size, e.g. 4 or 5x3')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    for i in range(args.count):
+        state, sequence = generate(args.mode, args.moves, *args.size, rng=rng)
+        sys.stdout.write(state.to_text() + '\n')
+
+
+if __name__ == '__main__':
+    main()
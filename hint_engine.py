@@ -0,0 +1,98 @@
+from collections import deque
+
+import engines
+import solve_job
+from puzzle_core import get_opposite_move
+
+# ヒント: 現在の盤面から最適な次の一手を返す (pygame には依存しない)
+# The engine follows the player's moves with a cached optimal path. Moves
+# along the path just advance it. Any other move changes the distance by
+# exactly one, so undoing it and following the old path is at most two moves
+# too long: a single IDA* iteration at bound old - 1 tells whether a shorter
+# path exists. Searches run in the solver process, never in the game loop.
+# With prefetch the search of a new board starts right away, so the path is
+# usually cached before the first Hint press.
+
+
+class HintEngine:
+    # Keeps the next best move for the board the player is on
+
+    def __init__(self, state, prefetch=True):
+        self.job = None
+        self.prefetch = prefetch  # search every board, not only after the first hint
+        self.reset(state)
+
+    def reset(self, state):
+        # Start over on a new board (new puzzle, reset, solver animation)
+        self.cancel()
+        self.state = state.copy()
+        self.path = None          # optimal moves from state, once known
+        self.fallback = None      # a valid path that may be two moves too long
+        self.lower_bound = 0      # the optimal length is at least this
+        self.active = self.prefetch  # keep the path up to date (always, or after the first hint)
+        self.optimal = engines.is_optimal(state.width, state.height)
+        if self.active:
+            self.start()
+
+    def cancel(self):
+        if self.job is not None:
+            self.job.cancel()
+            self.job = None
+
+    def played(self, move):
+        # Follow a move the player made on the board
+        self.state.apply(move)
+        if self.path is not None and self.path and self.path[0] == move:
+            self.path.popleft()
+            return
+
+        self.cancel()
+        if self.optimal:
+            # 最短経路から外れた: 1 手戻して元の経路を辿る解が上限になる
+            undo = get_opposite_move(move)
+            if self.path is not None:
+                self.lower_bound = max(0, len(self.path) - 1)
+                self.fallback = [undo] + list(self.path)
+            elif self.fallback is not None:
+                self.lower_bound = max(0, self.lower_bound - 1)
+                self.fallback.insert(0, undo)
+        self.path = None
+        if self.active:
+            self.start()
+
+    def start(self):
+        # Search the path of the current board in the background
+        if self.job is not None or self.path is not None:
+            return
+        if self.fallback is not None:
+            self.job = solve_job.SolveJob(self.state, self.lower_bound, len(self.fallback) - 1)
+        else:
+            self.job = solve_job.SolveJob(self.state)
+
+    def poll(self):
+        # Collect a finished search; returns True once the path is known
+        job = self.job
+        if job is not None and job.done():
+            self.job = None
+            try:
+                moves = job.result()
+            except Exception as e:
+                print(f"Error during hint search: {e}")
+                moves = None
+            if moves is None:
+                # Nothing shorter than the fallback exists
+                moves = self.fallback
+            if moves is not None:
+                self.path = deque(moves)
+                self.fallback = None
+        return self.path is not None
+
+    def next_move(self):
+        # Optimal next move, or None while the search is still running
+        self.active = True
+        if not self.poll():
+            self.start()
+            return None
+        if not self.path:
+            return None
+        return self.path[0]
@@ -1,169 +1,297 @@
 import pygame
-import sys
-import random
+import os
+import time
+import argparse
+from collections import deque
 from pygame.locals import *
 import amazon_style
+import puzzle_core
+import solve_job
+import hint_engine
+import frame_profiler
+import dirty_rects
+import board_layout
+import move_log
+import animation
+import generator
+import difficulty_pool
+from puzzle_core import BOARD_SIZE, UP, DOWN, LEFT, RIGHT
 
 # Constants
-BOARD_SIZE = 4
-TILE_SIZE = 100
-WINDOW_WIDTH = BOARD_SIZE * TILE_SIZE
-WINDOW_HEIGHT = BOARD_SIZE * TILE_SIZE + 100  # Extra space for buttons and message
+TILE_SIZE = 100  # 大きな盤面ではタイルを縮めて MAX_BOARD_PIXELS に収める
+MAX_BOARD_PIXELS = 600
+MIN_WINDOW_WIDTH = 400  # Room for the four buttons and the logo
+MIN_WINDOW_HEIGHT = 240
+PANEL_HEIGHT = 100  # Extra space for buttons and message
+TILE_SIZE_STEP = 4  # Tile sizes are rounded down to this step when resizing
+UI_REFERENCE_HEIGHT = 500  # Buttons and text grow once the window is taller
+MAX_UI_SCALE = 3.0
+MIN_BOARD_SIZE = 2
+MAX_BOARD_SIZE = 8
 FPS = 30
 
-# Direction constants
-UP = 'up'
-DOWN = 'down'
-LEFT = 'left'
-RIGHT = 'right'
+# Puzzle generation
+SCRAMBLE_MOVES = 80
+GENERATION_MODE = generator.RANDOM_WALK
+ANIMATE_SCRAMBLE = False  # スクランブルの様子を見せる (演出のみ)
+MERGE_SLIDES = True  # 同じ向きに続く手は行・列ごと 1 回のスライドで再生する
+LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')  # --record without a file name
+REPLAY_SEEK = 100  # moves skipped by PageUp / PageDown during a replay
+# Solve plays the first solution at once and switches to shorter ones found
+# within this many seconds (None: wait for the shortest one)
+SOLVE_BUDGET = 1.0
+
+# Profiling overlay (F3 toggles it, F4 saves a trace)
+OVERLAY_INTERVAL = 15  # frames between overlay text updates
+TRACE_FILE = 'frame_trace.json'
 
 class SlidingPuzzle:
-    def __init__(self):
+    def __init__(self, generation_mode=GENERATION_MODE, animate_scramble=ANIMATE_SCRAMBLE,
+                 difficulty=None, width=BOARD_SIZE, height=None, record_path=None, headless=False):
+        if headless:
+            # 画面の無い環境 (CI など) では SDL のダミードライバーで動かす
+            os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+            os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
         pygame.init()
         self.clock = pygame.time.Clock()
-        self.display_surf = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+        self.render = True  # False skips all drawing (simulation)
+        self.message = ''
+        self.cursor_on_button = False
+        self.move_count = 0  # player moves over the whole session
+
+        # Board size is chosen at runtime; the first window size is derived from it
+        self.board_width = width
+        self.board_height = height or width
+        tile_size = min(TILE_SIZE, MAX_BOARD_PIXELS // max(self.board_width, self.board_height))
+        window_width = max(self.board_width * tile_size, MIN_WINDOW_WIDTH)
+        window_height = self.board_height * tile_size + PANEL_HEIGHT
+
+        # ウィンドウの大きさは自由に変えられる
+        amazon_style.clear_caches()
+        pygame.display.set_mode((window_width, window_height), pygame.RESIZABLE)
         pygame.display.set_caption('Amazon Sliding Puzzle')
-        self.basic_font = pygame.font.SysFont('Arial', 20)
-        self.title_font = pygame.font.SysFont('Arial', 30, bold=True)
+        self.pending_size = None  # new window size, applied once per frame
+        self.apply_layout(window_width, window_height)
+
+        # Dirty-rectangle rendering: what is currently on screen
+        self.drawn_tiles = None
+        self.drawn_motion = None
+        self.drawn_message = None
+        self.drawn_hover = None
+        self.drawn_hint = None
+
+        # フレーム時間の計測 (F3 または環境変数 PUZZLE_PROFILE=1 で有効)
+        self.profiler = frame_profiler.FrameProfiler.from_environment()
+        self.overlay_font = pygame.font.SysFont('Arial', 14)
+        self.overlay_lines = None
+        self.overlay_frame = 0
+        self.drawn_overlay = None
+
+        # Puzzle generation settings
+        self.generation_mode = generation_mode
+        self.animate_scramble = animate_scramble
+
+        # 最短手数を指定した場合は事前に生成したプールから出題する
+        self.difficulty = difficulty
+        self.difficulty_pool = None
+        if difficulty is not None:
+            self.difficulty_pool = difficulty_pool.DifficultyPool.load(
+                width=self.board_width, height=self.board_height)
+
+        # 手順の記録 (1 手 2 ビットでファイルに書き出す) と再生
+        self.move_log = None
+        if record_path:
+            self.move_log = move_log.MoveLogWriter(record_path, self.board_width, self.board_height)
+        self.replay = None  # moves and boards still to play back
+        self.replay_log = None
+        self.replay_item = None
+        self.replay_position = 0
+        self.replay_speed = 1.0
+
+        # Initialize board
+        self.solved_board = self.get_starting_board()
+        self.state = puzzle_core.PuzzleState(width=self.board_width, height=self.board_height)  # Initialize first
+        self.animator = animation.SlideAnimator(self.state)
+        self.all_moves = bytearray()  # the player's move codes since the last new board
+        self.solve_job = None
+        self.solve_plan = None  # move codes Solve still has to play (None: not solving)
+        self.solve_played = bytearray()  # codes played since Solve started, as a path
+        self.solve_best = None  # length of the best solution found by Solve
+        self.solve_lower = 0  # proven lower bound on the optimal length
+
+        # ヒント: 次に動かすと良いタイルを枠で示す
+        # 画面なしの実行では、ヒントを押すまでソルバーのプロセスを使わない
+        self.hint_engine = hint_engine.HintEngine(self.state, prefetch=not headless)
+        self.hint_index = None  # board index of the highlighted tile
+        self.hint_pending = False  # waiting for the hint search
+        self.state, self.solution_seq = self.generate_new_puzzle(SCRAMBLE_MOVES)
+
+    def apply_layout(self, window_width, window_height):
+        # Lay out the board, buttons and message for a window size. Surfaces
+        # come from per-size LRU caches, so sizes seen recently cost nothing
+        self.display_surf = pygame.display.get_surface()
+        self.window_width = window_width
+        self.window_height = window_height
+
+        # Buttons and text grow on large windows (in quarter steps)
+        scale = min(window_width / MIN_WINDOW_WIDTH, window_height / UI_REFERENCE_HEIGHT)
+        self.ui_scale = scale = min(MAX_UI_SCALE, max(1.0, int(scale * 4) / 4))
+        panel_height = round(PANEL_HEIGHT * scale)
+
+        # Largest tile size that fits, rounded down so dragging reuses sizes
+        tile_size = min(window_width // self.board_width,
+                        (window_height - panel_height) // self.board_height)
+        if tile_size > TILE_SIZE_STEP * 2:
+            tile_size -= tile_size % TILE_SIZE_STEP
+        self.tile_size = max(tile_size, 1)
+        self.board_left = (window_width - self.board_width * self.tile_size) // 2
+        self.board_top = (window_height - panel_height - self.board_height * self.tile_size) // 2
+        self.layout = board_layout.BoardLayout(self.board_width, self.board_height, self.tile_size,
+                                               self.board_left, self.board_top)
+
+        self.title_font = amazon_style.get_font(round(30 * scale), bold=True)
 
         # Amazon style background
-        self.background = amazon_style.create_amazon_background(WINDOW_WIDTH, WINDOW_HEIGHT)
+        self.background = amazon_style.get_background(window_width, window_height)
 
         # Button setup
-        button_width = 90  # 少し小さくして3つのボタンが等間隔で配置できるようにする
-        button_spacing = (WINDOW_WIDTH - (button_width * 3)) // 4  # 等間隔の計算
-        button_y = WINDOW_HEIGHT - 80  # ボタンの位置をさらに上にずらす
+        button_width = round(80 * scale)  # 少し小さくして4つのボタンが等間隔で配置できるようにする
+        button_height = round(30 * scale)
+        button_spacing = (window_width - (button_width * 4)) // 5  # 等間隔の計算
+        button_y = window_height - round(80 * scale)  # ボタンの位置をさらに上にずらす
+        font_size = round(20 * scale)
 
-        self.reset_button = amazon_style.create_amazon_button(button_width, 30, 'Reset', self.basic_font)
+        def button(text, hover=False):
+            # 画面のピクセル形式に変換済みのボタン
+            return amazon_style.get_button(button_width, button_height, text, font_size, hover)
+
+        self.reset_button = button('Reset')
         self.reset_rect = self.reset_button.get_rect(topleft=(button_spacing, button_y))
 
-        self.new_button = amazon_style.create_amazon_button(button_width, 30, 'New', self.basic_font)
+        self.new_button = button('New')
         self.new_rect = self.new_button.get_rect(topleft=(button_spacing * 2 + button_width, button_y))
 
-        self.solve_button = amazon_style.create_amazon_button(button_width, 30, 'Solve', self.basic_font)
+        self.solve_button = button('Solve')
         self.solve_rect = self.solve_button.get_rect(topleft=(button_spacing * 3 + button_width * 2, button_y))
 
+        self.hint_button = button('Hint')
+        self.hint_rect = self.hint_button.get_rect(topleft=(button_spacing * 4 + button_width * 3, button_y))
+
+        # クリックとホバーの判定はボタンの領域の索引で引く
+        self.button_rects = {'reset': self.reset_rect, 'new': self.new_rect, 'solve': self.solve_rect,
+                             'hint': self.hint_rect}
+        self.button_index = board_layout.RegionIndex()
+        for name, rect in self.button_rects.items():
+            self.button_index.add(name, rect)
+
+        # マウスが乗った時のボタン
+        self.hover_buttons = [
+            (button(text, hover=True), rect)
+            for text, rect in (('Reset', self.reset_rect), ('New', self.new_rect), ('Solve', self.solve_rect),
+                               ('Hint', self.hint_rect))
+        ]
+
+        # Message strip at the bottom of the window
+        message_height = round(55 * scale)
+        self.message_rect = pygame.Rect(0, window_height - message_height, window_width, message_height)
+
         # Amazon logo
-        self.logo = amazon_style.create_amazon_logo(100, 30)
-        self.logo_rect = self.logo.get_rect(topleft=(WINDOW_WIDTH - 110, WINDOW_HEIGHT - 30))
+        self.logo = amazon_style.get_logo(round(100 * scale), round(30 * scale))
+        self.logo_rect = self.logo.get_rect(topleft=(window_width - round(110 * scale),
+                                                     window_height - round(30 * scale)))
 
-        # Pre-generate tile images
-        self.tile_images = {}
-        for i in range(1, BOARD_SIZE * BOARD_SIZE):
-            self.tile_images[i] = amazon_style.create_amazon_tile(TILE_SIZE, i, self.basic_font)
+        # All tiles in one atlas surface (cached as a PNG under cache/)
+        self.tile_atlas = amazon_style.get_tile_atlas(self.tile_size, self.board_width * self.board_height,
+                                                      max(8, self.tile_size // 5))
 
-        # Initialize board
-        self.solved_board = self.get_starting_board()
-        self.main_board = self.get_starting_board()  # Initialize first
-        self.all_moves = []
-        self.main_board, self.solution_seq = self.generate_new_puzzle(80)
+        # Everything moved: redraw the whole window
+        self.dirty = dirty_rects.DirtyRects(self.display_surf.get_rect())
+        self.drawn_tiles = None
+
+    @property
+    def main_board(self):
+        # List-of-columns view of the current board
+        return self.state.to_columns()
+
+    @main_board.setter
+    def main_board(self, board):
+        self.state = puzzle_core.PuzzleState.from_columns(board)
+        self.animator.reset(self.state)
 
     def get_starting_board(self):
-        # Return a solved board - 左上から右へ、そして下へと1,2,3...と番号を振る
-        board = []
-        for x in range(BOARD_SIZE):
-            column = []
-            for y in range(BOARD_SIZE):
-                # 一番右下を空白にする
-                if x == BOARD_SIZE - 1 and y == BOARD_SIZE - 1:
-                    column.append(None)
-                else:
-                    # 左から右、上から下に1,2,3...と番号を振る
-                    # y*BOARD_SIZE + x + 1 は行優先で番号を振る
-                    number = y * BOARD_SIZE + x + 1
-                    column.append(number)
-            board.append(column)
-        return board
+        # Return a solved board
+        return puzzle_core.get_starting_board(self.board_width, self.board_height)
 
     def get_blank_position(self, board):
         # Return the position of the blank space
-        for x in range(BOARD_SIZE):
-            for y in range(BOARD_SIZE):
-                if board[x][y] is None:
-                    return (x, y)
-        return None
+        return puzzle_core.get_blank_position(board)
 
     def make_move(self, board, move):
         # Make the specified move
-        blankx, blanky = self.get_blank_position(board)
-
-        if move == UP:
-            board[blankx][blanky], board[blankx][blanky + 1] = board[blankx][blanky + 1], board[blankx][blanky]
-        elif move == DOWN:
-            board[blankx][blanky], board[blankx][blanky - 1] = board[blankx][blanky - 1], board[blankx][blanky]
-        elif move == LEFT:
-            board[blankx][blanky], board[blankx + 1][blanky] = board[blankx + 1][blanky], board[blankx][blanky]
-        elif move == RIGHT:
-            board[blankx][blanky], board[blankx - 1][blanky] = board[blankx - 1][blanky], board[blankx][blanky]
+        puzzle_core.make_move(board, move)
 
     def is_valid_move(self, board, move):
         # Check if the specified move is valid
-        blankx, blanky = self.get_blank_position(board)
-        return (move == UP and blanky != BOARD_SIZE - 1) or \
-               (move == DOWN and blanky != 0) or \
-               (move == LEFT and blankx != BOARD_SIZE - 1) or \
-               (move == RIGHT and blankx != 0)
+        return puzzle_core.is_valid_move(board, move)
 
     def get_random_move(self, board, last_move=None):
         # Get a random move (avoiding the opposite of the last move)
-        valid_moves = [UP, DOWN, LEFT, RIGHT]
-
-        # Remove the opposite of the last move
-        if last_move == UP or not self.is_valid_move(board, DOWN):
-            if DOWN in valid_moves:
-                valid_moves.remove(DOWN)
-        if last_move == DOWN or not self.is_valid_move(board, UP):
-            if UP in valid_moves:
-                valid_moves.remove(UP)
-        if last_move == LEFT or not self.is_valid_move(board, RIGHT):
-            if RIGHT in valid_moves:
-                valid_moves.remove(RIGHT)
-        if last_move == RIGHT or not self.is_valid_move(board, LEFT):
-            if LEFT in valid_moves:
-                valid_moves.remove(LEFT)
-
-        if not valid_moves:
-            return None
-
-        return random.choice(valid_moves)
+        return puzzle_core.get_random_move(board, last_move)
 
     def get_spot_clicked(self, x, y):
         # Get the tile clicked
-        for tilex in range(BOARD_SIZE):
-            for tiley in range(BOARD_SIZE):
-                left, top = self.get_left_top_of_tile(tilex, tiley)
-                tile_rect = pygame.Rect(left, top, TILE_SIZE, TILE_SIZE)
-                if tile_rect.collidepoint(x, y):
-                    return (tilex, tiley)
-        return (None, None)
+        return self.layout.cell_at(x, y) or (None, None)
 
     def get_left_top_of_tile(self, tilex, tiley):
         # Get the top left coordinates of a tile
-        left = tilex * TILE_SIZE
-        top = tiley * TILE_SIZE
-        return (left, top)
+        return self.layout.left_top(tilex, tiley)
+
+    def get_index_left_top(self, index):
+        # Top left coordinates of a row-major board index
+        tiley, tilex = divmod(index, self.board_width)
+        return self.get_left_top_of_tile(tilex, tiley)
 
-    def draw_board(self, message):
+    def draw_board(self, message, hover=None):
         # Draw the background
         self.display_surf.blit(self.background, (0, 0))
 
-        # Draw the board
-        for tilex in range(BOARD_SIZE):
-            for tiley in range(BOARD_SIZE):
-                if self.main_board and self.main_board[tilex][tiley]:
-                    left, top = self.get_left_top_of_tile(tilex, tiley)
-                    self.display_surf.blit(self.tile_images[self.main_board[tilex][tiley]], (left, top))
+        # Draw the board as the animation currently shows it
+        board = self.animator.board
+        motion = self.animator.motion()
+        moving = () if motion is None else [from_index for from_index, to_index in motion[0]]
+        for index, number in enumerate(board.tiles):
+            if number and index not in moving:
+                tiley, tilex = divmod(index, self.board_width)
+                left, top = self.get_left_top_of_tile(tilex, tiley)
+                self.tile_atlas.blit(self.display_surf, number, (left, top))
+
+        # Draw the sliding tiles between their cells
+        if motion is not None:
+            pairs, progress = motion
+            for from_index, to_index in pairs:
+                from_left, from_top = self.get_index_left_top(from_index)
+                to_left, to_top = self.get_index_left_top(to_index)
+                left = from_left + round((to_left - from_left) * progress)
+                top = from_top + round((to_top - from_top) * progress)
+                self.tile_atlas.blit(self.display_surf, board.tiles[from_index], (left, top))
+
+        # Highlight the hinted tile
+        if self.hint_index is not None:
+            left, top = self.get_index_left_top(self.hint_index)
+            pygame.draw.rect(self.display_surf, amazon_style.AMAZON_LIGHT_ORANGE,
+                             (left, top, self.tile_size, self.tile_size), 4)
 
         # Draw the board border
         left, top = self.get_left_top_of_tile(0, 0)
-        width = BOARD_SIZE * TILE_SIZE
-        height = BOARD_SIZE * TILE_SIZE
+        width = self.board_width * self.tile_size
+        height = self.board_height * self.tile_size
         pygame.draw.rect(self.display_surf, amazon_style.AMAZON_ORANGE, (left - 2, top - 2, width + 4, height + 4), 2)
 
         # Draw the message and logo
         if message:
             text_surf = self.title_font.render(message, True, amazon_style.AMAZON_ORANGE)
-            text_rect = text_surf.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT - 30))
+            text_y = self.window_height - round(30 * self.ui_scale)
+            text_rect = text_surf.get_rect(center=(self.window_width // 2, text_y))
 
             # 背景を追加して文字を見やすくする
             padding = 5
@@ -182,209 +310,534 @@ class SlidingPuzzle:
         self.display_surf.blit(self.reset_button, self.reset_rect)
         self.display_surf.blit(self.new_button, self.new_rect)
         self.display_surf.blit(self.solve_button, self.solve_rect)
-
-    def slide_animation(self, direction, message, animation_speed):
-        # Slide animation for tiles
-        blankx, blanky = self.get_blank_position(self.main_board)
-
-        # Check if the move is valid
-        if direction == UP and blanky >= BOARD_SIZE - 1:
-            return  # Invalid move
-        elif direction == DOWN and blanky <= 0:
-            return  # Invalid move
-        elif direction == LEFT and blankx >= BOARD_SIZE - 1:
-            return  # Invalid move
-        elif direction == RIGHT and blankx <= 0:
+        self.display_surf.blit(self.hint_button, self.hint_rect)
+        for button, rect in self.hover_buttons:
+            if rect == hover:
+                self.display_surf.blit(button, rect)
+
+        # Draw the profiling overlay on top of everything
+        if self.overlay_lines:
+            self.draw_overlay(self.overlay_lines)
+
+    def get_overlay_rect(self, lines):
+        return pygame.Rect(0, 0, self.window_width, 18 * len(lines) + 6)
+
+    def draw_overlay(self, lines):
+        # Semi-transparent strip with the frame statistics
+        rect = self.get_overlay_rect(lines)
+        shade = pygame.Surface(rect.size, pygame.SRCALPHA)
+        shade.fill(amazon_style.AMAZON_BLUE + (200,))
+        self.display_surf.blit(shade, rect)
+        for number, line in enumerate(lines):
+            text_surf = self.overlay_font.render(line, True, amazon_style.AMAZON_LIGHT_ORANGE)
+            self.display_surf.blit(text_surf, (6, 3 + 18 * number))
+
+    def update_overlay(self):
+        # Refresh the overlay text every OVERLAY_INTERVAL frames
+        if not self.profiler.enabled:
+            self.overlay_lines = None
+            return
+        self.overlay_frame += 1
+        if self.overlay_lines is not None and self.overlay_frame % OVERLAY_INTERVAL:
+            return
+        summary = self.profiler.summary()
+        lines = [f'FPS {self.profiler.fps():.1f}   p50 / p95 / p99 ms']
+        for name, (p50, p95, p99) in summary.items():
+            lines.append(f'{name}: {p50:.2f} / {p95:.2f} / {p99:.2f}')
+        self.overlay_lines = tuple(lines)
+
+    def save_trace(self, path=TRACE_FILE):
+        # Write the recorded frame timings and return the message to show
+        count = self.profiler.dump(path)
+        return f'Trace: {count} frames'
+
+    def invalidate(self):
+        # The whole window must be redrawn on the next refresh
+        self.drawn_tiles = None
+
+    def refresh(self, message, hover=None):
+        # Redraw and update only the regions that changed since the last frame
+        board = self.animator.board
+        motion = self.animator.motion()
+        if self.drawn_tiles is None:
+            self.dirty.add_all()
+        else:
+            for index, (old, new) in enumerate(zip(self.drawn_tiles, board.tiles)):
+                if old != new:
+                    self.dirty.add(self.get_index_left_top(index) + (self.tile_size, self.tile_size))
+        if motion != self.drawn_motion:
+            # The sliding tiles cover their old and new cells
+            for moving in (motion, self.drawn_motion):
+                if moving is not None:
+                    for pair in moving[0]:
+                        for index in pair:
+                            self.dirty.add(self.get_index_left_top(index) + (self.tile_size, self.tile_size))
+        if self.hint_index != self.drawn_hint:
+            for index in (self.hint_index, self.drawn_hint):
+                if index is not None:
+                    self.dirty.add(self.get_index_left_top(index) + (self.tile_size, self.tile_size))
+        if message != self.drawn_message:
+            self.dirty.add(self.message_rect)
+        if hover != self.drawn_hover:
+            for rect in (hover, self.drawn_hover):
+                if rect is not None:
+                    self.dirty.add(rect)
+        if self.overlay_lines != self.drawn_overlay:
+            for lines in (self.overlay_lines, self.drawn_overlay):
+                if lines:
+                    self.dirty.add(self.get_overlay_rect(lines))
+
+        # 何も変わっていなければ描画も画面更新もしない
+        if not self.dirty:
+            self.profiler.mark('draw')
+            return False
+
+        rects = self.dirty.pop()
+        for rect in rects:
+            self.display_surf.set_clip(rect)
+            self.draw_board(message, hover)
+        self.display_surf.set_clip(None)
+        self.profiler.mark('draw')
+        pygame.display.update(rects)
+        self.profiler.mark('update')
+
+        self.drawn_tiles = bytes(board.tiles)
+        self.drawn_motion = motion
+        self.drawn_message = message
+        self.drawn_hover = hover
+        self.drawn_hint = self.hint_index
+        self.drawn_overlay = self.overlay_lines
+        return True
+
+    def slide_animation(self, direction, message, animation_speed, count=1):
+        # Queue a slide animation of count tiles; the caller applies it to the board.
+        # animation_speed is in pixels per frame at FPS, converted to seconds
+        if not 1 <= count <= self.state.get_slide_limit(direction):
             return  # Invalid move
+        self.animator.push(direction, self.get_slide_duration(animation_speed), message, count)
 
-        if direction == UP:
-            movex = blankx
-            movey = blanky + 1
-        elif direction == DOWN:
-            movex = blankx
-            movey = blanky - 1
-        elif direction == LEFT:
-            movex = blankx + 1
-            movey = blanky
-        elif direction == RIGHT:
-            movex = blankx - 1
-            movey = blanky
-
-        # Additional boundary check
-        if movex < 0 or movex >= BOARD_SIZE or movey < 0 or movey >= BOARD_SIZE:
-            return  # Out of bounds
-
-        # Prepare for animation
-        self.draw_board(message)
-        base_surf = self.display_surf.copy()
-
-        # Moving tile
-        move_tile = self.main_board[movex][movey]
-        move_left, move_top = self.get_left_top_of_tile(movex, movey)
-
-        for i in range(0, TILE_SIZE, animation_speed):
-            # Draw animation frame
-            self.display_surf.blit(base_surf, (0, 0))
-
-            if direction == UP:
-                self.display_surf.blit(self.tile_images[move_tile], (move_left, move_top - i))
-            elif direction == DOWN:
-                self.display_surf.blit(self.tile_images[move_tile], (move_left, move_top + i))
-            elif direction == LEFT:
-                self.display_surf.blit(self.tile_images[move_tile], (move_left - i, move_top))
-            elif direction == RIGHT:
-                self.display_surf.blit(self.tile_images[move_tile], (move_left + i, move_top))
-
-            pygame.display.update()
-            self.clock.tick(FPS)
+    def get_slide_duration(self, animation_speed):
+        # Seconds a slide takes at animation_speed pixels per frame at FPS
+        return TILE_SIZE / animation_speed / FPS
 
     def generate_new_puzzle(self, num_slides):
-        # Generate a new puzzle
-        sequence = []
-        board = self.get_starting_board()
+        # Generate a new puzzle instantly (no rendering)
+        self.message = ''
+        if self.difficulty is not None:
+            state, exact = self.difficulty_pool.take(self.difficulty)
+            sequence = []
+            if not exact:
+                # プールが空の間はランダムウォークの盤面で代用する
+                self.message = self.get_pool_message()
+        else:
+            state, sequence = generator.generate(self.generation_mode, num_slides,
+                                                 self.board_width, self.board_height)
 
         # Set initial board state
-        self.main_board = board
-
-        self.draw_board('')
-        pygame.display.update()
-        pygame.time.wait(500)
-        last_move = None
-
-        for i in range(num_slides):
-            move = self.get_random_move(board, last_move)
-            if move is None:
-                # Skip if no valid moves
-                continue
-            self.slide_animation(move, 'Generating puzzle...', int(TILE_SIZE / 3))
-            self.make_move(board, move)
-            sequence.append(move)
-            last_move = move
-
-        return (board, sequence)
+        self.state = state
+        self.replay = None
+        if self.move_log is not None:
+            self.move_log.start(state)
+        if self.animate_scramble and sequence:
+            # 演出として解けた状態からスクランブルを再生する
+            self.animator.reset(puzzle_core.PuzzleState(width=self.board_width, height=self.board_height))
+            slides = puzzle_core.compress_moves(sequence) if MERGE_SLIDES else [(move, 1) for move in sequence]
+            for move, count in slides:
+                self.animator.push(move, self.get_slide_duration(int(TILE_SIZE / 3)), 'Generating puzzle...', count)
+        else:
+            self.animator.reset(state)
+        self.reset_hint()
+
+        return (state, sequence)
+
+    def get_pool_message(self):
+        # Label of a random-walk board used while the difficulty pool is empty
+        if self.difficulty in self.difficulty_pool.failed:
+            return f'Up to {self.difficulty} moves (pool failed)'
+        return f'Up to {self.difficulty} moves (pool refilling)'
+
+    def animate_moves(self, moves, message, animation_speed, merge=MERGE_SLIDES):
+        # Slide the tiles through a sequence of moves; with merge, runs of the
+        # same move play as one row or column slide
+        slides = puzzle_core.compress_moves(moves) if merge else [(move, 1) for move in moves]
+        for move, count in slides:
+            self.slide_animation(move, message, animation_speed, count)
+            self.state.apply_slide(move, count)
+            if self.move_log is not None:
+                self.move_log.record(move, count)
+            # ヒントも盤面に合わせて進める
+            for i in range(count):
+                self.hint_engine.played(move)
+        self.hint_index = None
 
     def reset_animation(self, all_moves):
-        # Reset animation
-        rev_all_moves = all_moves[:]
-        rev_all_moves.reverse()
-
-        for move in rev_all_moves:
-            if move == UP:
-                opposite_move = DOWN
-            elif move == DOWN:
-                opposite_move = UP
-            elif move == RIGHT:
-                opposite_move = LEFT
-            elif move == LEFT:
-                opposite_move = RIGHT
-            self.slide_animation(opposite_move, '', int(TILE_SIZE / 2))
-            self.make_move(self.main_board, opposite_move)
-
-    def run(self):
-        # Main game loop
+        # Reset animation (all_moves: move codes)
+        rev_all_moves = (puzzle_core.ALL_MOVES[puzzle_core.OPPOSITE_CODES[code]] for code in reversed(all_moves))
+        self.animate_moves(rev_all_moves, '', int(TILE_SIZE / 2))
+        self.reset_hint()
+
+    def start_solve(self):
+        # Start solving the current board in the background; solutions are
+        # played as they arrive (see adopt_solution)
+        if self.solve_job is None and self.solve_plan is None:
+            # ソルバーとヒントは同じワーカーを使う
+            self.hint_engine.cancel()
+            self.solve_job = solve_job.SolveJob(self.state, budget=SOLVE_BUDGET)
+            self.solve_played = bytearray()
+            self.solve_best = None
+            self.solve_lower = 0
+
+    def cancel_solve(self):
+        # Stop an in-flight solve and its playback (board changed, New/Reset/ESC)
+        if self.solve_job is not None:
+            self.solve_job.cancel()
+            self.solve_job = None
+        self.solve_plan = None
+
+    def poll_solve(self, msg):
+        # Check the background solver once per frame and return the message
+        job = self.solve_job
+        for solution, lower_bound in job.improvements():
+            self.solve_lower = lower_bound
+            self.adopt_solution(solution)
+        if not job.done():
+            if self.solve_best is None:
+                return f'Solving... f={job.bound} {job.nodes // 1000}k'
+            return f'Improving... {self.solve_best} moves (min {max(self.solve_lower, job.bound)})'
+
+        self.solve_job = None
+        try:
+            solution = job.result()
+        except Exception as e:
+            print(f"Error during solve: {e}")
+            return 'Solve failed'
+        if solution is not None:
+            self.adopt_solution(solution)
+        if self.solve_plan is None:
+            return 'Solve failed' if self.solve_best is None else msg
+        return ''
+
+    def adopt_solution(self, moves):
+        # Play a solution of the board Solve started on, or switch to it when
+        # it is shorter: undo the played moves it does not share, then follow it
+        if self.solve_best is not None and len(moves) >= self.solve_best:
+            return
+        self.solve_best = len(moves)
+        codes = [puzzle_core.MOVE_CODES[move] for move in moves]
+        played = self.solve_played
+        common = 0
+        while common < min(len(played), len(codes)) and played[common] == codes[common]:
+            common += 1
+        route = [puzzle_core.OPPOSITE_CODES[code] for code in reversed(played[common:])] + codes[common:]
+        if self.solve_plan is None or len(route) < len(self.solve_plan):
+            self.solve_plan = deque(route)
+
+    def feed_solution(self):
+        # Queue the next slide of the solution only once the previous one is
+        # playing, so a shorter solution can still replace the rest
+        if self.animator.queue:
+            return
+        plan = self.solve_plan
+        if not plan:
+            # 解き終わったら探索も止める
+            self.cancel_solve()
+            self.all_moves = bytearray()
+            self.reset_hint()
+            return
+        code = plan.popleft()
+        count = 1
+        while plan and plan[0] == code:
+            plan.popleft()
+            count += 1
+        self.animate_moves([puzzle_core.ALL_MOVES[code]] * count, '', int(TILE_SIZE / 2))
+        opposite = puzzle_core.OPPOSITE_CODES[code]
+        for moves in (self.solve_played, self.all_moves):
+            # 戻す手は履歴から取り除く (リセットでも同じ盤面に戻れる)
+            for i in range(count):
+                if moves and moves[-1] == opposite:
+                    moves.pop()
+                else:
+                    moves.append(code)
+
+    def reset_hint(self):
+        # The board was replaced; hints start over from it
+        self.hint_engine.reset(self.state)
+        self.hint_index = None
+        self.hint_pending = False
+
+    def show_hint(self):
+        # Highlight the next best tile, or wait for the search; returns the message
+        if self.state.is_solved():
+            return 'Solved!'
+        move = self.hint_engine.next_move()
+        if move is None:
+            self.hint_pending = True
+            return 'Thinking...'
+        self.hint_pending = False
+        self.hint_index = self.state.get_moved_tile_index(move)
+        return ''
+
+    def poll_hint(self, msg):
+        # Check the hint search once per frame and return the message
+        if not self.hint_engine.poll():
+            return msg
+        return self.show_hint()
+
+    def player_move(self, move, count=1):
+        # Apply a move (or a slide of count tiles) from the player; it
+        # animates after any tiles in flight
+        # 盤面が変わるので探索中の解は使えない
+        self.cancel_solve()
+        self.replay = None
+        self.slide_animation(move, '', 8, count)
+        self.state.apply_slide(move, count)
+        self.all_moves.extend([puzzle_core.MOVE_CODES[move]] * count)
+        self.move_count += count
+        if self.move_log is not None:
+            self.move_log.record(move, count)
+        # キャッシュした最短経路に沿っていれば進めるだけ
+        for i in range(count):
+            self.hint_engine.played(move)
+        self.hint_index = None
+        self.hint_pending = False
+
+    def start_replay(self, log, start=0, speed=None):
+        # Play a recorded session from move number start; returns the message
+        self.cancel_solve()
+        if speed is not None:
+            self.replay_speed = speed
+        self.replay_log = log
+        self.replay_position = max(0, min(start, len(log)))
+        self.state = log.board_at(self.replay_position)
+        self.animator.reset(self.state)
+        self.all_moves = bytearray()
+        self.reset_hint()
+        self.replay = log.replay(self.replay_position)
+        self.replay_item = None
+        return f'Replay {self.replay_position}/{len(log)}'
+
+    def feed_replay(self):
+        # Keep a few replayed moves queued (no more than the animator plays at
+        # normal speed); returns the message to show
+        while len(self.animator.queue) < self.animator.max_pending:
+            item = self.replay_item or next(self.replay, None)
+            self.replay_item = None
+            if item is None:
+                self.replay = None
+                return 'Replay finished'
+            if isinstance(item, puzzle_core.PuzzleState):
+                if self.animator.busy:
+                    # 前の盤面のアニメーションが終わってから切り替える
+                    self.replay_item = item
+                    break
+                self.state = item
+                self.animator.reset(item)
+                self.reset_hint()
+                continue
+            self.animator.push(item, self.get_slide_duration(8) / self.replay_speed)
+            self.state.apply(item)
+            self.hint_engine.played(item)
+            self.hint_index = None
+            self.replay_position += 1
+        return f'Replay {self.replay_position}/{len(self.replay_log)}'
+
+    def click(self, x, y, msg):
+        # Handle a click or tap at window coordinates; returns the message to show
+        cell = self.layout.cell_at(x, y)
+        if cell is not None:
+            # 空白と同じ行・列のタイルなら、間のタイルもまとめて動かす
+            slide = board_layout.get_slide(self.state.get_blank_position(), cell)
+            if slide is None:
+                return msg
+            self.player_move(*slide)
+            return ''
+
+        # Check if buttons were clicked
+        button = self.button_index.find(x, y)
+        if button == 'reset':
+            self.cancel_solve()
+            self.reset_animation(self.all_moves)
+            self.all_moves = bytearray()
+            return ''
+        elif button == 'new':
+            self.cancel_solve()
+            self.state, self.solution_seq = self.generate_new_puzzle(SCRAMBLE_MOVES)
+            self.all_moves = bytearray()
+            return self.message
+        elif button == 'solve':
+            # 探索はバックグラウンドで実行し、毎フレーム結果を確認する
+            self.start_solve()
+        elif button == 'hint':
+            return self.show_hint()
+        return msg
+
+    def frame(self, events, elapsed, mouse_pos=None):
+        # One pass of the game loop: animation, background jobs, input and
+        # drawing. elapsed is the seconds since the previous frame; mouse_pos
+        # is None when there is no pointer (headless runs). Returns False once
+        # the game should quit
         running = True
-        msg = ''
-
-        # カーソルの状態を追跡する変数
-        cursor_on_button = False
-
-        while running:
+        msg = self.message
+        self.animator.update(elapsed)
+        self.profiler.mark('animation')
+
+        if self.solve_job is not None:
+            msg = self.poll_solve(msg)
+        if self.solve_plan is not None:
+            self.feed_solution()
+        if self.hint_pending:
+            msg = self.poll_hint(msg)
+        if self.replay is not None:
+            msg = self.feed_replay()
+        if self.difficulty_pool is not None:
+            self.difficulty_pool.collect()
+            if msg.endswith('(pool refilling)'):
+                # 補充に失敗したらそう表示する
+                msg = self.get_pool_message()
+        self.profiler.mark('poll')
+
+        # Check if the board is solved (once the tiles have settled)
+        if self.state.is_solved() and not self.animator.busy:
+            msg = 'Solved!'
+
+        # ボタンの上にマウスがあるかチェック
+        hover = None
+        if mouse_pos is not None:
+            hover = self.button_rects.get(self.button_index.find(*mouse_pos))
+            if (hover is not None) != self.cursor_on_button:
+                # ボタンの上では指差しカーソル、それ以外は通常のカーソル
+                self.cursor_on_button = hover is not None
+                pygame.mouse.set_cursor(pygame.SYSTEM_CURSOR_HAND if self.cursor_on_button
+                                        else pygame.SYSTEM_CURSOR_ARROW)
+
+        for event in events:
             slide_to = None
 
-            # Check if the board is solved
-            if self.main_board == self.solved_board:
-                msg = 'Solved!'
-
-            self.draw_board(msg)
-
-            # マウスの位置を取得
-            mouse_pos = pygame.mouse.get_pos()
-
-            # ボタンの上にマウスがあるかチェック
-            if (self.reset_rect.collidepoint(mouse_pos) or 
-                self.new_rect.collidepoint(mouse_pos) or 
-                self.solve_rect.collidepoint(mouse_pos)):
-                if not cursor_on_button:
-                    pygame.mouse.set_cursor(pygame.SYSTEM_CURSOR_HAND)  # 指差しカーソルに変更
-                    cursor_on_button = True
-            else:
-                if cursor_on_button:
-                    pygame.mouse.set_cursor(pygame.SYSTEM_CURSOR_ARROW)  # 通常のカーソルに戻す
-                    cursor_on_button = False
-
-            for event in pygame.event.get():
-                if event.type == QUIT:
+            if event.type == QUIT:
+                self.cancel_solve()
+                running = False
+            elif event.type in (VIDEOEXPOSE, WINDOWEXPOSED):
+                # ウィンドウが再表示されたら全体を描き直す
+                self.invalidate()
+            elif event.type == VIDEORESIZE:
+                # ドラッグ中は何度も届くので、フレームの最後に一度だけ配置し直す
+                self.pending_size = (event.w, event.h)
+            elif event.type == MOUSEBUTTONUP and not getattr(event, 'touch', False):
+                msg = self.click(event.pos[0], event.pos[1], msg)
+            elif event.type == FINGERUP:
+                # タッチ位置はウィンドウに対する 0〜1 の割合で届く
+                msg = self.click(int(event.x * self.window_width), int(event.y * self.window_height), msg)
+
+            elif event.type == KEYUP:
+                # Keyboard input
+                if event.key in (K_LEFT, K_a) and self.state.is_valid_move(LEFT):
+                    slide_to = LEFT
+                elif event.key in (K_RIGHT, K_d) and self.state.is_valid_move(RIGHT):
+                    slide_to = RIGHT
+                elif event.key in (K_UP, K_w) and self.state.is_valid_move(UP):
+                    slide_to = UP
+                elif event.key in (K_DOWN, K_s) and self.state.is_valid_move(DOWN):
+                    slide_to = DOWN
+                elif event.key == K_r:
+                    # Reset
+                    self.cancel_solve()
+                    self.state, self.solution_seq = self.generate_new_puzzle(SCRAMBLE_MOVES)
+                    self.all_moves = bytearray()
+                    msg = self.message
+                elif event.key == K_h:
+                    msg = self.show_hint()
+                elif event.key == K_F3:
+                    # 計測とオーバーレイの切り替え
+                    self.profiler.toggle()
+                elif event.key == K_F4:
+                    msg = self.save_trace()
+                elif event.key in (K_PAGEUP, K_PAGEDOWN) and self.replay_log is not None:
+                    # 再生位置を前後に移動 (直前のスナップショットから進める)
+                    step = REPLAY_SEEK if event.key == K_PAGEDOWN else -REPLAY_SEEK
+                    msg = self.start_replay(self.replay_log, self.replay_position + step)
+                elif event.key == K_ESCAPE:
+                    self.cancel_solve()
                     running = False
-                if event.type == QUIT:
-                    running = False
-                elif event.type == MOUSEBUTTONUP:
-                    spotx, spoty = self.get_spot_clicked(event.pos[0], event.pos[1])
-
-                    if (spotx, spoty) == (None, None):
-                        # Check if buttons were clicked
-                        if self.reset_rect.collidepoint(event.pos):
-                            self.reset_animation(self.all_moves)
-                            self.all_moves = []
-                            msg = ''
-                        elif self.new_rect.collidepoint(event.pos):
-                            self.main_board, self.solution_seq = self.generate_new_puzzle(80)
-                            self.all_moves = []
-                            msg = ''
-                        elif self.solve_rect.collidepoint(event.pos):
-                            try:
-                                # パズルを直接解決された状態に設定
-                                self.main_board = self.get_starting_board()
-                                # アニメーションで解決を表示
-                                self.draw_board('Solving...')
-                                pygame.display.update()
-                                pygame.time.wait(500)
-                                self.all_moves = []
-                                msg = 'Solved!'
-                            except Exception as e:
-                                print(f"Error during solve: {e}")
-                                msg = 'Solve failed'
-                    else:
-                        # Tile was clicked
-                        blankx, blanky = self.get_blank_position(self.main_board)
-                        if spotx == blankx + 1 and spoty == blanky:
-                            slide_to = LEFT
-                        elif spotx == blankx - 1 and spoty == blanky:
-                            slide_to = RIGHT
-                        elif spotx == blankx and spoty == blanky + 1:
-                            slide_to = UP
-                        elif spotx == blankx and spoty == blanky - 1:
-                            slide_to = DOWN
-
-                elif event.type == KEYUP:
-                    # Keyboard input
-                    if event.key in (K_LEFT, K_a) and self.is_valid_move(self.main_board, LEFT):
-                        slide_to = LEFT
-                    elif event.key in (K_RIGHT, K_d) and self.is_valid_move(self.main_board, RIGHT):
-                        slide_to = RIGHT
-                    elif event.key in (K_UP, K_w) and self.is_valid_move(self.main_board, UP):
-                        slide_to = UP
-                    elif event.key in (K_DOWN, K_s) and self.is_valid_move(self.main_board, DOWN):
-                        slide_to = DOWN
-                    elif event.key == K_r:
-                        # Reset
-                        self.main_board, self.solution_seq = self.generate_new_puzzle(80)
-                        self.all_moves = []
-                        msg = ''
-                    elif event.key == K_ESCAPE:
-                        running = False
 
+            # 移動中のタイルがあっても入力は受け付ける
             if slide_to:
-                self.slide_animation(slide_to, '', 8)
-                self.make_move(self.main_board, slide_to)
-                self.all_moves.append(slide_to)
+                self.player_move(slide_to)
                 msg = ''  # Clear message after move
 
-            pygame.display.update()
-            self.clock.tick(FPS)
+        if self.pending_size is not None:
+            width = max(self.pending_size[0], MIN_WINDOW_WIDTH)
+            height = max(self.pending_size[1], MIN_WINDOW_HEIGHT)
+            if (width, height) != self.pending_size:
+                # ボタンが重ならない大きさまで戻す
+                amazon_style.clear_caches()
+                pygame.display.set_mode((width, height), pygame.RESIZABLE)
+            self.apply_layout(width, height)
+            self.pending_size = None
+
+        self.profiler.mark('events')
+        self.message = msg
+        if self.render:
+            self.refresh(self.animator.message or msg, hover)
+        return running
+
+    def run(self):
+        # Main game loop
+        running = True
 
+        # Seconds since the previous frame, from the main loop's clock
+        elapsed = 0.0
+
+        while running:
+            running = self.frame(pygame.event.get(), elapsed, pygame.mouse.get_pos())
+            elapsed = self.clock.tick(FPS) / 1000.0
+            self.profiler.mark('tick')
+            self.profiler.end_frame()
+            self.update_overlay()
+
+        trace_path = os.environ.get(frame_profiler.TRACE_ENV)
+        if trace_path:
+            self.save_trace(trace_path)
+        self.close()
+
+    def close(self):
+        # Flush the move log and stop the solver process and pygame
+        if self.move_log is not None:
+            self.move_log.close()
+        if self.difficulty_pool is not None:
+            self.difficulty_pool.close()
+        solve_job.shutdown()
+        # キャッシュしたフォントやサーフェスはこの pygame のセッションでしか使えない
+        amazon_style.clear_caches()
         pygame.quit()
-        sys.exit()
 
 if __name__ == '__main__':
-    game = SlidingPuzzle()
+    parser = argparse.ArgumentParser(description='Amazon Sliding Puzzle')
+    parser.add_argument('--mode', choices=generator.MODES, default=GENERATION_MODE,
+                        help='puzzle generation: random walk or uniform over solvable boards')
+    parser.add_argument('--animate-scramble', action='store_true', default=ANIMATE_SCRAMBLE,
+                        help='show the scramble moves of a random walk')
+    parser.add_argument('--difficulty', type=int,
+                        help='optimal solution length of each puzzle (uses pools/ built by difficulty_pool.py)')
+    parser.add_argument('--size', type=puzzle_core.parse_size, default=(BOARD_SIZE, BOARD_SIZE),
+                        help='board size, e.g. 3, 5x5 or 4x6 (width x height)')
+    parser.add_argument('--record', nargs='?', metavar='FILE',
+                        const=os.path.join(LOG_DIR, time.strftime('session-%Y%m%d-%H%M%S.mlog')),
+                        help='write every move to a compact log (default file: logs/session-<time>.mlog)')
+    parser.add_argument('--replay', metavar='FILE', help='play back a recorded session')
+    parser.add_argument('--replay-from', type=int, default=0, metavar='MOVE',
+                        help='start the replay at this move number')
+    parser.add_argument('--replay-speed', type=float, default=1.0, help='replay speed factor')
+    args = parser.parse_args()
+
+    replay = None
+    if args.replay:
+        # 盤面の大きさは記録から取る
+        replay = move_log.MoveLog(args.replay)
+        args.size = (replay.width, replay.height)
+    if not all(MIN_BOARD_SIZE <= n <= MAX_BOARD_SIZE for n in args.size):
+        parser.error(f'board size must be between {MIN_BOARD_SIZE} and {MAX_BOARD_SIZE}')
+
+    game = SlidingPuzzle(args.mode, args.animate_scramble, args.difficulty, *args.size, record_path=args.record)
+    if replay is not None:
+        game.start_replay(replay, args.replay_from, args.replay_speed)
     game.run()
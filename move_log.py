@@ -0,0 +1,235 @@
+import argparse
+import bisect
+import os
+import struct
+
+from puzzle_core import ALL_MOVES, MOVE_CODES, PuzzleState, moves_to_text
+
+# ゲームの手順を 1 手 2 ビットで記録・再生する (pygame には依存しない)
+#
+# A log file is a header followed by records:
+#   b'S' <index:u64> <tiles>        board before move number index
+#   b'M' <count:u8> <packed moves>  count moves, four per byte (2-bit codes)
+# A snapshot starts every game (a new board that is not reached by moves)
+# and is repeated every SNAPSHOT_INTERVAL moves. Move indexes count across
+# games, so a new game's snapshot shares its index with the end of the
+# previous game; board_at and replay then use the new board (the board the
+# next move is played on), and the previous game's final board is
+# board_at(index) only when no new game starts at index. Readers index the snapshots,
+# so seeking to any move is a binary search plus at most one interval of
+# replayed moves. The writer appends as the game is played; an interrupted
+# file is readable up to its last complete record.
+
+MAGIC = b'MLOG'
+VERSION = 1
+HEADER = struct.Struct('<4sBBB')
+SNAPSHOT = struct.Struct('<cQ')
+MOVES = struct.Struct('<cB')
+SNAPSHOT_INTERVAL = 1024
+RECORD_MOVES = 128  # moves buffered before a move record is written
+
+
+def pack_moves(moves):
+    # 2-bit move codes, four per byte, first move in the low bits
+    data = bytearray((len(moves) + 3) // 4)
+    for i, move in enumerate(moves):
+        data[i >> 2] |= MOVE_CODES[move] << ((i & 3) * 2)
+    return bytes(data)
+
+
+def unpack_moves(data, count):
+    return [ALL_MOVES[data[i >> 2] >> ((i & 3) * 2) & 3] for i in range(count)]
+
+
+class MoveLogWriter:
+    # Streams a session to disk: snapshots of new boards plus every move
+
+    def __init__(self, path, width, height=None, snapshot_interval=SNAPSHOT_INTERVAL):
+        if height is None:
+            height = width
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.width = width
+        self.height = height
+        self.snapshot_interval = snapshot_interval
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, width, height))
+        self.state = None
+        self.count = 0          # moves recorded so far
+        self.last_snapshot = 0  # move index of the latest snapshot
+        self.pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self, state):
+        # Record a board that was not reached by moves (new puzzle)
+        self._write_moves()
+        self.state = state.copy()
+        self.file.write(SNAPSHOT.pack(b'S', self.count) + bytes(self.state.tiles))
+        self.last_snapshot = self.count
+
+    def record(self, move, count=1):
+        # Record a move, or a slide of count tiles as count moves
+        if self.state is None:
+            raise ValueError('start() must record a board before any moves')
+        for i in range(count):
+            if self.count - self.last_snapshot >= self.snapshot_interval:
+                self.start(self.state)
+            self.state.apply(move)
+            self.pending.append(move)
+            self.count += 1
+            if len(self.pending) >= RECORD_MOVES:
+                self._write_moves()
+
+    def _write_moves(self):
+        if self.pending:
+            self.file.write(MOVES.pack(b'M', len(self.pending)) + pack_moves(self.pending))
+            self.pending = []
+
+    def flush(self):
+        self._write_moves()
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+class MoveLog:
+    # Read-only view of a log file with snapshot-indexed seeking
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.data = f.read()
+        magic, version, self.width, self.height = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a move log file')
+        self.snapshot_indexes = []  # move index of each snapshot, ascending
+        self.snapshot_offsets = []  # file offset of each snapshot record
+        self.length = 0
+
+        tile_count = self.width * self.height
+        data = self.data
+        offset = HEADER.size
+        while offset < len(data):
+            kind = data[offset:offset + 1]
+            if kind == b'S':
+                end = offset + SNAPSHOT.size + tile_count
+                if end > len(data):
+                    break
+                self.snapshot_indexes.append(SNAPSHOT.unpack_from(data, offset)[1])
+                self.snapshot_offsets.append(offset)
+            elif kind == b'M':
+                if offset + MOVES.size > len(data):
+                    break
+                count = MOVES.unpack_from(data, offset)[1]
+                end = offset + MOVES.size + (count + 3) // 4
+                if end > len(data):
+                    break  # 書き込み途中で終わったファイル
+                self.length += count
+            else:
+                raise ValueError(f'bad record at byte {offset} of {path}')
+            offset = end
+        self.end = offset
+
+    def __len__(self):
+        return self.length
+
+    def _records(self, offset):
+        # (snapshot index, tiles) or (None, moves) records from offset
+        data = self.data
+        tile_count = self.width * self.height
+        while offset < self.end:
+            if data[offset:offset + 1] == b'S':
+                index = SNAPSHOT.unpack_from(data, offset)[1]
+                offset += SNAPSHOT.size
+                yield index, data[offset:offset + tile_count]
+                offset += tile_count
+            else:
+                count = MOVES.unpack_from(data, offset)[1]
+                offset += MOVES.size
+                yield None, unpack_moves(data[offset:offset + (count + 3) // 4], count)
+                offset += (count + 3) // 4
+
+    def _seek(self, index):
+        # Records from the latest snapshot at or before move index:
+        # (records, snapshot position, clamped index)
+        if not self.snapshot_indexes:
+            raise ValueError('the log has no board')
+        index = max(0, min(index, self.length))
+        number = bisect.bisect_right(self.snapshot_indexes, index) - 1
+        return self._records(self.snapshot_offsets[number]), self.snapshot_indexes[number], index
+
+    def board_at(self, index):
+        # The board move number index is played on: the board after index
+        # moves of the session, or the new board if a game starts at index
+        records, position, index = self._seek(index)
+        state = None
+        for snapshot, payload in records:
+            if snapshot is not None:
+                if snapshot > index:
+                    break
+                state = PuzzleState(payload, self.width, self.height)
+                continue
+            for move in payload[:index - position]:
+                state.apply(move)
+            position += len(payload)
+            if position >= index:
+                break
+        return state
+
+    def replay(self, start=0):
+        # Moves from move number start on; a PuzzleState marks a new board
+        records, position, start = self._seek(start)
+        state = None
+        for snapshot, payload in records:
+            if snapshot is not None:
+                board = PuzzleState(payload, self.width, self.height)
+                if state is not None and board != state:
+                    yield board.copy()
+                state = board
+                continue
+            for move in payload:
+                if position >= start:
+                    yield move
+                state.apply(move)
+                position += 1
+
+    def get_size_bytes(self):
+        return self.end
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Show a recorded game session')
+    parser.add_argument('path', help='move log file')
+    parser.add_argument('--seek', type=int, help='print the board after this many moves')
+    parser.add_argument('--moves', action='store_true', help='print the moves as letters')
+    args = parser.parse_args(argv)
+
+    log = MoveLog(args.path)
+    bits = log.get_size_bytes() * 8 / log.length if log.length else 0.0
+    print(f'{log.width}x{log.height}: {log.length} moves, {len(log.snapshot_indexes)} snapshots, '
+          f'{log.get_size_bytes()} bytes ({bits:.2f} bits/move)')
+    if args.seek is not None:
+        print(log.board_at(args.seek).to_text())
+    if args.moves:
+        # 新しい盤面ごとに 1 行
+        moves = []
+        for item in log.replay():
+            if isinstance(item, PuzzleState):
+                print(moves_to_text(moves))
+                moves = []
+            else:
+                moves.append(item)
+        print(moves_to_text(moves))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import puzzle_core
+import solver
+from puzzle_core import ALL_MOVES, OPPOSITE_CODES, PuzzleState
+
+# 複数プロセスで IDA* を並列に実行する最短手数ソルバー
+#
+# The root is expanded breadth-first to a fixed depth, and every distinct
+# frontier board becomes a work item. Each IDA* iteration hands all items to
+# a process pool (unordered, one at a time, so idle workers take the next
+# item). Workers share the length of the best solution found so far; it only
+# ever decreases, and a worker stops as soon as it is no longer above the
+# iteration bound, because a shorter or equal solution is already known. Any
+# solution found in an iteration is optimal, so the search ends with it.
+#
+# With bidirectional=True every worker also builds a Perimeter of the goal
+# (all boards within perimeter_depth moves) and finishes paths there.
+
+ITEMS_PER_JOB = 16   # frontier items per worker process, for load balancing
+MAX_SPLIT_DEPTH = 16  # below SERIAL_BOUND, so no solution ends inside the frontier
+SERIAL_BOUND = 30    # easier boards are solved in the calling process
+PERIMETER_DEPTH = 12
+NO_SOLUTION = 1 << 30
+
+_best = None       # shared length of the best solution found
+_perimeter = None
+
+
+def _init_worker(best, width, height, perimeter_depth):
+    global _best, _perimeter
+    _best = best
+    solver.get_heuristic(width, height)
+    _perimeter = solver.Perimeter(width, height, perimeter_depth) if perimeter_depth else None
+
+
+class _SharedBoundSolver(solver.IDAStarSolver):
+    # Stops once another worker has a solution no longer than the bound
+
+    def check_cancelled(self):
+        if _best.value <= self.bound:
+            raise solver.SolverCancelled()
+
+
+def _search_item(task):
+    # One frontier item at one bound: (exceeded f or -1, codes, nodes)
+    tiles, width, height, g, last, prefix, bound = task
+    search_solver = _SharedBoundSolver(perimeter=_perimeter)
+    search_solver.bound = bound
+    if _best.value <= bound:
+        return NO_SOLUTION, None, 0
+    path = []
+    found = []
+    search, h = solver.get_heuristic(width, height).make_search(search_solver, list(tiles), path, found,
+                                                                 _perimeter)
+    if g + h > bound:
+        return g + h, None, 0
+    try:
+        result = search(tiles.index(0), g, h, last, bound)
+    except solver.SolverCancelled:
+        return NO_SOLUTION, None, search_solver.nodes
+    if result != -1:
+        return result, None, search_solver.nodes
+    codes = list(prefix) + found
+    with _best.get_lock():
+        if len(codes) < _best.value:
+            _best.value = len(codes)
+    return -1, codes, search_solver.nodes
+
+
+def split(state, count, max_depth=MAX_SPLIT_DEPTH):
+    # Distinct boards reached breadth-first until there are at least count:
+    # [(tiles, last move code, move codes from the root)]
+    table = puzzle_core.get_move_table(state.width, state.height)
+    frontier = [(bytes(state.tiles), 4, ())]
+    seen = {frontier[0][0]}
+    depth = 0
+    while len(frontier) < count and depth < max_depth:
+        depth += 1
+        next_frontier = []
+        for tiles, last, prefix in frontier:
+            blank = tiles.index(0)
+            for code, target in enumerate(table[blank]):
+                if target < 0 or code == OPPOSITE_CODES[last]:
+                    continue
+                child = bytearray(tiles)
+                child[blank] = child[target]
+                child[target] = 0
+                child = bytes(child)
+                # 同じ盤面への別の手順は一つだけ残す
+                if child not in seen:
+                    seen.add(child)
+                    next_frontier.append((child, code, prefix + (code,)))
+        frontier = next_frontier
+    return frontier
+
+
+class ParallelIDAStarSolver:
+    # Optimal solver running the IDA* iterations on a process pool
+
+    def __init__(self, jobs=None, bidirectional=False, perimeter_depth=PERIMETER_DEPTH,
+                 items_per_job=ITEMS_PER_JOB):
+        self.jobs = jobs or os.cpu_count() or 1
+        self.perimeter_depth = perimeter_depth if bidirectional else 0
+        self.items_per_job = items_per_job
+        self.nodes = 0
+        self.bound = 0
+        self.items = 0
+        self.elapsed = 0.0
+        self._pool = None
+        self._pool_size = None
+        self._best = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def cancel(self):
+        # Make every worker stop at its next check
+        if self._best is not None:
+            self._best.value = 0
+
+    def _get_pool(self, width, height):
+        # One pool per board size; workers load the tables once
+        if self._pool is None or self._pool_size != (width, height):
+            self.close()
+            # 親プロセスで読み込んでおけば fork したワーカーと共有できる
+            solver.get_heuristic(width, height)
+            self._best = multiprocessing.Value('i', NO_SOLUTION)
+            self._pool = multiprocessing.Pool(self.jobs, _init_worker,
+                                              (self._best, width, height, self.perimeter_depth))
+            self._pool_size = (width, height)
+        return self._pool
+
+    def solve(self, state):
+        # Return the shortest move list that solves the state
+        if isinstance(state, list):
+            state = PuzzleState.from_columns(state)
+        if not state.is_solvable():
+            raise ValueError('puzzle is not solvable')
+        start = time.perf_counter()
+        self.nodes = 0
+        try:
+            # 浅い解はプロセスを使わずに探す
+            quick = solver.IDAStarSolver()
+            moves = quick.solve(state, max_bound=SERIAL_BOUND)
+            self.nodes = quick.nodes
+            if moves is not None:
+                self.bound = len(moves)
+                return moves
+            return self._solve_parallel(state)
+        finally:
+            self.elapsed = time.perf_counter() - start
+
+    def _solve_parallel(self, state):
+        width, height = state.width, state.height
+        pool = self._get_pool(width, height)
+        self._best.value = NO_SOLUTION
+        frontier = split(state, self.jobs * self.items_per_job)
+        self.items = len(frontier)
+
+        bound = SERIAL_BOUND + 1
+        while True:
+            self.bound = bound
+            tasks = [(tiles, width, height, len(prefix), last, prefix, bound)
+                     for tiles, last, prefix in frontier]
+            best = None
+            next_bound = NO_SOLUTION
+            for result, codes, nodes in pool.imap_unordered(_search_item, tasks):
+                self.nodes += nodes
+                if result == -1:
+                    if best is None or len(codes) < len(best):
+                        best = codes
+                elif result < next_bound:
+                    next_bound = result
+            if best is not None:
+                return [ALL_MOVES[code] for code in best]
+            if self._best.value == 0:
+                raise solver.SolverCancelled()
+            bound = next_bound
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Solve boards optimally with IDA* on several processes')
+    parser.add_argument('boards', nargs='*', help='boards as row-major tiles (default: one per line on stdin)')
+    parser.add_argument('--korf', help="Korf 15-puzzle instances instead, e.g. '1-10,55'")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--bidirectional', action='store_true', help='also finish paths at a goal perimeter')
+    parser.add_argument('--perimeter-depth', type=int, default=PERIMETER_DEPTH)
+    parser.add_argument('--serial', action='store_true', help='also time the single-process solver')
+    args = parser.parse_args(argv)
+
+    if args.korf:
+        import benchmark
+        instances = benchmark.load_korf()
+        numbers = set(benchmark.parse_korf(args.korf, instances))
+        states = [(f'korf {number}', state) for number, state, length in instances if number in numbers]
+    else:
+        lines = args.boards or [line for line in sys.stdin if line.strip()]
+        states = [(line.strip(), PuzzleState.from_text(line)) for line in lines]
+
+    with ParallelIDAStarSolver(args.jobs, args.bidirectional, args.perimeter_depth) as search:
+        for name, state in states:
+            moves = search.solve(state)
+            line = (f'{name}: {len(moves)} moves, {search.elapsed:.2f}s, {search.nodes} nodes, '
+                    f'{search.items} items on {search.jobs} processes')
+            if args.serial:
+                serial = solver.IDAStarSolver()
+                serial.solve(state)
+                line += f' (serial {serial.elapsed:.2f}s, {serial.elapsed / search.elapsed:.1f}x)'
+            print(line, flush=True)
+
+
+if __name__ == '__main__':
+    main()
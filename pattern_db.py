@@ -0,0 +1,390 @@
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+import time
+
+import puzzle_core
+
+# 加法的パターンデータベース (disjoint additive pattern databases)
+#
+# Each pattern is a group of tiles. Its table stores, for every placement of
+# those tiles, the minimum number of moves of *pattern tiles* needed to bring
+# them home. Groups are disjoint, so the values of all groups can be added.
+#
+# A pattern value always has the same parity as the Manhattan distance of its
+# tiles, so only (value - manhattan) // 2 is stored, one nibble per entry.
+# Tables are indexed sparsely: each tile position takes `shift` bits, which
+# lets the search update an index with one addition per move.
+
+PDB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pdb')
+MAGIC = b'SPDB'
+VERSION = 1
+HEADER = struct.Struct('<4sBBBB')
+PATTERN_HEADER = struct.Struct('<BQQ')
+
+# よく使われる分割 (4x4)
+PARTITIONS = {
+    (4, 4): {
+        '5-5-5': ((1, 2, 5, 6, 9), (3, 4, 7, 8, 12), (10, 11, 13, 14, 15)),
+        '6-6-3': ((1, 2, 5, 6, 9, 13), (3, 4, 7, 8, 11, 12), (10, 14, 15)),
+    },
+    (3, 3): {
+        '4-4': ((1, 2, 4, 5), (3, 6, 7, 8)),
+    },
+}
+DEFAULT_PARTITIONS = {
+    (4, 4): '5-5-5',
+    (3, 3): '4-4',
+}
+
+
+def get_shift(width, height):
+    # Bits used for one board position in a sparse index
+    return max(1, (width * height - 1).bit_length())
+
+
+def get_default_path(width, height=None):
+    if height is None:
+        height = width
+    return os.path.join(PDB_DIR, f'{width}x{height}.pdb')
+
+
+def build_pattern(width, height, tiles):
+    # 0-1 BFS from the solved board; returns the nibble-packed table
+    count = width * height
+    shift = get_shift(width, height)
+    mask = (1 << shift) - 1
+    size = 1 << (shift * len(tiles))
+    table = puzzle_core.get_move_table(width, height)
+    slots = range(len(tiles))
+
+    goal = count - 1
+    start = goal
+    for slot, tile in enumerate(tiles):
+        start |= (tile - 1) << (shift * (slot + 1))
+
+    # distance[index] = minimal pattern moves, 255 = not reached yet
+    distance = bytearray(b'\xff') * size
+    visited = bytearray(1 << (shift * (len(tiles) + 1)))
+    visited[start] = 1
+    layer = [start]
+    cost = 0
+    while layer:
+        next_layer = []
+        i = 0
+        # The layer grows while zero-cost moves (non-pattern tiles) are explored
+        while i < len(layer):
+            state = layer[i]
+            i += 1
+            index = state >> shift
+            if distance[index] == 255:
+                distance[index] = cost
+            blank = state & mask
+            occupied = {}
+            for slot in slots:
+                occupied[(index >> (shift * slot)) & mask] = slot
+            for target in table[blank]:
+                if target < 0:
+                    continue
+                slot = occupied.get(target)
+                if slot is None:
+                    child = state + target - blank
+                    if not visited[child]:
+                        visited[child] = 1
+                        layer.append(child)
+                else:
+                    child = state + target - blank + ((blank - target) << (shift * (slot + 1)))
+                    if not visited[child]:
+                        next_layer.append(child)
+
+        # States reached by a pattern move are only final once this layer is done
+        layer = []
+        for state in next_layer:
+            if not visited[state]:
+                visited[state] = 1
+                layer.append(state)
+        cost += 1
+
+    return _pack_extras(width, height, tiles, distance)
+
+
+def _pack_extras(width, height, tiles, distance):
+    # Store (distance - manhattan) // 2 as nibbles, two entries per byte
+    shift = get_shift(width, height)
+    mask = (1 << shift) - 1
+    goals = [divmod(tile - 1, width) for tile in tiles]
+    packed = bytearray((len(distance) + 1) // 2)
+    for index, value in enumerate(distance):
+        if value == 255:
+            continue
+        manhattan = 0
+        for slot, (goal_y, goal_x) in enumerate(goals):
+            y, x = divmod((index >> (shift * slot)) & mask, width)
+            manhattan += abs(x - goal_x) + abs(y - goal_y)
+        extra = min(15, (value - manhattan) // 2)
+        packed[index >> 1] |= extra << ((index & 1) << 2)
+    return packed
+
+
+def build(width, height, partition, path=None, report=print):
+    # Build every pattern of the partition and write them to one file
+    if path is None:
+        path = get_default_path(width, height)
+    tables = []
+    for tiles in partition:
+        start = time.perf_counter()
+        tables.append(build_pattern(width, height, tiles))
+        report(f'pattern {"-".join(map(str, tiles))}: '
+               f'{time.perf_counter() - start:.1f}s, {len(tables[-1])} bytes')
+    save(path, width, height, partition, tables)
+    return path
+
+
+def save(path, width, height, partition, tables):
+    # File layout: header, one (size, offset, length) + tiles entry per pattern, tables
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    offset = HEADER.size + sum(PATTERN_HEADER.size + len(tiles) for tiles in partition)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, width, height, len(partition)))
+        for tiles, packed in zip(partition, tables):
+            f.write(PATTERN_HEADER.pack(len(tiles), offset, len(packed)))
+            f.write(bytes(tiles))
+            offset += len(packed)
+        for packed in tables:
+            f.write(packed)
+
+
+class PatternDatabase:
+    # Memory-mapped additive pattern databases used as an IDA* heuristic
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        # ACCESS_READ maps the page cache directly, so processes share one copy
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+
+        magic, version, width, height, count = HEADER.unpack_from(view, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a pattern database file')
+        self.width = width
+        self.height = height
+        self.shift = get_shift(width, height)
+        self.distance = puzzle_core.get_distance_table(width, height)
+
+        self.partition = []
+        self.tables = []
+        position = HEADER.size
+        for i in range(count):
+            size, offset, length = PATTERN_HEADER.unpack_from(view, position)
+            position += PATTERN_HEADER.size
+            self.partition.append(tuple(view[position:position + size]))
+            position += size
+            self.tables.append(view[offset:offset + length])
+
+        # tile -> (pattern number, bit offset of its position in the index)
+        self.tile_patterns = [-1] * (width * height)
+        self.tile_shifts = [0] * (width * height)
+        for number, tiles in enumerate(self.partition):
+            for slot, tile in enumerate(tiles):
+                self.tile_patterns[tile] = number
+                self.tile_shifts[tile] = self.shift * slot
+
+    @classmethod
+    def load_default(cls, width, height=None):
+        # Return the database in PDB_DIR for this size, or None
+        path = get_default_path(width, height)
+        if not os.path.exists(path):
+            return None
+        return cls(path)
+
+    def close(self):
+        for i in range(len(self.tables)):
+            self.tables[i].release()
+        self._mmap.close()
+        self._file.close()
+
+    def keys(self, tiles):
+        # Sparse index of every pattern for row-major tiles
+        keys = [0] * len(self.partition)
+        for index, tile in enumerate(tiles):
+            number = self.tile_patterns[tile] if tile else -1
+            if number >= 0:
+                keys[number] += index << self.tile_shifts[tile]
+        return keys
+
+    def lookup(self, number, key):
+        # Stored extra moves (in pairs) above Manhattan distance
+        return (self.tables[number][key >> 1] >> ((key & 1) << 2)) & 15
+
+    def estimate(self, tiles):
+        distance = self.distance
+        total = sum(distance[tile][index] for index, tile in enumerate(tiles) if tile)
+        for number, key in enumerate(self.keys(tiles)):
+            total += 2 * self.lookup(number, key)
+        return total
+
+    def root_info(self, tiles):
+        # (h, pattern keys) of a board, for searches that keep one entry per board
+        return self.estimate(tiles), tuple(self.keys(tiles))
+
+    def child_info(self, h, keys, tile, blank, target):
+        # (h, keys) after tile moves from target into the blank
+        h += self.distance[tile][blank] - self.distance[tile][target]
+        number = self.tile_patterns[tile]
+        if number >= 0:
+            old_key = keys[number]
+            key = old_key + ((blank - target) << self.tile_shifts[tile])
+            h += 2 * (self.lookup(number, key) - self.lookup(number, old_key))
+            keys = keys[:number] + (key,) + keys[number + 1:]
+        return h, keys
+
+    def make_search(self, solver, tiles, path, found, perimeter=None, table=None, pruner=None):
+        # Return (search, h) for IDA*, see ManhattanHeuristic.make_search
+        moves = puzzle_core.get_move_table(self.width, self.height)
+        distance = self.distance
+        tile_patterns = self.tile_patterns
+        tile_shifts = self.tile_shifts
+        tables = self.tables
+        keys = self.keys(tiles)
+        extras = [self.lookup(number, key) for number, key in enumerate(keys)]
+        cancel_mask = solver.CANCEL_CHECK_MASK
+        goal_depth = 0 if perimeter is None else perimeter.depth
+        transitions = puzzle_core.REVERSAL_TRANSITIONS if pruner is None else pruner.transitions
+        if table is not None:
+            zobrist = table.zobrist.keys
+            visit = table.visit
+        board_key = 0 if table is None else table.zobrist.hash(tiles)
+
+        def search(blank, g, h, last, bound):
+            # Returns the smallest f that exceeded bound, or -1 when solved
+            nonlocal board_key
+            solver.nodes += 1
+            if not solver.nodes & cancel_mask:
+                solver.check_cancelled()
+            if h <= goal_depth:
+                # h never exceeds the true distance, so only these can be in the perimeter
+                if perimeter is None:
+                    found.extend(path)
+                    return -1
+                result = perimeter.check(tiles, g, h, bound, path, found)
+                if result is not None:
+                    return result
+            if table is not None and visit(board_key, g):
+                return 1 << 30
+            minimum = 1 << 30
+            targets = moves[blank]
+            states = transitions[last]
+            for code in range(4):
+                target = targets[code]
+                state = states[code]
+                if target < 0 or state < 0:
+                    continue
+                tile = tiles[target]
+                child_h = h + distance[tile][blank] - distance[tile][target]
+                number = tile_patterns[tile]
+                if number >= 0:
+                    old_key = keys[number]
+                    old_extra = extras[number]
+                    key = old_key + ((blank - target) << tile_shifts[tile])
+                    extra = (tables[number][key >> 1] >> ((key & 1) << 2)) & 15
+                    child_h += 2 * (extra - old_extra)
+                f = g + 1 + child_h
+                if f <= bound:
+                    if number >= 0:
+                        keys[number] = key
+                        extras[number] = extra
+                    tiles[blank] = tile
+                    tiles[target] = 0
+                    path.append(code)
+                    if table is not None:
+                        board_key ^= zobrist[tile][target] ^ zobrist[tile][blank]
+                    result = search(target, g + 1, child_h, state, bound)
+                    if table is not None:
+                        board_key ^= zobrist[tile][target] ^ zobrist[tile][blank]
+                    path.pop()
+                    tiles[target] = tile
+                    tiles[blank] = 0
+                    if number >= 0:
+                        keys[number] = old_key
+                        extras[number] = old_extra
+                else:
+                    result = f
+                if result == -1:
+                    return -1
+                if result < minimum:
+                    minimum = result
+            return minimum
+
+        return search, self.estimate(tiles)
+
+
+def measure_lookup(database, count=200000, rng=random):
+    # Average cost of one table lookup in nanoseconds
+    states = []
+    for i in range(100):
+        state = puzzle_core.PuzzleState(width=database.width, height=database.height)
+        state.scramble(200, rng)
+        states.append(database.keys(state.tiles))
+    tables = database.tables
+    repeat = max(1, count // len(states))
+    start = time.perf_counter()
+    for i in range(repeat):
+        for keys in states:
+            for number, key in enumerate(keys):
+                (tables[number][key >> 1] >> ((key & 1) << 2)) & 15
+    elapsed = time.perf_counter() - start
+
+    # Subtract the cost of the loop itself
+    start = time.perf_counter()
+    for i in range(repeat):
+        for keys in states:
+            for number, key in enumerate(keys):
+                pass
+    elapsed -= time.perf_counter() - start
+    return elapsed * 1e9 / (repeat * len(states) * len(tables))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or inspect pattern databases')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = commands.add_parser('build', help='generate tables by BFS')
+    build_parser.add_argument('--size', default='4x4', help='board size, e.g. 4x4')
+    build_parser.add_argument('--partition', help='tile partition, e.g. 5-5-5 or 6-6-3')
+    build_parser.add_argument('--output', help='output file (default: pdb/<size>.pdb)')
+
+    info_parser = commands.add_parser('info', help='show table sizes and lookup cost')
+    info_parser.add_argument('path', nargs='?', help='pattern database file')
+    info_parser.add_argument('--size', default='4x4', help='board size of the default file')
+
+    args = parser.parse_args(argv)
+    width, height = puzzle_core.parse_size(args.size)
+
+    if args.command == 'build':
+        partitions = PARTITIONS.get((width, height), {})
+        name = args.partition or DEFAULT_PARTITIONS.get((width, height))
+        if name not in partitions:
+            parser.error(f'unknown partition {name!r} for {width}x{height} '
+                         f'(choose from {", ".join(partitions) or "none"})')
+        start = time.perf_counter()
+        path = build(width, height, partitions[name], args.output)
+        print(f'build time: {time.perf_counter() - start:.1f}s')
+    else:
+        path = args.path or get_default_path(width, height)
+
+    print(f'file: {path} ({os.path.getsize(path)} bytes)')
+    database = PatternDatabase(path)
+    try:
+        print(f'lookup: {measure_lookup(database):.0f} ns')
+    finally:
+        database.close()
+
+
+if __name__ == '__main__':
+    main()
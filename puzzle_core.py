@@ -0,0 +1,493 @@
+import math
+import random
+import re
+
+# パズルのロジックだけを持つモジュール (pygame には依存しない)
+# Boards are either lists of columns (board[x][y], None for the blank)
+# or PuzzleState objects (row-major tiles, 0 for the blank).
+
+# Constants
+BOARD_SIZE = 4
+
+# Direction constants
+# 方向はタイルが動く向きを表す (UP = 空白の下のタイルが上に動く)
+UP = 'up'
+DOWN = 'down'
+LEFT = 'left'
+RIGHT = 'right'
+
+ALL_MOVES = (UP, DOWN, LEFT, RIGHT)
+
+OPPOSITE_MOVES = {
+    UP: DOWN,
+    DOWN: UP,
+    LEFT: RIGHT,
+    RIGHT: LEFT,
+}
+
+
+def get_starting_board(width=BOARD_SIZE, height=None):
+    # Return a solved board - 左上から右へ、そして下へと1,2,3...と番号を振る
+    if height is None:
+        height = width
+    board = []
+    for x in range(width):
+        column = []
+        for y in range(height):
+            # 一番右下を空白にする
+            if x == width - 1 and y == height - 1:
+                column.append(None)
+            else:
+                column.append(y * width + x + 1)
+        board.append(column)
+    return board
+
+
+# One letter per move for compact move strings ('ULLD...')
+MOVE_LETTERS = {UP: 'U', DOWN: 'D', LEFT: 'L', RIGHT: 'R'}
+LETTER_MOVES = {letter: move for move, letter in MOVE_LETTERS.items()}
+
+
+def moves_to_text(moves):
+    return ''.join(MOVE_LETTERS[move] for move in moves)
+
+
+def moves_from_text(text):
+    return [LETTER_MOVES[letter] for letter in text.strip().upper()]
+
+
+# Multi-tile slides: (move, count) shifts count tiles of the blank's row or
+# column one cell in the move's direction, the same as count single moves.
+# Text form is the letter followed by the count when above one ('L3UR2'); the
+# byte form packs each slide into one byte, (count - 1) << 2 | move code.
+MAX_SLIDE_BYTE_COUNT = 64
+
+
+def compress_moves(moves):
+    # Merge runs of the same move into (move, count) slides
+    slides = []
+    for move in moves:
+        if slides and slides[-1][0] == move:
+            slides[-1] = (move, slides[-1][1] + 1)
+        else:
+            slides.append((move, 1))
+    return slides
+
+
+def expand_slides(slides):
+    # Single moves of a slide list
+    return [move for move, count in slides for i in range(count)]
+
+
+def slides_to_text(slides):
+    return ''.join(MOVE_LETTERS[move] + (str(count) if count > 1 else '') for move, count in slides)
+
+
+def slides_from_text(text):
+    slides = []
+    for letter, count in re.findall(r'([A-Za-z])(\d*)', text):
+        slides.append((LETTER_MOVES[letter.upper()], int(count or 1)))
+    return slides
+
+
+def encode_slides(slides):
+    # One byte per slide; longer runs than a byte holds are split
+    data = bytearray()
+    for move, count in slides:
+        code = MOVE_CODES[move]
+        while count > 0:
+            part = min(count, MAX_SLIDE_BYTE_COUNT)
+            data.append((part - 1) << 2 | code)
+            count -= part
+    return bytes(data)
+
+
+def decode_slides(data):
+    return [(ALL_MOVES[byte & 3], (byte >> 2) + 1) for byte in data]
+
+
+def parse_size(text):
+    # '4' or '4x5' -> (width, height)
+    width, _, height = text.lower().partition('x')
+    return int(width), int(height or width)
+
+
+def copy_board(board):
+    # Return an independent copy of the board
+    return [column[:] for column in board]
+
+
+def get_board_size(board):
+    # Return (width, height) of the board
+    return (len(board), len(board[0]))
+
+
+def get_blank_position(board):
+    # Return the position of the blank space
+    for x, column in enumerate(board):
+        for y, value in enumerate(column):
+            if value is None:
+                return (x, y)
+    return None
+
+
+def get_opposite_move(move):
+    # Return the move that undoes the given move
+    return OPPOSITE_MOVES[move]
+
+
+def get_moved_tile_position(board, move):
+    # Return the position of the tile that the move would slide into the blank
+    blankx, blanky = get_blank_position(board)
+    width, height = get_board_size(board)
+
+    if move == UP:
+        x, y = blankx, blanky + 1
+    elif move == DOWN:
+        x, y = blankx, blanky - 1
+    elif move == LEFT:
+        x, y = blankx + 1, blanky
+    elif move == RIGHT:
+        x, y = blankx - 1, blanky
+    else:
+        return None
+
+    if 0 <= x < width and 0 <= y < height:
+        return (x, y)
+    return None
+
+
+def is_valid_move(board, move):
+    # Check if the specified move is valid
+    return get_moved_tile_position(board, move) is not None
+
+
+def make_move(board, move):
+    # Make the specified move (the board is modified in place)
+    blankx, blanky = get_blank_position(board)
+    tile = get_moved_tile_position(board, move)
+    if tile is None:
+        raise ValueError(f'invalid move: {move!r}')
+    tilex, tiley = tile
+    board[blankx][blanky], board[tilex][tiley] = board[tilex][tiley], board[blankx][blanky]
+
+
+def get_valid_moves(board, last_move=None):
+    # Return the valid moves, without the move that undoes last_move
+    undo = OPPOSITE_MOVES.get(last_move)
+    return [move for move in ALL_MOVES
+            if move != undo and is_valid_move(board, move)]
+
+
+def get_random_move(board, last_move=None, rng=random):
+    # Get a random move (avoiding the opposite of the last move)
+    valid_moves = get_valid_moves(board, last_move)
+    if not valid_moves:
+        return None
+    return rng.choice(valid_moves)
+
+
+def is_solved(board):
+    # Check if the board is in the solved state
+    width, height = get_board_size(board)
+    return board == get_starting_board(width, height)
+
+
+def is_solvable(tiles, width, height=None):
+    # Check the inversion parity of row-major tiles (0 for the blank)
+    if height is None:
+        height = width
+    numbers = [tile for tile in tiles if tile]
+    inversions = 0
+    for i, tile in enumerate(numbers):
+        for other in numbers[i + 1:]:
+            if other < tile:
+                inversions += 1
+    if width % 2 == 1:
+        return inversions % 2 == 0
+    # 幅が偶数の場合は空白の行 (下から数える) も考慮する
+    blank_row_from_bottom = height - list(tiles).index(0) // width
+    return (inversions + blank_row_from_bottom) % 2 == 1
+
+
+def scramble(board, num_slides, rng=random):
+    # Apply num_slides random moves to the board without any rendering
+    sequence = []
+    last_move = None
+    for i in range(num_slides):
+        move = get_random_move(board, last_move, rng)
+        if move is None:
+            continue
+        make_move(board, move)
+        sequence.append(move)
+        last_move = move
+    return sequence
+
+
+# 盤面は行優先の bytearray で保持する (0 が空白)
+# Move tables map a blank index to the index of the tile each move slides in.
+_MOVE_TABLES = {}
+_SCRAMBLE_CHOICES = {}
+_SOLVED_TILES = {}
+_DISTANCE_TABLES = {}
+
+MOVE_CODES = {move: code for code, move in enumerate(ALL_MOVES)}
+OPPOSITE_CODES = (1, 0, 3, 2, -1)  # code 4 means "no previous move"
+# [last_code][code] -> code, or -1 for the move that undoes last_code: the
+# searches' default move pruner (see transposition.MovePruner for longer cycles)
+REVERSAL_TRANSITIONS = tuple(tuple(-1 if code == OPPOSITE_CODES[last] else code for code in range(4))
+                             for last in range(5))
+
+
+def get_move_table(width, height=None):
+    # Return [blank_index] -> (target index or -1 for each of ALL_MOVES)
+    if height is None:
+        height = width
+    table = _MOVE_TABLES.get((width, height))
+    if table is None:
+        table = []
+        for index in range(width * height):
+            y, x = divmod(index, width)
+            table.append((
+                index + width if y < height - 1 else -1,  # UP
+                index - width if y > 0 else -1,           # DOWN
+                index + 1 if x < width - 1 else -1,       # LEFT
+                index - 1 if x > 0 else -1,               # RIGHT
+            ))
+        table = tuple(table)
+        _MOVE_TABLES[(width, height)] = table
+    return table
+
+
+def get_scramble_choices(width, height=None):
+    # Return [blank_index][last_code] -> move codes that don't undo last_code
+    # (last_code 4 means there was no previous move)
+    if height is None:
+        height = width
+    choices = _SCRAMBLE_CHOICES.get((width, height))
+    if choices is None:
+        choices = []
+        for targets in get_move_table(width, height):
+            valid = [code for code in range(4) if targets[code] >= 0]
+            by_last = [tuple(code for code in valid if code != OPPOSITE_CODES[last])
+                       for last in range(4)]
+            by_last.append(tuple(valid))
+            choices.append(tuple(by_last))
+        choices = tuple(choices)
+        _SCRAMBLE_CHOICES[(width, height)] = choices
+    return choices
+
+
+def get_distance_table(width, height=None):
+    # Return [tile][index] -> Manhattan distance of tile at index from its goal
+    if height is None:
+        height = width
+    distance = _DISTANCE_TABLES.get((width, height))
+    if distance is None:
+        count = width * height
+        distance = [[0] * count]
+        for tile in range(1, count):
+            goal_y, goal_x = divmod(tile - 1, width)
+            distance.append([abs(index % width - goal_x) + abs(index // width - goal_y)
+                             for index in range(count)])
+        _DISTANCE_TABLES[(width, height)] = distance
+    return distance
+
+
+def get_solved_tiles(width, height=None):
+    # Return the row-major tiles of the solved board
+    if height is None:
+        height = width
+    tiles = _SOLVED_TILES.get((width, height))
+    if tiles is None:
+        count = width * height
+        tiles = bytes(list(range(1, count)) + [0])
+        _SOLVED_TILES[(width, height)] = tiles
+    return tiles
+
+
+class PuzzleState:
+    # Compact board state: row-major tiles in a bytearray with a cached blank index
+    __slots__ = ('width', 'height', 'tiles', 'blank', 'moves', '_table')
+
+    def __init__(self, tiles=None, width=BOARD_SIZE, height=None, blank=None):
+        if height is None:
+            height = width
+        if tiles is None:
+            tiles = get_solved_tiles(width, height)
+        self.width = width
+        self.height = height
+        self.tiles = bytearray(tiles)
+        if len(self.tiles) != width * height:
+            raise ValueError(f'expected {width * height} tiles, got {len(self.tiles)}')
+        self.blank = self.tiles.index(0) if blank is None else blank
+        self.moves = []
+        self._table = get_move_table(width, height)
+
+    @classmethod
+    def from_columns(cls, board):
+        # Build a state from the list-of-columns layout (None for the blank)
+        width, height = get_board_size(board)
+        tiles = bytearray(width * height)
+        for x, column in enumerate(board):
+            for y, value in enumerate(column):
+                tiles[y * width + x] = value or 0
+        return cls(tiles, width, height)
+
+    def to_columns(self):
+        # Convert back to the list-of-columns layout used by draw_board
+        width = self.width
+        tiles = self.tiles
+        return [[tiles[y * width + x] or None for y in range(self.height)]
+                for x in range(width)]
+
+    def copy(self):
+        state = PuzzleState(self.tiles, self.width, self.height, self.blank)
+        state.moves = self.moves[:]
+        return state
+
+    def key(self):
+        # Hashable snapshot of the tiles
+        return bytes(self.tiles)
+
+    def get_tile(self, x, y):
+        # Return the tile number at (x, y), or None for the blank
+        return self.tiles[y * self.width + x] or None
+
+    def get_blank_position(self):
+        y, x = divmod(self.blank, self.width)
+        return (x, y)
+
+    def get_moved_tile_index(self, move):
+        # Index of the tile the move slides into the blank, or -1
+        return self._table[self.blank][MOVE_CODES[move]]
+
+    def get_moved_tile_position(self, move):
+        target = self._table[self.blank][MOVE_CODES[move]]
+        if target < 0:
+            return None
+        y, x = divmod(target, self.width)
+        return (x, y)
+
+    def is_valid_move(self, move):
+        return self._table[self.blank][MOVE_CODES[move]] >= 0
+
+    def get_valid_moves(self, last_move=None):
+        targets = self._table[self.blank]
+        undo = OPPOSITE_MOVES.get(last_move)
+        return [move for move, target in zip(ALL_MOVES, targets)
+                if target >= 0 and move != undo]
+
+    def apply(self, move):
+        # Apply a move without recording it
+        target = self._table[self.blank][MOVE_CODES[move]]
+        if target < 0:
+            raise ValueError(f'invalid move: {move!r}')
+        tiles = self.tiles
+        tiles[self.blank] = tiles[target]
+        tiles[target] = 0
+        self.blank = target
+
+    def get_slide_limit(self, move):
+        # Most tiles a single slide in this direction can shift
+        y, x = divmod(self.blank, self.width)
+        if move == UP:
+            return self.height - 1 - y
+        if move == DOWN:
+            return y
+        if move == LEFT:
+            return self.width - 1 - x
+        return x
+
+    def _get_slide_step(self, move):
+        # Index offset from a cell to the next tile the slide moves
+        return {UP: self.width, DOWN: -self.width, LEFT: 1, RIGHT: -1}[move]
+
+    def apply_slide(self, move, count=1):
+        # Shift count tiles toward the blank in one step (without recording)
+        if not 1 <= count <= self.get_slide_limit(move):
+            raise ValueError(f'invalid slide: {move!r} x {count}')
+        step = self._get_slide_step(move)
+        tiles = self.tiles
+        index = self.blank
+        for i in range(count):
+            tiles[index] = tiles[index + step]
+            index += step
+        tiles[index] = 0
+        self.blank = index
+
+    def get_slide_indexes(self, move, count=1):
+        # (from_index, to_index) of every tile the slide moves
+        step = self._get_slide_step(move)
+        return tuple((self.blank + step * i, self.blank + step * (i - 1)) for i in range(1, count + 1))
+
+    def move(self, move):
+        # Apply a move and record it in the history
+        self.apply(move)
+        self.moves.append(move)
+
+    def undo(self):
+        # Undo the last recorded move
+        if not self.moves:
+            return None
+        move = get_opposite_move(self.moves.pop())
+        self.apply(move)
+        return move
+
+    def scramble(self, num_slides, rng=random):
+        # Apply num_slides random non-reversing moves and return them
+        tiles = self.tiles
+        table = self._table
+        choices = get_scramble_choices(self.width, self.height)
+        blank = self.blank
+        rand = rng.random
+        codes = []
+        last = 4
+        for i in range(num_slides):
+            candidates = choices[blank][last]
+            code = candidates[int(rand() * len(candidates))]
+            target = table[blank][code]
+            tiles[blank] = tiles[target]
+            tiles[target] = 0
+            blank = target
+            codes.append(code)
+            last = code
+        self.blank = blank
+        self.moves = []
+        return [ALL_MOVES[code] for code in codes]
+
+    def is_solvable(self):
+        return is_solvable(self.tiles, self.width, self.height)
+
+    def is_solved(self):
+        return self.tiles == get_solved_tiles(self.width, self.height)
+
+    def to_text(self):
+        # One-line form: row-major tiles separated by spaces, 0 for the blank
+        return ' '.join(map(str, self.tiles))
+
+    @classmethod
+    def from_text(cls, text, width=None, height=None):
+        # Parse the to_text() form (commas are accepted as separators too);
+        # a square board is assumed when no size is given
+        tiles = [int(value) for value in text.replace(',', ' ').split()]
+        if width is None:
+            width = math.isqrt(len(tiles))
+        if height is None:
+            height = len(tiles) // width
+        if sorted(tiles) != list(range(width * height)):
+            raise ValueError(f'not a {width}x{height} board: {text.strip()!r}')
+        return cls(tiles, width, height)
+
+    def __eq__(self, other):
+        if isinstance(other, PuzzleState):
+            return (self.width, self.height, self.tiles) == \
+                (other.width, other.height, other.tiles)
+        if isinstance(other, list):
+            return self.to_columns() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'PuzzleState({list(self.tiles)!r}, {self.width}, {self.height})'
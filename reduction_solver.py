@@ -0,0 +1,198 @@
+import time
+from collections import deque
+
+import puzzle_core
+import solver
+from puzzle_core import ALL_MOVES, PuzzleState
+
+# 行・列を 1 本ずつ揃えて盤面を縮めていくソルバー (最短ではないが高速)
+# While the unsolved region is larger than 3x3 its top row (or left column)
+# is placed tile by tile and locked. The last two tiles of a line are set up
+# in a 2x3 window next to the corner and finished by a tiny BFS. The final
+# region of at most 3x3 is solved optimally by the given small-board solver.
+
+# Regions up to this size are handed to the small-board solver
+FINAL_REGION_SIZE = 3
+
+
+class ReductionSolver:
+    # Suboptimal solver for large boards (milliseconds even at 8x8)
+
+    def __init__(self, small_solver=None):
+        # small_solver(state) -> moves for a board of at most 3x3
+        self.small_solver = small_solver or solver.solve
+        self.nodes = 0
+        self.elapsed = 0.0
+
+    def solve(self, state):
+        # Return a list of moves that solves the state
+        if isinstance(state, list):
+            state = PuzzleState.from_columns(state)
+        if not state.is_solvable():
+            raise ValueError('puzzle is not solvable')
+
+        start = time.perf_counter()
+        self.nodes = 0
+        try:
+            return _Reduction(self, state).solve()
+        finally:
+            self.elapsed = time.perf_counter() - start
+
+
+class _Reduction:
+    # Working copy of one solve; cells are row-major board indices
+
+    def __init__(self, solver, state):
+        self.solver = solver
+        self.state = state.copy()
+        self.width = state.width
+        self.height = state.height
+        self.table = puzzle_core.get_move_table(state.width, state.height)
+        self.locked = bytearray(state.width * state.height)
+        self.moves = []
+
+    def solve(self):
+        width, height = self.width, self.height
+        left = top = 0
+        while width - left > FINAL_REGION_SIZE or height - top > FINAL_REGION_SIZE:
+            if height - top > FINAL_REGION_SIZE and (height - top >= width - left
+                                                     or width - left <= FINAL_REGION_SIZE):
+                # Top row of the region; the window for its last tiles is below
+                self.solve_line([top * width + x for x in range(left, width)], width)
+                top += 1
+            else:
+                # Left column of the region; the window is to its right
+                self.solve_line([y * width + left for y in range(top, height)], 1)
+                left += 1
+        self.solve_region(left, top)
+        return self.moves
+
+    def push_blank(self, target):
+        # Slide the tile at the neighbouring cell target into the blank
+        code = self.table[self.state.blank].index(target)
+        move = ALL_MOVES[code]
+        self.state.apply(move)
+        self.moves.append(move)
+        self.solver.nodes += 1
+
+    def find_path(self, start, goal, blocked):
+        # Shortest list of cells from start (exclusive) to goal avoiding
+        # locked cells and blocked, or None if goal is unreachable
+        if start == goal:
+            return []
+        table, locked = self.table, self.locked
+        previous = {start: start}
+        queue = deque([start])
+        while queue:
+            cell = queue.popleft()
+            for neighbour in table[cell]:
+                if neighbour < 0 or neighbour in previous or locked[neighbour] or neighbour == blocked:
+                    continue
+                previous[neighbour] = cell
+                if neighbour == goal:
+                    path = [goal]
+                    while previous[path[-1]] != start:
+                        path.append(previous[path[-1]])
+                    path.reverse()
+                    return path
+                queue.append(neighbour)
+        return None
+
+    def move_blank(self, goal, blocked=-1):
+        path = self.find_path(self.state.blank, goal, blocked)
+        if path is None:
+            raise RuntimeError(f'blank cannot reach cell {goal}')
+        for cell in path:
+            self.push_blank(cell)
+
+    def move_tile(self, tile, goal):
+        # Walk a tile to goal one cell at a time, bringing the blank in front of it
+        cell = self.state.tiles.index(tile)
+        while cell != goal:
+            path = self.find_path(cell, goal, -1)
+            if path is None:
+                raise RuntimeError(f'tile {tile} cannot reach cell {goal}')
+            self.move_blank(path[0], blocked=cell)
+            self.push_blank(cell)
+            cell = path[0]
+
+    def solve_line(self, cells, outward):
+        # Place tiles index + 1 on cells and lock them; outward is the index
+        # offset from the line into the rest of the region
+        for cell in cells[:-2]:
+            self.move_tile(cell + 1, cell)
+            self.locked[cell] = 1
+
+        second, last = cells[-2], cells[-1]
+        tiles = self.state.tiles
+        if tiles[second] != second + 1 or tiles[last] != last + 1:
+            # Park the last tile in the corner and the other one next to it,
+            # one step outward; then finish inside the window by BFS
+            self.move_tile(last + 1, last)
+            self.locked[last] = 1
+            self.move_tile(second + 1, second + outward)
+            self.locked[last] = 0
+            self.move_blank(last + outward, blocked=second + outward)
+            window = [second, last, second + outward, last + outward,
+                      second + 2 * outward, last + 2 * outward]
+            self.solve_window(window, second + 1, last + 1)
+        self.locked[second] = 1
+        self.locked[last] = 1
+
+    def solve_window(self, window, first_tile, second_tile):
+        # BFS over (blank, first, second) positions inside window; the other
+        # tiles of the window may end up anywhere
+        tiles = self.state.tiles
+        table = self.table
+        goal = (window[0], window[1])
+        start = (self.state.blank, tiles.index(first_tile), tiles.index(second_tile))
+        inside = set(window)
+        previous = {start: None}
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            if node[1:] == goal:
+                break
+            blank, first, second = node
+            for target in table[blank]:
+                if target not in inside:
+                    continue
+                if target == first:
+                    child = (target, blank, second)
+                elif target == second:
+                    child = (target, first, blank)
+                else:
+                    child = (target, first, second)
+                if child not in previous:
+                    previous[child] = node
+                    queue.append(child)
+        else:
+            raise RuntimeError('line cannot be finished inside its window')
+
+        blanks = []
+        while node != start:
+            blanks.append(node[0])
+            node = previous[node]
+        for cell in reversed(blanks):
+            self.push_blank(cell)
+
+    def solve_region(self, left, top):
+        # Solve the remaining bottom-right region as a small board of its own
+        width = self.width
+        region_width = width - left
+        region_height = self.height - top
+        tiles = []
+        for y in range(top, self.height):
+            for x in range(left, width):
+                tile = self.state.tiles[y * width + x]
+                if tile:
+                    goal_y, goal_x = divmod(tile - 1, width)
+                    tile = (goal_y - top) * region_width + (goal_x - left) + 1
+                tiles.append(tile)
+        region = PuzzleState(tiles, region_width, region_height)
+        if region.is_solved():
+            return
+        # Move names are the same on the region and on the whole board
+        for move in self.solver.small_solver(region):
+            self.state.apply(move)
+            self.moves.append(move)
@@ -0,0 +1,243 @@
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+
+try:
+    import resource  # 無い環境 (Windows) では最大 RSS を出さない
+except ImportError:
+    resource = None
+
+import pygame
+
+import main as game_module
+import puzzle_core
+from puzzle_core import UP, DOWN, LEFT, RIGHT
+
+# 画面なしでゲームを大量に動かす負荷・耐久テスト
+# Input events, random or from a script, go through SlidingPuzzle.frame(),
+# the same code the game loop runs, on the SDL dummy video driver. Frames are
+# not capped: each one advances the animations by a fixed simulated time.
+# Throughput and memory are reported while the run goes on, and memory growth
+# between the first and the last report shows leaks in long runs.
+#
+# Script lines (one frame each, '#' starts a comment):
+#   ULDR            arrow keys, one frame per letter
+#   click X Y       mouse click at window coordinates
+#   tap X Y         touch at window coordinates
+#   button NAME     reset, new, solve or hint
+#   key NAME        any key by its pygame name, e.g. h or f3
+#   resize W H      window resize
+#   wait N          N frames without input
+
+MOVE_KEYS = {UP: pygame.K_UP, DOWN: pygame.K_DOWN, LEFT: pygame.K_LEFT, RIGHT: pygame.K_RIGHT}
+REPORT_SECONDS = 5.0
+
+
+def key_event(key):
+    return pygame.event.Event(pygame.KEYUP, key=key, mod=0)
+
+
+def click_event(x, y):
+    return pygame.event.Event(pygame.MOUSEBUTTONUP, pos=(x, y), button=1, touch=False)
+
+
+def tap_event(game, x, y):
+    return pygame.event.Event(pygame.FINGERUP, x=x / game.window_width, y=y / game.window_height,
+                              touch_id=0, finger_id=0)
+
+
+def button_event(game, name):
+    return click_event(*game.button_rects[name].center)
+
+
+def random_event(game, rng, with_solver=False):
+    # One random input for the board on screen, or None for an idle frame
+    roll = rng.random()
+    if roll < 0.6:
+        return key_event(MOVE_KEYS[rng.choice(game.state.get_valid_moves())])
+    if roll < 0.9:
+        # 空白と同じ行・列とは限らないクリックも混ぜる
+        tilex = rng.randrange(game.board_width)
+        tiley = rng.randrange(game.board_height)
+        left, top = game.get_left_top_of_tile(tilex, tiley)
+        x, y = left + game.tile_size // 2, top + game.tile_size // 2
+        return click_event(x, y) if roll < 0.8 else tap_event(game, x, y)
+    if roll < 0.92:
+        return button_event(game, 'reset')
+    if with_solver and roll < 0.94:
+        return button_event(game, 'hint')
+    if with_solver and roll < 0.95:
+        return button_event(game, 'solve')
+    return None
+
+
+def parse_script(lines, game):
+    # Frames of events (a list per frame) from script lines
+    frames = []
+    for number, line in enumerate(lines, 1):
+        words = line.split('#', 1)[0].split()
+        if not words:
+            continue
+        command = words[0].lower()
+        try:
+            if command == 'click':
+                frames.append([click_event(int(words[1]), int(words[2]))])
+            elif command == 'tap':
+                frames.append([tap_event(game, int(words[1]), int(words[2]))])
+            elif command == 'button':
+                frames.append([button_event(game, words[1].lower())])
+            elif command == 'key':
+                frames.append([key_event(pygame.key.key_code(words[1]))])
+            elif command == 'resize':
+                width, height = int(words[1]), int(words[2])
+                frames.append([pygame.event.Event(pygame.VIDEORESIZE, w=width, h=height, size=(width, height))])
+            elif command == 'wait':
+                frames.extend([] for i in range(int(words[1])))
+            else:
+                frames.extend([key_event(MOVE_KEYS[move])] for move in puzzle_core.moves_from_text(command))
+        except (IndexError, KeyError, ValueError):
+            raise ValueError(f'line {number}: cannot read {line.strip()!r}')
+    return frames
+
+
+def get_max_rss_kb():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Simulation:
+    # Drives a headless SlidingPuzzle and collects throughput and memory
+
+    def __init__(self, game, frame_time=1.0 / game_module.FPS, trace_memory=False, report=print):
+        self.game = game
+        self.frame_time = frame_time
+        self.trace_memory = trace_memory
+        self.report = report
+        self.frames = 0
+        self.games = 0
+        self.start = None
+        self.reports = []
+        self.next_report = 0.0
+
+    def begin(self):
+        if self.trace_memory:
+            tracemalloc.start()
+        gc.collect()
+        self.start = time.perf_counter()
+        self.next_report = self.start + REPORT_SECONDS
+        self.sample()
+
+    def step(self, events):
+        # Run one frame; returns False if the game asked to quit
+        running = self.game.frame(events, self.frame_time)
+        self.frames += 1
+        if time.perf_counter() >= self.next_report:
+            self.sample()
+            self.next_report += REPORT_SECONDS
+        return running
+
+    def sample(self):
+        # Record (and print) throughput and memory so far
+        seconds = time.perf_counter() - self.start
+        sample = {
+            'seconds': round(seconds, 3),
+            'games': self.games,
+            'frames': self.frames,
+            'moves': self.game.move_count,
+            'frames_per_second': round(self.frames / seconds, 1) if seconds else 0.0,
+            'moves_per_second': round(self.game.move_count / seconds, 1) if seconds else 0.0,
+            'max_rss_kb': get_max_rss_kb(),
+        }
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            sample['traced_kb'] = current // 1024
+            sample['traced_peak_kb'] = peak // 1024
+        self.reports.append(sample)
+        if self.report is not None and self.frames:
+            memory = f", traced {sample['traced_kb']} KiB" if self.trace_memory else ''
+            rss = f", max RSS {sample['max_rss_kb']} KiB" if sample['max_rss_kb'] is not None else ''
+            self.report(f"{sample['seconds']:.1f}s: {self.games} games, {self.frames} frames "
+                        f"({sample['frames_per_second']}/s), {sample['moves']} moves "
+                        f"({sample['moves_per_second']}/s){rss}{memory}")
+        return sample
+
+    def finish(self):
+        # Final sample plus memory growth since the first one
+        gc.collect()
+        last = self.sample()
+        first = self.reports[0]
+        summary = dict(last)
+        for key in ('max_rss_kb', 'traced_kb'):
+            if first.get(key) is not None and last.get(key) is not None:
+                summary[key.replace('_kb', '_growth_kb')] = last[key] - first[key]
+        if self.trace_memory:
+            tracemalloc.stop()
+        return summary
+
+    def run_random(self, games, moves_per_game, rng, with_solver=False):
+        # games puzzles, each started with New and played with random input
+        for i in range(games):
+            self.step([button_event(self.game, 'new')])
+            self.games += 1
+            for j in range(moves_per_game):
+                event = random_event(self.game, rng, with_solver)
+                if not self.step([event] if event is not None else []):
+                    return
+
+    def run_script(self, frames, repeat=1):
+        for i in range(repeat):
+            self.games += 1
+            for events in frames:
+                if not self.step(events):
+                    return
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play many games without a display and report '
+                                                 'throughput and memory')
+    parser.add_argument('--games', type=int, default=100, help='random games to play')
+    parser.add_argument('--moves', type=int, default=200, help='random inputs per game')
+    parser.add_argument('--script', help='input script to play instead of random input')
+    parser.add_argument('--repeat', type=int, default=1, help='times to play the script')
+    parser.add_argument('--size', type=puzzle_core.parse_size, default=(puzzle_core.BOARD_SIZE,) * 2,
+                        help='board size, e.g. 3 or 4x5')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-render', action='store_true', help='skip drawing entirely')
+    parser.add_argument('--with-solver', action='store_true',
+                        help='random input also presses Hint and Solve (uses the solver process)')
+    parser.add_argument('--frame-time', type=float, default=1.0 / game_module.FPS,
+                        help='simulated seconds per frame for the animations')
+    parser.add_argument('--trace-memory', action='store_true', help='track Python allocations with tracemalloc')
+    parser.add_argument('--output', help='write the final summary as JSON')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    random.seed(args.seed)  # パズル生成は random モジュールを使う
+    game = game_module.SlidingPuzzle(game_module.generator.UNIFORM, False, None, *args.size, headless=True)
+    game.render = not args.no_render
+    simulation = Simulation(game, args.frame_time, args.trace_memory)
+    try:
+        if args.script:
+            with open(args.script) as f:
+                frames = parse_script(f, game)
+            simulation.begin()
+            simulation.run_script(frames, args.repeat)
+        else:
+            simulation.begin()
+            simulation.run_random(args.games, args.moves, rng, args.with_solver)
+        summary = simulation.finish()
+    finally:
+        game.close()
+
+    print(json.dumps(summary))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,11 @@
 import pygame
 import sys
-import random
 from pygame.locals import *
+import puzzle_core
+import solve_job
+from puzzle_core import BOARD_SIZE, UP, DOWN, LEFT, RIGHT
 
 # 定数
-BOARD_SIZE = 4
 TILE_SIZE = 100
 WINDOW_WIDTH = BOARD_SIZE * TILE_SIZE
 WINDOW_HEIGHT = BOARD_SIZE * TILE_SIZE
@@ -34,6 +35,7 @@ def main():
     main_board, solution_seq = generateNewPuzzle(80)
     SOLVEDBOARD = getStartingBoard()
     all_moves = []
+    job = None  # 別プロセスで実行中のソルバー (main.py と同じ経路)
 
     while True:  # メインゲームループ
         slideTo = None
@@ -43,26 +45,41 @@ def main():
         if main_board == SOLVEDBOARD:
             msg = 'クリア!'
 
+        if job is not None:
+            if job.done():
+                try:
+                    moves = job.result()
+                except Exception as e:
+                    print(f"Error during solve: {e}")
+                    moves = None
+                job = None
+                if moves:
+                    animateMoves(main_board, moves, int(TILE_SIZE / 2))
+                    all_moves = []
+            else:
+                msg = '解いています...'
+
         drawBoard(main_board, msg)
 
         for event in pygame.event.get():
             if event.type == QUIT:
-                pygame.quit()
-                sys.exit()
+                terminate()
             elif event.type == MOUSEBUTTONUP:
                 spotx, spoty = getSpotClicked(main_board, event.pos[0], event.pos[1])
 
                 if (spotx, spoty) == (None, None):
                     # ボタンがクリックされたかチェック
                     if RESET_RECT.collidepoint(event.pos):
+                        job = cancelSolve(job)
                         resetAnimation(main_board, all_moves)
                         all_moves = []
                     elif NEW_RECT.collidepoint(event.pos):
+                        job = cancelSolve(job)
                         main_board, solution_seq = generateNewPuzzle(80)
                         all_moves = []
-                    elif SOLVE_RECT.collidepoint(event.pos):
-                        resetAnimation(main_board, solution_seq + all_moves)
-                        all_moves = []
+                    elif SOLVE_RECT.collidepoint(event.pos) and job is None:
+                        # ソルバーはバックグラウンドで実行し、解けたら手順を表示
+                        job = solve_job.SolveJob(puzzle_core.PuzzleState.from_columns(main_board))
                 else:
                     # タイルがクリックされた
                     blankx, blanky = getBlankPosition(main_board)
@@ -87,13 +104,14 @@ def main():
                     slideTo = DOWN
                 elif event.key == K_r:
                     # リセット
+                    job = cancelSolve(job)
                     main_board, solution_seq = generateNewPuzzle(80)
                     all_moves = []
                 elif event.key == K_ESCAPE:
-                    pygame.quit()
-                    sys.exit()
+                    terminate()
 
         if slideTo:
+            job = cancelSolve(job)
             slideAnimation(main_board, slideTo, 'タイルをスライド', 8)
             makeMove(main_board, slideTo)
             all_moves.append(slideTo)
@@ -101,6 +119,18 @@ def main():
         pygame.display.update()
         FPSCLOCK.tick(FPS)
 
+def terminate():
+    # ソルバーのプロセスを止めて終了
+    solve_job.shutdown()
+    pygame.quit()
+    sys.exit()
+
+def cancelSolve(job):
+    # 盤面が変わるので実行中の探索を止める (None を返す)
+    if job is not None:
+        job.cancel()
+    return None
+
 def makeText(text, color, bgcolor, top, left):
     # テキストオブジェクトを作成
     textSurf = BASICFONT.render(text, True, color, bgcolor)
@@ -110,62 +140,23 @@ def makeText(text, color, bgcolor, top, left):
 
 def getStartingBoard():
     # 解決された状態のボードを返す
-    counter = 1
-    board = []
-    for x in range(BOARD_SIZE):
-        column = []
-        for y in range(BOARD_SIZE):
-            if counter == BOARD_SIZE * BOARD_SIZE:
-                column.append(None)
-            else:
-                column.append(counter)
-            counter += 1
-        board.append(column)
-    return board
+    return puzzle_core.get_starting_board(BOARD_SIZE)
 
 def getBlankPosition(board):
     # 空白の位置を返す
-    for x in range(BOARD_SIZE):
-        for y in range(BOARD_SIZE):
-            if board[x][y] is None:
-                return (x, y)
+    return puzzle_core.get_blank_position(board)
 
 def makeMove(board, move):
     # 指定された方向に移動
-    blankx, blanky = getBlankPosition(board)
-
-    if move == UP:
-        board[blankx][blanky], board[blankx][blanky + 1] = board[blankx][blanky + 1], board[blankx][blanky]
-    elif move == DOWN:
-        board[blankx][blanky], board[blankx][blanky - 1] = board[blankx][blanky - 1], board[blankx][blanky]
-    elif move == LEFT:
-        board[blankx][blanky], board[blankx + 1][blanky] = board[blankx + 1][blanky], board[blankx][blanky]
-    elif move == RIGHT:
-        board[blankx][blanky], board[blankx - 1][blanky] = board[blankx - 1][blanky], board[blankx][blanky]
+    puzzle_core.make_move(board, move)
 
 def isValidMove(board, move):
     # 指定された方向への移動が有効かどうかをチェック
-    blankx, blanky = getBlankPosition(board)
-    return (move == UP and blanky != BOARD_SIZE - 1) or \
-           (move == DOWN and blanky != 0) or \
-           (move == LEFT and blankx != BOARD_SIZE - 1) or \
-           (move == RIGHT and blankx != 0)
+    return puzzle_core.is_valid_move(board, move)
 
 def getRandomMove(board, lastMove=None):
     # ランダムな移動を取得（前回の移動と逆の移動は避ける）
-    validMoves = [UP, DOWN, LEFT, RIGHT]
-
-    # 前回の移動と逆の移動を削除
-    if lastMove == UP or not isValidMove(board, DOWN):
-        validMoves.remove(DOWN)
-    if lastMove == DOWN or not isValidMove(board, UP):
-        validMoves.remove(UP)
-    if lastMove == LEFT or not isValidMove(board, RIGHT):
-        validMoves.remove(RIGHT)
-    if lastMove == RIGHT or not isValidMove(board, LEFT):
-        validMoves.remove(LEFT)
-
-    return random.choice(validMoves)
+    return puzzle_core.get_random_move(board, lastMove)
 
 def getSpotClicked(board, x, y):
     # クリックされた位置のタイルを取得
@@ -212,19 +203,7 @@ def drawBoard(board, message):
 
 def slideAnimation(board, direction, message, animationSpeed):
     # タイルのスライドアニメーション
-    blankx, blanky = getBlankPosition(board)
-    if direction == UP:
-        movex = blankx
-        movey = blanky + 1
-    elif direction == DOWN:
-        movex = blankx
-        movey = blanky - 1
-    elif direction == LEFT:
-        movex = blankx + 1
-        movey = blanky
-    elif direction == RIGHT:
-        movex = blankx - 1
-        movey = blanky
+    movex, movey = puzzle_core.get_moved_tile_position(board, direction)
 
     # アニメーションの準備
     drawBoard(board, message)
@@ -267,28 +246,16 @@ def generateNewPuzzle(numSlides):
 
     return (board, sequence)
 
+def animateMoves(board, moves, animationSpeed):
+    # 手順を順番にアニメーションで表示
+    for move in moves:
+        slideAnimation(board, move, '', animationSpeed)
+        makeMove(board, move)
+
 def resetAnimation(board, allMoves):
     # リセットアニメーション
-    revAllMoves = allMoves[:]
-    revAllMoves.reverse()
-
-    for move in revAllMoves:
-        if move == UP:
-            oppositeMove = DOWN
-        elif move == DOWN:
-            oppositeMove = UP
-        elif move == RIGHT:
-            oppositeMove = LEFT
-        elif move == LEFT:
-            oppositeMove = RIGHT
-        slideAnimation(board, oppositeMove, '', int(TILE_SIZE / 2))
-        makeMove(board, oppositeMove)
-
-# 方向定数
-UP = 'up'
-DOWN = 'down'
-LEFT = 'left'
-RIGHT = 'right'
+    revAllMoves = [puzzle_core.get_opposite_move(move) for move in reversed(allMoves)]
+    animateMoves(board, revAllMoves, int(TILE_SIZE / 2))
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,193 @@
+import concurrent.futures
+import itertools
+import multiprocessing
+import queue
+
+import anytime_solver
+import engines
+import solver
+from puzzle_core import ALL_MOVES, MOVE_CODES, PuzzleState
+
+# ゲームループを止めずにバックグラウンドでソルバーを実行する
+# The search runs in a worker process so it never competes with the game
+# loop for the GIL. Progress and cancellation go through shared memory that
+# the worker inherits when it starts; the game polls the job once per frame.
+# Every job has its own cancel flag (a slot in a shared ring indexed by the
+# job number), so starting a job never waits for the previous one: a
+# cancelled search stops at its next check while the new job waits in the
+# executor's queue.
+# A job with a time budget runs the anytime solver where the board size has
+# one, and every shorter solution it finds is sent back through a queue
+# before the final (best) one is returned.
+
+_executor = None
+_shared = None
+_current_job = None
+_job_numbers = itertools.count(1)
+
+CANCEL_SLOTS = 64   # cancel flags of the most recent jobs (far more than are ever queued)
+
+# Worker side copies of the shared values
+_worker_nodes = None
+_worker_bound = None
+_worker_running = None
+_worker_cancel = None
+_worker_solutions = None
+_worker_number = 0
+
+
+def _init_worker(nodes, bound, running, cancel, solutions):
+    global _worker_nodes, _worker_bound, _worker_running, _worker_cancel, _worker_solutions
+    _worker_nodes = nodes
+    _worker_bound = bound
+    _worker_running = running
+    _worker_cancel = cancel
+    _worker_solutions = solutions
+
+
+def _is_cancelled():
+    return _worker_cancel[_worker_number % CANCEL_SLOTS]
+
+
+class _SharedProgressSolver(solver.IDAStarSolver):
+    # Publishes progress and watches the shared cancel flag
+
+    def check_cancelled(self):
+        _worker_nodes.value = self.nodes
+        _worker_bound.value = self.bound
+        if _is_cancelled():
+            raise solver.SolverCancelled()
+
+
+class _SharedProgressAnytimeSolver(anytime_solver.AnytimeSolver):
+    # Publishes progress (the bound is the proven lower bound) and watches
+    # the shared cancel flag
+
+    def check_cancelled(self):
+        _worker_nodes.value = self.nodes
+        _worker_bound.value = self.lower_bound
+        if _is_cancelled():
+            raise solver.SolverCancelled()
+
+
+def _solve(tiles, width, height, min_bound, max_bound, budget=None, number=0):
+    global _worker_number
+    _worker_number = number
+    # 進捗はこのジョブのものとして数え直す
+    _worker_nodes.value = 0
+    _worker_bound.value = 0
+    _worker_running.value = number
+    if _is_cancelled():
+        raise solver.SolverCancelled()
+    state = PuzzleState(tiles, width, height)
+    if budget is not None:
+        search = engines.create_anytime_solver(width, height, _SharedProgressAnytimeSolver)
+        if search is not None:
+            def report(moves, lower_bound):
+                _worker_solutions.put((number, bytes(MOVE_CODES[move] for move in moves), lower_bound))
+            try:
+                return search.solve(state, budget, report)
+            finally:
+                _worker_nodes.value = search.nodes
+    search = engines.create_solver(width, height, _SharedProgressSolver)
+    try:
+        if isinstance(search, solver.IDAStarSolver):
+            return search.solve(state, min_bound, max_bound)
+        return search.solve(state)
+    finally:
+        _worker_nodes.value = search.nodes
+
+
+def get_executor():
+    # One shared worker process, started on first use
+    global _executor, _shared
+    if _executor is None:
+        context = multiprocessing.get_context()
+        _shared = (context.Value('q', 0, lock=False),
+                   context.Value('i', 0, lock=False),
+                   context.Value('q', 0, lock=False),
+                   context.Array('b', CANCEL_SLOTS, lock=False),
+                   context.Queue())
+        _executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=1, mp_context=context,
+            initializer=_init_worker, initargs=_shared)
+    return _executor
+
+
+def shutdown():
+    # Cancel every job and stop the worker process
+    global _executor, _current_job
+    if _current_job is not None:
+        _current_job.cancel()
+        _current_job = None
+    if _executor is not None:
+        # 走っているのが前のジョブでも止める
+        _shared[3][:] = bytes([1]) * CANCEL_SLOTS
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+
+class SolveJob:
+    # A cancellable solve of a snapshot of the board; the bounds are passed
+    # to IDAStarSolver.solve (other engines ignore them). With a budget
+    # (seconds) the anytime solver is used where it applies: the first
+    # solution comes quickly and shorter ones follow until the budget is spent
+
+    def __init__(self, state, min_bound=0, max_bound=None, budget=None):
+        global _current_job
+        executor = get_executor()
+        self.cancelled = False
+        self.number = next(_job_numbers)
+        _shared[3][self.number % CANCEL_SLOTS] = 0
+        self.future = executor.submit(_solve, bytes(state.tiles), state.width, state.height,
+                                      min_bound, max_bound, budget, self.number)
+        _current_job = self
+
+    @property
+    def nodes(self):
+        # Nodes expanded so far (0 while the job waits for the worker)
+        if _shared[2].value != self.number:
+            return 0
+        return _shared[0].value
+
+    @property
+    def bound(self):
+        # Current IDA* f-bound (anytime solver: lower bound on the optimal length)
+        if _shared[2].value != self.number:
+            return 0
+        return _shared[1].value
+
+    def improvements(self):
+        # [(moves, lower bound)] of the shorter solutions reported since the
+        # last call, shortest last (budget jobs on the anytime solver only)
+        found = []
+        while True:
+            try:
+                number, codes, lower_bound = _shared[4].get_nowait()
+            except queue.Empty:
+                break
+            # 前のジョブの残りは捨てる
+            if number == self.number:
+                found.append(([ALL_MOVES[code] for code in codes], lower_bound))
+        return found
+
+    def done(self):
+        return self.future.done()
+
+    def cancel(self):
+        # Ask the search to stop; it notices within CANCEL_CHECK_MASK nodes
+        if not self.future.done():
+            self.future.cancel()
+            _shared[3][self.number % CANCEL_SLOTS] = 1
+        self.cancelled = True
+
+    def wait(self):
+        # Block until the worker has finished with this job
+        concurrent.futures.wait([self.future])
+
+    def result(self):
+        # Solution moves, or None if the job was cancelled (or max_bound was exceeded)
+        try:
+            return self.future.result(timeout=0)
+        except (solver.SolverCancelled, concurrent.futures.CancelledError):
+            return None
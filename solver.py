@@ -0,0 +1,412 @@
+import sys
+import time
+
+import pattern_db
+import puzzle_core
+from puzzle_core import ALL_MOVES, OPPOSITE_CODES, PuzzleState
+
+# IDA* ソルバー (マンハッタン距離 + リニアコンフリクト)
+# The heuristic is updated incrementally: a move only changes the Manhattan
+# distance of one tile and the linear conflicts of the two lines it crosses.
+
+# 4x4 の最長手数は 80 手なので再帰の深さには余裕を持たせる
+sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+
+
+class SolverCancelled(Exception):
+    # Raised inside a search after IDAStarSolver.cancel() was called
+    pass
+
+
+def _longest_increasing_length(values):
+    # Length of the longest strictly increasing subsequence (lines are short)
+    best = [1] * len(values)
+    for i in range(len(values)):
+        for j in range(i):
+            if values[j] < values[i] and best[j] + 1 > best[i]:
+                best[i] = best[j] + 1
+    return max(best, default=0)
+
+
+class ManhattanHeuristic:
+    # Manhattan distance plus linear conflicts for one board size
+    # Each row/column is also kept as an integer key (tile << shift * position)
+    # so that the search can look up line conflicts without building tuples.
+
+    def __init__(self, width, height=None):
+        if height is None:
+            height = width
+        self.width = width
+        self.height = height
+        self.shift = max(4, (width * height - 1).bit_length())
+        self.distance = puzzle_core.get_distance_table(width, height)
+
+        self.row_conflicts = [_ConflictTable(self, y, True) for y in range(height)]
+        self.column_conflicts = [_ConflictTable(self, x, False) for x in range(width)]
+
+    def row_keys(self, tiles):
+        width, shift = self.width, self.shift
+        return [sum(tiles[y * width + x] << (shift * x) for x in range(width))
+                for y in range(self.height)]
+
+    def column_keys(self, tiles):
+        width, shift = self.width, self.shift
+        return [sum(tiles[y * width + x] << (shift * y) for y in range(self.height))
+                for x in range(width)]
+
+    def manhattan(self, tiles):
+        distance = self.distance
+        return sum(distance[tile][index] for index, tile in enumerate(tiles) if tile)
+
+    def estimate(self, tiles):
+        # Full (non-incremental) heuristic value
+        total = self.manhattan(tiles)
+        for table, key in zip(self.row_conflicts, self.row_keys(tiles)):
+            total += table[key]
+        for table, key in zip(self.column_conflicts, self.column_keys(tiles)):
+            total += table[key]
+        return total
+
+    def root_info(self, tiles):
+        # (h, (row keys, column keys)) of a board, for searches that keep one
+        # entry per board
+        return self.estimate(tiles), (tuple(self.row_keys(tiles)), tuple(self.column_keys(tiles)))
+
+    def child_info(self, h, lines, tile, blank, target):
+        # (h, lines) after tile moves from target into the blank; as in the
+        # IDA* search only the two lines it crosses change their conflicts
+        width, shift = self.width, self.shift
+        row_keys, column_keys = lines
+        blank_y, blank_x = divmod(blank, width)
+        target_y, target_x = divmod(target, width)
+        h += self.distance[tile][blank] - self.distance[tile][target]
+        if blank_x == target_x:
+            bits = tile << (shift * blank_x)
+            rows = list(row_keys)
+            rows[blank_y] += bits
+            rows[target_y] -= bits
+            conflicts = self.row_conflicts
+            h += (conflicts[blank_y][rows[blank_y]] - conflicts[blank_y][row_keys[blank_y]]
+                  + conflicts[target_y][rows[target_y]] - conflicts[target_y][row_keys[target_y]])
+            columns = list(column_keys)
+            columns[blank_x] += (tile << (shift * blank_y)) - (tile << (shift * target_y))
+        else:
+            bits = tile << (shift * blank_y)
+            columns = list(column_keys)
+            columns[blank_x] += bits
+            columns[target_x] -= bits
+            conflicts = self.column_conflicts
+            h += (conflicts[blank_x][columns[blank_x]] - conflicts[blank_x][column_keys[blank_x]]
+                  + conflicts[target_x][columns[target_x]] - conflicts[target_x][column_keys[target_x]])
+            rows = list(row_keys)
+            rows[blank_y] += (tile << (shift * blank_x)) - (tile << (shift * target_x))
+        return h, (tuple(rows), tuple(columns))
+
+    def make_search(self, solver, tiles, path, found, perimeter=None, table=None, pruner=None):
+        # Return (search, h) for IDA*; search mutates tiles/path in place
+        # and fills found with the move codes of the solution. With a
+        # perimeter, boards inside it end the search with their known rest.
+        # last is a state of the move pruner (without one, the last move code)
+        # and a transposition table skips boards already expanded this iteration
+        width = self.width
+        moves = puzzle_core.get_move_table(width, self.height)
+        distance = self.distance
+        shift = self.shift
+        row_conflicts = self.row_conflicts
+        column_conflicts = self.column_conflicts
+        row_keys = self.row_keys(tiles)
+        column_keys = self.column_keys(tiles)
+        cancel_mask = solver.CANCEL_CHECK_MASK
+        goal_depth = 0 if perimeter is None else perimeter.depth
+        transitions = puzzle_core.REVERSAL_TRANSITIONS if pruner is None else pruner.transitions
+        if table is not None:
+            zobrist = table.zobrist.keys
+            visit = table.visit
+        board_key = 0 if table is None else table.zobrist.hash(tiles)
+
+        def search(blank, g, h, last, bound):
+            # Returns the smallest f that exceeded bound, or -1 when solved
+            nonlocal board_key
+            solver.nodes += 1
+            if not solver.nodes & cancel_mask:
+                solver.check_cancelled()
+            if h <= goal_depth:
+                # h never exceeds the true distance, so only these can be in the perimeter
+                if perimeter is None:
+                    found.extend(path)
+                    return -1
+                result = perimeter.check(tiles, g, h, bound, path, found)
+                if result is not None:
+                    return result
+            if table is not None and visit(board_key, g):
+                return 1 << 30
+            minimum = 1 << 30
+            blank_x = blank % width
+            blank_y = blank // width
+            targets = moves[blank]
+            states = transitions[last]
+            for code in range(4):
+                target = targets[code]
+                state = states[code]
+                if target < 0 or state < 0:
+                    continue
+                tile = tiles[target]
+                # Move the tile into the blank and update h incrementally
+                if code < 2:
+                    # Vertical move: only the two rows change their conflicts
+                    target_y = target // width
+                    bits = tile << (shift * blank_x)
+                    old_blank_row = row_keys[blank_y]
+                    old_target_row = row_keys[target_y]
+                    new_blank_row = old_blank_row + bits
+                    new_target_row = old_target_row - bits
+                    conflicts = row_conflicts[blank_y]
+                    delta = conflicts[new_blank_row] - conflicts[old_blank_row]
+                    conflicts = row_conflicts[target_y]
+                    delta += conflicts[new_target_row] - conflicts[old_target_row]
+                    child_h = h + distance[tile][blank] - distance[tile][target] + delta
+                    f = g + 1 + child_h
+                    if f <= bound:
+                        row_keys[blank_y] = new_blank_row
+                        row_keys[target_y] = new_target_row
+                        column_keys[blank_x] += (tile << (shift * blank_y)) - (tile << (shift * target_y))
+                        tiles[blank] = tile
+                        tiles[target] = 0
+                        path.append(code)
+                        if table is not None:
+                            board_key ^= zobrist[tile][target] ^ zobrist[tile][blank]
+                        result = search(target, g + 1, child_h, state, bound)
+                        if table is not None:
+                            board_key ^= zobrist[tile][target] ^ zobrist[tile][blank]
+                        path.pop()
+                        tiles[target] = tile
+                        tiles[blank] = 0
+                        column_keys[blank_x] -= (tile << (shift * blank_y)) - (tile << (shift * target_y))
+                        row_keys[blank_y] = old_blank_row
+                        row_keys[target_y] = old_target_row
+                    else:
+                        result = f
+                else:
+                    # Horizontal move: only the two columns change their conflicts
+                    target_x = target % width
+                    bits = tile << (shift * blank_y)
+                    old_blank_column = column_keys[blank_x]
+                    old_target_column = column_keys[target_x]
+                    new_blank_column = old_blank_column + bits
+                    new_target_column = old_target_column - bits
+                    conflicts = column_conflicts[blank_x]
+                    delta = conflicts[new_blank_column] - conflicts[old_blank_column]
+                    conflicts = column_conflicts[target_x]
+                    delta += conflicts[new_target_column] - conflicts[old_target_column]
+                    child_h = h + distance[tile][blank] - distance[tile][target] + delta
+                    f = g + 1 + child_h
+                    if f <= bound:
+                        column_keys[blank_x] = new_blank_column
+                        column_keys[target_x] = new_target_column
+                        row_keys[blank_y] += (tile << (shift * blank_x)) - (tile << (shift * target_x))
+                        tiles[blank] = tile
+                        tiles[target] = 0
+                        path.append(code)
+                        if table is not None:
+                            board_key ^= zobrist[tile][target] ^ zobrist[tile][blank]
+                        result = search(target, g + 1, child_h, state, bound)
+                        if table is not None:
+                            board_key ^= zobrist[tile][target] ^ zobrist[tile][blank]
+                        path.pop()
+                        tiles[target] = tile
+                        tiles[blank] = 0
+                        row_keys[blank_y] -= (tile << (shift * blank_x)) - (tile << (shift * target_x))
+                        column_keys[blank_x] = old_blank_column
+                        column_keys[target_x] = old_target_column
+                    else:
+                        result = f
+                if result == -1:
+                    return -1
+                if result < minimum:
+                    minimum = result
+            return minimum
+
+        return search, self.estimate(tiles)
+
+
+class _ConflictTable(dict):
+    # Lazily filled map from a line key to its linear conflict penalty
+
+    def __init__(self, heuristic, line, is_row):
+        super().__init__()
+        self.heuristic = heuristic
+        self.line = line
+        self.is_row = is_row
+
+    def __missing__(self, key):
+        heuristic = self.heuristic
+        width, shift = heuristic.width, heuristic.shift
+        mask = (1 << shift) - 1
+        length = width if self.is_row else heuristic.height
+        goals = []
+        for position in range(length):
+            tile = (key >> (shift * position)) & mask
+            if not tile:
+                continue
+            goal_y, goal_x = divmod(tile - 1, width)
+            if self.is_row and goal_y == self.line:
+                goals.append(goal_x)
+            elif not self.is_row and goal_x == self.line:
+                goals.append(goal_y)
+        value = 2 * (len(goals) - _longest_increasing_length(goals))
+        self[key] = value
+        return value
+
+
+class Perimeter:
+    # Every board within depth moves of the goal (a backward BFS) with its
+    # distance and one optimal move. A forward search that reaches it knows
+    # the rest of the path, and boards outside it are at least depth + 1
+    # moves away: bidirectional perimeter search
+
+    def __init__(self, width, height=None, depth=10):
+        if height is None:
+            height = width
+        self.width = width
+        self.height = height
+        self.depth = depth
+        table = puzzle_core.get_move_table(width, height)
+        solved = puzzle_core.get_solved_tiles(width, height)
+        self.entries = {solved: 0}  # board -> distance << 2 | move code toward the goal
+        layer = [solved]
+        for distance in range(1, depth + 1):
+            next_layer = []
+            for key in layer:
+                blank = key.index(0)
+                for code, target in enumerate(table[blank]):
+                    if target < 0:
+                        continue
+                    tiles = bytearray(key)
+                    tiles[blank] = tiles[target]
+                    tiles[target] = 0
+                    child = bytes(tiles)
+                    if child not in self.entries:
+                        self.entries[child] = distance << 2 | OPPOSITE_CODES[code]
+                        next_layer.append(child)
+            layer = next_layer
+
+    def __len__(self):
+        return len(self.entries)
+
+    def check(self, tiles, g, h, bound, path, found):
+        # For a board with h <= depth: -1 when solved within bound (found is
+        # filled), the f that exceeded bound, or None to keep searching
+        entry = self.entries.get(bytes(tiles))
+        if entry is None:
+            # 外側の盤面の手数は depth より大きく、h と偶奇が同じ
+            f = g + self.depth + 1 + ((self.depth + 1 - h) & 1)
+            return f if f > bound else None
+        f = g + (entry >> 2)
+        if f > bound:
+            return f
+        found.extend(path)
+        found.extend(self.get_path(tiles))
+        return -1
+
+    def get_path(self, tiles):
+        # Move codes from a board inside the perimeter to the goal
+        table = puzzle_core.get_move_table(self.width, self.height)
+        tiles = bytearray(tiles)
+        blank = tiles.index(0)
+        codes = []
+        entry = self.entries[bytes(tiles)]
+        while entry >= 4:
+            code = entry & 3
+            target = table[blank][code]
+            tiles[blank] = tiles[target]
+            tiles[target] = 0
+            blank = target
+            codes.append(code)
+            entry = self.entries[bytes(tiles)]
+        return codes
+
+
+_HEURISTICS = {}
+
+
+def get_heuristic(width, height=None):
+    # Heuristic tables are shared between searches on the same board size
+    if height is None:
+        height = width
+    heuristic = _HEURISTICS.get((width, height))
+    if heuristic is None:
+        # 生成済みのパターンデータベースがあればそちらを使う
+        heuristic = pattern_db.PatternDatabase.load_default(width, height)
+        if heuristic is None:
+            heuristic = ManhattanHeuristic(width, height)
+        _HEURISTICS[(width, height)] = heuristic
+    return heuristic
+
+
+class IDAStarSolver:
+    # Iterative deepening A* returning the shortest list of moves
+
+    # Searches call check_cancelled() once every CANCEL_CHECK_MASK + 1 nodes
+    CANCEL_CHECK_MASK = 1023
+
+    def __init__(self, heuristic=None, perimeter=None, table=None, pruner=None):
+        self.heuristic = heuristic
+        self.perimeter = perimeter  # optional Perimeter of the goal
+        self.table = table          # optional transposition.TranspositionTable
+        self.pruner = pruner        # optional transposition.MovePruner
+        self.nodes = 0
+        self.bound = 0
+        self.elapsed = 0.0
+        self.cancelled = False
+
+    def cancel(self):
+        # Stop a running solve (safe to call from another thread)
+        self.cancelled = True
+
+    def check_cancelled(self):
+        # Called periodically during the search (also a hook for progress)
+        if self.cancelled:
+            raise SolverCancelled()
+
+    def solve(self, state, min_bound=0, max_bound=None):
+        # Return the shortest move list that solves the state. A known lower
+        # bound (never above the optimal length) skips the shallow iterations;
+        # with max_bound, None is returned once the bound would exceed it
+        if isinstance(state, list):
+            state = PuzzleState.from_columns(state)
+        if not state.is_solvable():
+            raise ValueError('puzzle is not solvable')
+
+        heuristic = self.heuristic
+        if heuristic is None:
+            heuristic = get_heuristic(state.width, state.height)
+
+        path = []
+        found = []
+        search, h = heuristic.make_search(self, list(state.tiles), path, found, self.perimeter,
+                                          self.table, self.pruner)
+        first = 4 if self.pruner is None else self.pruner.start
+
+        start = time.perf_counter()
+        self.nodes = 0
+        bound = max(h, min_bound)
+        try:
+            while True:
+                if max_bound is not None and bound > max_bound:
+                    return None
+                self.bound = bound
+                self.check_cancelled()
+                if self.table is not None:
+                    self.table.new_iteration()
+                result = search(state.blank, 0, h, first, bound)
+                if result == -1:
+                    break
+                bound = result
+        finally:
+            self.elapsed = time.perf_counter() - start
+        return [ALL_MOVES[code] for code in found]
+
+
+def solve(state):
+    # Return the shortest list of moves that solves the board
+    return IDAStarSolver().solve(state)
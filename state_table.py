@@ -0,0 +1,229 @@
+import argparse
+import mmap
+import os
+import random
+import struct
+import time
+
+import puzzle_core
+from puzzle_core import ALL_MOVES, OPPOSITE_CODES, PuzzleState
+
+# 小さな盤面 (3x3 まで) の全状態テーブル
+#
+# A BFS from the solved board stores, for every solvable state, its optimal
+# distance and one optimal move, so solving is a walk of O(1) reads.
+#
+# States are indexed by blank position and the Lehmer rank of the other
+# tiles. Swapping the last two tiles only changes the lowest digit of the
+# rank and flips solvability, so rank // 2 numbers the solvable states of
+# each blank position densely: 9 * 8! / 2 = 181,440 entries for 3x3.
+# Each entry is one byte, distance << 2 | move code.
+
+TABLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pdb')
+MAGIC = b'STTB'
+VERSION = 1
+HEADER = struct.Struct('<4sBBB')
+MAX_TILES = 9
+
+
+def get_default_path(width, height=None):
+    if height is None:
+        height = width
+    return os.path.join(TABLE_DIR, f'{width}x{height}.states')
+
+
+def _factorial(n):
+    result = 1
+    for i in range(2, n + 1):
+        result *= i
+    return result
+
+
+def get_state_count(width, height):
+    # Number of solvable states
+    count = width * height
+    return count * (_factorial(count - 1) // 2)
+
+
+def rank(tiles):
+    # Dense index of a solvable state (row-major tiles, 0 for the blank)
+    values = [tile for tile in tiles if tile]
+    length = len(values)
+    code = 0
+    for i in range(length):
+        value = values[i]
+        smaller = 0
+        for j in range(i + 1, length):
+            if values[j] < value:
+                smaller += 1
+        code = code * (length - i) + smaller
+    return tiles.index(0) * (_factorial(length) // 2) + (code >> 1)
+
+
+def unrank(index, width, height):
+    # Row-major tiles of the solvable state with this index
+    count = width * height
+    half = _factorial(count - 1) // 2
+    blank, code = divmod(index, half)
+    code <<= 1
+    remaining = list(range(1, count))
+    values = []
+    for i in range(count - 1, 0, -1):
+        digit, code = divmod(code, _factorial(i - 1))
+        values.append(remaining.pop(digit))
+    values.insert(blank, 0)
+    if not puzzle_core.is_solvable(values, width, height):
+        # The odd half of the pair: swap the last two tiles back
+        first, second = [i for i, tile in enumerate(values) if tile][-2:]
+        values[first], values[second] = values[second], values[first]
+    return values
+
+
+def build(width, height=None):
+    # BFS from the solved board; returns the packed table
+    if height is None:
+        height = width
+    if width * height > MAX_TILES:
+        raise ValueError(f'{width}x{height} is too large for a full state table')
+    table = puzzle_core.get_move_table(width, height)
+    entries = bytearray(b'\xff') * get_state_count(width, height)
+
+    solved = puzzle_core.get_solved_tiles(width, height)
+    entries[rank(solved)] = 0
+    layer = [bytes(solved)]
+    distance = 0
+    while layer:
+        distance += 1
+        next_layer = []
+        for key in layer:
+            blank = key.index(0)
+            for code, target in enumerate(table[blank]):
+                if target < 0:
+                    continue
+                tiles = bytearray(key)
+                tiles[blank] = tiles[target]
+                tiles[target] = 0
+                index = rank(tiles)
+                if entries[index] == 255:
+                    # Undoing the move is optimal from the child
+                    entries[index] = distance << 2 | OPPOSITE_CODES[code]
+                    next_layer.append(bytes(tiles))
+        layer = next_layer
+    return entries
+
+
+def save(path, width, height, entries):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, width, height))
+        f.write(entries)
+
+
+class StateTable:
+    # Memory-mapped distance/best-move table for one small board size
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, width, height = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a state table file')
+        self.width = width
+        self.height = height
+        self.entries = memoryview(self._mmap)[HEADER.size:]
+        self.nodes = 0
+        self.elapsed = 0.0
+        self._by_distance = None
+
+    @classmethod
+    def load_default(cls, width, height=None, build_missing=True):
+        # Return the table in TABLE_DIR, building it first if needed
+        path = get_default_path(width, height)
+        if not os.path.exists(path):
+            if not build_missing or width * (height or width) > MAX_TILES:
+                return None
+            save(path, width, height or width, build(width, height))
+        return cls(path)
+
+    def close(self):
+        self.entries.release()
+        self._mmap.close()
+        self._file.close()
+
+    def distance(self, state):
+        # Optimal number of moves to solve the state
+        return self.entries[rank(state.tiles)] >> 2
+
+    def best_move(self, state):
+        # One optimal move, or None if the state is solved
+        entry = self.entries[rank(state.tiles)]
+        if entry < 4:
+            return None
+        return ALL_MOVES[entry & 3]
+
+    def solve(self, state):
+        # Return the shortest move list (one read per move)
+        if isinstance(state, list):
+            state = PuzzleState.from_columns(state)
+        if not state.is_solvable():
+            raise ValueError('puzzle is not solvable')
+        start = time.perf_counter()
+        entries = self.entries
+        table = puzzle_core.get_move_table(self.width, self.height)
+        tiles = bytearray(state.tiles)
+        blank = state.blank
+        moves = []
+        entry = entries[rank(tiles)]
+        while entry >= 4:
+            code = entry & 3
+            target = table[blank][code]
+            tiles[blank] = tiles[target]
+            tiles[target] = 0
+            blank = target
+            moves.append(ALL_MOVES[code])
+            entry = entries[rank(tiles)]
+        self.nodes = len(moves)
+        self.elapsed = time.perf_counter() - start
+        return moves
+
+    def random_state(self, distance, rng=random):
+        # A random state whose optimal solution is exactly distance moves
+        if self._by_distance is None:
+            self._by_distance = {}
+            for index, entry in enumerate(self.entries):
+                self._by_distance.setdefault(entry >> 2, []).append(index)
+        indexes = self._by_distance.get(distance)
+        if not indexes:
+            raise ValueError(f'no {self.width}x{self.height} board is {distance} moves from solved')
+        tiles = unrank(rng.choice(indexes), self.width, self.height)
+        return PuzzleState(tiles, self.width, self.height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the full state table of a small board')
+    parser.add_argument('--size', type=puzzle_core.parse_size, default=(3, 3), help='board size, e.g. 3 or 2x4')
+    parser.add_argument('--output', help='output file (default: pdb/<size>.states)')
+    args = parser.parse_args(argv)
+    width, height = args.size
+
+    path = args.output or get_default_path(width, height)
+    start = time.perf_counter()
+    save(path, width, height, build(width, height))
+    print(f'build time: {time.perf_counter() - start:.1f}s')
+
+    table = StateTable(path)
+    try:
+        counts = {}
+        for entry in table.entries:
+            counts[entry >> 2] = counts.get(entry >> 2, 0) + 1
+        print(f'file: {path} ({os.path.getsize(path)} bytes)')
+        print(f'states: {len(table.entries)}, longest solution: {max(counts)} moves')
+    finally:
+        table.close()
+
+
+if __name__ == '__main__':
+    main()
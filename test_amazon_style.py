@@ -0,0 +1,28 @@
+import os
+
+import pytest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+import pygame
+
+import amazon_style
+
+# numpy を使う描画と使わない描画が画素単位で同じこと (アトラスのキャッシュは numpy の有無を区別しない)
+
+SIZES = (37, 75, 100, 150, 600)  # 600: グラデーションが 0 で止まる大きさ
+
+
+def render_all(size):
+    surfaces = (amazon_style.create_tile_base(size),
+                amazon_style.create_amazon_background(size, size + 13),
+                amazon_style.create_amazon_logo(size, size // 3 + 5))
+    return [pygame.image.tobytes(surface, 'RGB') for surface in surfaces]
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_numpy_and_fallback_match(size, monkeypatch):
+    pytest.importorskip('numpy')
+    pygame.init()
+    with_numpy = render_all(size)
+    monkeypatch.setattr(amazon_style, 'numpy', None)
+    assert render_all(size) == with_numpy
@@ -0,0 +1,58 @@
+import random
+
+import pytest
+
+import anytime_solver
+import generator
+import state_table
+
+# 時間内に改善するソルバー: 解は常に有効で、最短と示したものは最短
+
+
+@pytest.fixture(scope='module')
+def table():
+    table = state_table.StateTable.load_default(3, 3)
+    yield table
+    table.close()
+
+
+def check_solution(state, moves):
+    state = state.copy()
+    for move in moves:
+        state.apply(move)
+    assert state.is_solved()
+
+
+def test_optimal_without_budget(table):
+    rng = random.Random(1)
+    for i in range(10):
+        state = generator.uniform_state(3, 3, rng)
+        search = anytime_solver.AnytimeSolver()
+        found = []
+        moves = search.solve(state, callback=lambda moves, lower_bound: found.append((len(moves), lower_bound)))
+        check_solution(state, moves)
+        assert search.optimal
+        assert len(moves) == table.distance(state)
+        # 改善のたびに短くなり、下界は最短手数を超えない
+        lengths = [length for length, lower_bound in found]
+        assert lengths == sorted(lengths, reverse=True) and lengths[-1] == len(moves)
+        assert all(lower_bound <= len(moves) for length, lower_bound in found)
+
+
+def test_budget_and_node_limit_still_return_a_solution():
+    rng = random.Random(2)
+    for i in range(3):
+        state, sequence = generator.random_walk_state(60, 4, 4, rng)
+        search = anytime_solver.AnytimeSolver(max_nodes=100)
+        moves = search.solve(state, budget=0.0)
+        check_solution(state, moves)
+        assert search.lower_bound <= len(moves)
+
+
+def test_solved_board(table):
+    state = generator.uniform_state(3, 3, random.Random(3))
+    for move in table.solve(state):
+        state.apply(move)
+    search = anytime_solver.AnytimeSolver()
+    assert search.solve(state) == []
+    assert search.optimal
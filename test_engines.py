@@ -0,0 +1,37 @@
+import random
+import time
+
+import engines
+import generator
+
+# 盤面サイズごとのソルバー選択: 強いヒューリスティックのない大きさも数秒以内に解けること
+
+TIME_LIMIT = 2.0  # seconds for one board
+
+
+def check_solves_quickly(width, height, count=5):
+    rng = random.Random(width * 100 + height)
+    for i in range(count):
+        state = generator.uniform_state(width, height, rng)
+        board = state.copy()
+        start = time.perf_counter()
+        moves = engines.solve(state)
+        assert time.perf_counter() - start < TIME_LIMIT
+        for move in moves:
+            board.move(move)
+        assert board.is_solved()
+
+
+def test_is_optimal():
+    assert engines.is_optimal(3, 3)
+    assert engines.is_optimal(2, 4)
+    assert not engines.is_optimal(3, 5)
+    assert not engines.is_optimal(2, 8)
+
+
+def test_solve_2x8():
+    check_solves_quickly(2, 8)
+
+
+def test_solve_3x5():
+    check_solves_quickly(3, 5)
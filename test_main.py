@@ -0,0 +1,16 @@
+import main
+import simulate
+
+# 画面なしのゲームを同じプロセスで作り直しても動くこと
+
+
+def test_recreate_headless_game():
+    for size in (4, 3, 4):
+        game = main.SlidingPuzzle(width=size, headless=True)
+        try:
+            game.message = 'test'
+            game.frame([], 0.03)
+            game.frame([simulate.button_event(game, 'new')], 0.03)
+            game.frame([], 0.03)
+        finally:
+            game.close()
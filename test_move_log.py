@@ -0,0 +1,62 @@
+import random
+
+import generator
+import move_log
+from puzzle_core import PuzzleState
+
+# 記録した手順とスナップショットを読み直し、すべての位置の盤面が一致すること
+
+
+def record_session(path, games, moves_per_game, snapshot_interval=5, seed=0):
+    # Write a session; returns (boards, moves) where boards[i] is the board
+    # move number i is played on (the new board where a game starts)
+    rng = random.Random(seed)
+    boards = []
+    moves = []
+    with move_log.MoveLogWriter(str(path), 3, 4, snapshot_interval) as writer:
+        for game in range(games):
+            state = generator.uniform_state(3, 4, rng)
+            writer.start(state)
+            if boards and len(boards) > len(moves):
+                boards.pop()  # 前のゲームの最後の盤面は新しい盤面で置き換わる
+            boards.append(state.copy())
+            for i in range(moves_per_game):
+                move = rng.choice(state.get_valid_moves())
+                writer.record(move)
+                state.apply(move)
+                moves.append(move)
+                boards.append(state.copy())
+    return boards, moves
+
+
+def test_board_at_every_index(tmp_path):
+    path = tmp_path / 'session.mlog'
+    boards, moves = record_session(path, 3, 13)
+    log = move_log.MoveLog(str(path))
+    assert len(log) == len(moves)
+    for index, board in enumerate(boards):
+        assert log.board_at(index).tiles == board.tiles, index
+
+
+def test_new_game_boundary(tmp_path):
+    # 13 手目で新しいゲームが始まる: その位置は新しい盤面を返す
+    path = tmp_path / 'session.mlog'
+    boards, moves = record_session(path, 2, 13)
+    log = move_log.MoveLog(str(path))
+    assert 13 in log.snapshot_indexes
+    assert log.board_at(13).tiles == boards[13].tiles
+    after = log.board_at(12)
+    after.apply(moves[12])
+    assert after.tiles != log.board_at(13).tiles
+
+
+def test_replay_round_trip(tmp_path):
+    path = tmp_path / 'session.mlog'
+    boards, moves = record_session(path, 3, 13)
+    log = move_log.MoveLog(str(path))
+    replayed = [item for item in log.replay() if not isinstance(item, PuzzleState)]
+    assert replayed == moves
+    new_boards = [item for item in log.replay() if isinstance(item, PuzzleState)]
+    assert [board.tiles for board in new_boards] == [boards[13].tiles, boards[26].tiles]
+    # 途中から再生しても同じ手が続く
+    assert [item for item in log.replay(20) if not isinstance(item, PuzzleState)] == moves[20:]
@@ -0,0 +1,39 @@
+import random
+
+import pytest
+
+import generator
+import parallel_solver
+import state_table
+
+# 並列 IDA*: 探索木を分割しても最短の解を返すこと
+
+
+@pytest.fixture(scope='module')
+def table():
+    table = state_table.StateTable.load_default(3, 3)
+    yield table
+    table.close()
+
+
+@pytest.mark.parametrize('bidirectional', [False, True])
+def test_parallel_is_optimal(table, monkeypatch, bidirectional):
+    # 3x3 の盤面でもプロセスで解くよう、1 プロセスで解く上限を下げる
+    monkeypatch.setattr(parallel_solver, 'SERIAL_BOUND', 8)
+    rng = random.Random(1)
+    with parallel_solver.ParallelIDAStarSolver(2, bidirectional, perimeter_depth=4, items_per_job=2) as search:
+        for i in range(6):
+            state = generator.uniform_state(3, 3, rng)
+            moves = search.solve(state)
+            assert len(moves) == table.distance(state)
+            assert search.items > 1
+            for move in moves:
+                state.apply(move)
+            assert state.is_solved()
+
+
+def test_split_covers_distinct_boards():
+    state = generator.uniform_state(4, 4, random.Random(2))
+    frontier = parallel_solver.split(state, 20)
+    assert len(frontier) >= 20
+    assert len({tiles for tiles, last, prefix in frontier}) == len(frontier)
@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+import generator
+import pattern_db
+import solver
+import state_table
+
+# パターンデータベース: 生成と読み込み、許容性 (最短手数を超えない)
+
+
+@pytest.fixture(scope='module')
+def database(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('pdb') / '3x3.pdb')
+    partition = pattern_db.PARTITIONS[(3, 3)]['4-4']
+    pattern_db.build(3, 3, partition, path, report=lambda line: None)
+    database = pattern_db.PatternDatabase(path)
+    yield database
+    database.close()
+
+
+@pytest.fixture(scope='module')
+def table():
+    table = state_table.StateTable.load_default(3, 3)
+    yield table
+    table.close()
+
+
+def test_load(database):
+    assert (database.width, database.height) == (3, 3)
+    assert database.partition == [tuple(tiles) for tiles in pattern_db.PARTITIONS[(3, 3)]['4-4']]
+    assert database.estimate(bytes([1, 2, 3, 4, 5, 6, 7, 8, 0])) == 0
+
+
+def test_admissible_and_above_manhattan(database, table):
+    rng = random.Random(1)
+    manhattan = solver.ManhattanHeuristic(3, 3)
+    for i in range(500):
+        state = generator.uniform_state(3, 3, rng)
+        h = database.estimate(state.tiles)
+        assert h <= table.distance(state)
+        assert h % 2 == table.distance(state) % 2
+        assert h >= sum(database.distance[tile][index] for index, tile in enumerate(state.tiles) if tile)
+        assert manhattan.estimate(state.tiles) <= table.distance(state)
+
+
+def test_incremental_h_matches_estimate(database):
+    rng = random.Random(2)
+    state = generator.uniform_state(3, 3, rng)
+    h, keys = database.root_info(bytes(state.tiles))
+    for i in range(200):
+        move = rng.choice(state.get_valid_moves())
+        blank = state.blank
+        target = state.get_moved_tile_index(move)
+        tile = state.tiles[target]
+        state.apply(move)
+        h, keys = database.child_info(h, keys, tile, blank, target)
+        assert h == database.estimate(state.tiles)
+
+
+def test_ida_with_database_is_optimal(database, table):
+    rng = random.Random(3)
+    for i in range(20):
+        state = generator.uniform_state(3, 3, rng)
+        moves = solver.IDAStarSolver(database).solve(state)
+        assert len(moves) == table.distance(state)
+        for move in moves:
+            state.apply(move)
+        assert state.is_solved()
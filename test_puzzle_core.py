@@ -0,0 +1,77 @@
+import random
+
+import pytest
+
+import generator
+import puzzle_core
+from puzzle_core import ALL_MOVES, DOWN, LEFT, RIGHT, UP, PuzzleState
+
+# 盤面の状態 (bytearray と空白の位置) と移動処理
+
+
+def test_columns_and_text_round_trip():
+    state = generator.uniform_state(3, 4, random.Random(1))
+    assert PuzzleState.from_columns(state.to_columns()).tiles == state.tiles
+    assert PuzzleState.from_text(state.to_text(), 3, 4).tiles == state.tiles
+
+
+def test_apply_keeps_blank_index():
+    rng = random.Random(2)
+    state = PuzzleState(width=4, height=3)
+    for i in range(200):
+        state.apply(rng.choice(state.get_valid_moves()))
+        assert state.tiles[state.blank] == 0
+
+
+def test_undo_restores_board():
+    rng = random.Random(3)
+    state = PuzzleState(width=4)
+    for i in range(50):
+        state.move(rng.choice(state.get_valid_moves()))
+    while state.undo() is not None:
+        pass
+    assert state.is_solved()
+
+
+def test_invalid_move_raises():
+    state = PuzzleState(width=3)
+    # 空白は右下の角: 上と左のタイルしか空白に入れない
+    assert sorted(state.get_valid_moves()) == sorted([DOWN, RIGHT])
+    with pytest.raises(ValueError):
+        state.apply(UP)
+    with pytest.raises(ValueError):
+        state.apply(LEFT)
+
+
+def test_slide_equals_single_moves():
+    rng = random.Random(4)
+    for i in range(100):
+        state = generator.uniform_state(5, 4, rng)
+        move = rng.choice(ALL_MOVES)
+        limit = state.get_slide_limit(move)
+        if not limit:
+            continue
+        count = rng.randint(1, limit)
+        slid = state.copy()
+        slid.apply_slide(move, count)
+        for j in range(count):
+            state.apply(move)
+        assert slid.tiles == state.tiles and slid.blank == state.blank
+
+
+def test_scramble_stays_solvable():
+    rng = random.Random(5)
+    for size in ((3, 3), (4, 4), (2, 5)):
+        state = PuzzleState(width=size[0], height=size[1])
+        state.scramble(101, rng)
+        assert state.is_solvable()
+        assert generator.uniform_state(*size, rng).is_solvable()
+
+
+def test_compressed_slides_round_trip():
+    rng = random.Random(6)
+    moves = [rng.choice(ALL_MOVES) for i in range(300)]
+    slides = puzzle_core.compress_moves(moves)
+    assert puzzle_core.expand_slides(slides) == moves
+    assert puzzle_core.slides_from_text(puzzle_core.slides_to_text(slides)) == slides
+    assert puzzle_core.decode_slides(puzzle_core.encode_slides(slides)) == slides
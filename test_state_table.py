@@ -0,0 +1,59 @@
+import itertools
+import random
+
+import generator
+import puzzle_core
+import solver
+import state_table
+
+# 全状態テーブル: 順位付けの往復と最短手数
+
+
+def build_table(tmp_path, width, height):
+    path = str(tmp_path / f'{width}x{height}.states')
+    state_table.save(path, width, height, state_table.build(width, height))
+    return state_table.StateTable(path)
+
+
+def test_rank_unrank_round_trip_2x3():
+    # 可解な盤面すべてが 0 から数えた連続した番号になる
+    count = state_table.get_state_count(2, 3)
+    ranks = set()
+    for tiles in itertools.permutations(range(6)):
+        if puzzle_core.is_solvable(tiles, 2, 3):
+            index = state_table.rank(tiles)
+            assert state_table.unrank(index, 2, 3) == list(tiles)
+            ranks.add(index)
+    assert ranks == set(range(count))
+
+
+def test_rank_unrank_round_trip_3x3():
+    rng = random.Random(1)
+    for i in range(500):
+        tiles = list(generator.uniform_state(3, 3, rng).tiles)
+        assert state_table.unrank(state_table.rank(tiles), 3, 3) == tiles
+
+
+def test_distance_matches_ida(tmp_path):
+    table = build_table(tmp_path, 2, 4)
+    try:
+        rng = random.Random(2)
+        for i in range(30):
+            state = generator.uniform_state(2, 4, rng)
+            moves = table.solve(state)
+            assert len(moves) == table.distance(state) == len(solver.IDAStarSolver().solve(state))
+            for move in moves:
+                state.apply(move)
+            assert state.is_solved()
+    finally:
+        table.close()
+
+
+def test_random_state_distance(tmp_path):
+    table = build_table(tmp_path, 3, 2)
+    try:
+        rng = random.Random(3)
+        for distance in (0, 5, 21):
+            assert table.distance(table.random_state(distance, rng)) == distance
+    finally:
+        table.close()
@@ -0,0 +1,66 @@
+import random
+
+import pytest
+
+import generator
+import solver
+import state_table
+import transposition
+
+# 置換表と手順の枝刈りを使っても IDA* の解が最短のままであること
+
+
+@pytest.fixture(scope='module')
+def table():
+    table = state_table.StateTable.load_default(3, 3)
+    yield table
+    table.close()
+
+
+@pytest.mark.parametrize('max_bytes,pruner_length', [(1 << 20, 0), (0, 6), (1 << 20, 6), (1 << 10, 8)])
+def test_optimal_on_3x3(table, max_bytes, pruner_length):
+    rng = random.Random(max_bytes + pruner_length)
+    tt = transposition.TranspositionTable(3, 3, max_bytes) if max_bytes else None
+    pruner = transposition.get_move_pruner(pruner_length) if pruner_length else None
+    for i in range(15):
+        state = generator.uniform_state(3, 3, rng)
+        moves = solver.IDAStarSolver(table=tt, pruner=pruner).solve(state)
+        assert len(moves) == table.distance(state)
+        for move in moves:
+            state.apply(move)
+        assert state.is_solved()
+
+
+def test_same_length_as_plain_ida_on_4x4():
+    rng = random.Random(1)
+    tt = transposition.TranspositionTable(4, 4, 1 << 20)
+    pruner = transposition.get_move_pruner(6)
+    for i in range(5):
+        state, sequence = generator.random_walk_state(30, 4, 4, rng)
+        plain = solver.IDAStarSolver().solve(state)
+        moves = solver.IDAStarSolver(table=tt, pruner=pruner).solve(state)
+        assert len(moves) == len(plain)
+        for move in moves:
+            state.apply(move)
+        assert state.is_solved()
+
+
+def test_table_detects_duplicates():
+    tt = transposition.TranspositionTable(3, 3, 0)
+    key = tt.zobrist.hash(bytes([1, 2, 3, 4, 5, 6, 7, 8, 0]))
+    assert not tt.visit(key, 5)
+    assert tt.visit(key, 5)
+    assert tt.visit(key, 7)
+    assert not tt.visit(key, 3)  # 根に近い g では展開し直す
+    tt.new_iteration()
+    assert not tt.visit(key, 7)
+
+
+def test_pruner_rejects_cycles():
+    pruner = transposition.get_move_pruner(6)
+    for code in range(4):
+        # すぐ戻る手
+        assert pruner.walk([code, (1, 0, 3, 2)[code]]) == -1
+    # 2x2 の巡回 (空白が上・左・下・右と回って元に戻る) のどこかで枝刈りされる
+    assert pruner.walk([0, 2, 1, 3] * 3) == -1
+    assert pruner.count_sequences(10) < 4 * 3 ** 9
@@ -0,0 +1,310 @@
+import argparse
+import random
+import time
+from array import array
+from collections import deque
+
+from puzzle_core import OPPOSITE_CODES
+
+# 探索の重複を減らす: Zobrist ハッシュの置換表と有限状態機械による手順の枝刈り
+#
+# TranspositionTable records, per board, the smallest g at which the current
+# IDA* iteration expanded it. A board reached again with a g at least as
+# large is not expanded a second time: the earlier expansion had at least as
+# much of the bound left, and it came first in depth-first (lexicographic)
+# order, so the solution and the next bound are unchanged. Boards are keyed by
+# a 64-bit Zobrist hash that the search updates with two XORs per move. The
+# table is direct-mapped with a fixed number of slots allocated up front (a
+# hard memory cap); see TranspositionTable for the replacement policy.
+#
+# MovePruner is a finite-state machine over move codes that rejects move
+# sequences with a known equivalent: sequences that bring the blank and every
+# tile back where they were (cycles), and sequences reaching the same board as
+# a shorter or lexicographically smaller one that keeps the blank inside the
+# cells the longer one visited (so the alternative is legal on any board size
+# wherever the longer one is). Only one of each group of equivalent sequences
+# survives. The searches try moves in code order, so the kept sequence is
+# always the one met first. With sequences of up to 8 moves this removes the
+# cycles around 2x2 blocks and a quarter of the nodes of a 4x4 search, at the
+# cost of one table lookup per move, the same as the plain "no reverse move"
+# rule it replaces.
+#
+# Both are optional arguments of solver.IDAStarSolver, which passes them to
+# the heuristic's make_search.
+
+TABLE_BYTES = 16 << 20   # default memory cap of a TranspositionTable
+ENTRY_BYTES = 12         # 8-byte key + 4-byte value per slot
+MIN_TABLE_SLOTS = 1 << 10
+MAX_ITERATIONS = 1 << 24  # iteration numbers fit above g in a 32-bit slot
+PRUNER_LENGTH = 8        # longest sequence compared when building a MovePruner
+
+# Blank step (dx, dy) of each move code: the tile moves the other way
+BLANK_STEPS = ((0, 1), (0, -1), (1, 0), (-1, 0))  # UP, DOWN, LEFT, RIGHT
+
+
+class ZobristKeys:
+    # Random 64-bit key per (tile, index); the blank has none
+
+    def __init__(self, width, height=None, seed=0):
+        if height is None:
+            height = width
+        self.width = width
+        self.height = height
+        rng = random.Random(seed)
+        size = width * height
+        self.keys = [[0] * size] + [[rng.getrandbits(64) for index in range(size)]
+                                    for tile in range(1, size)]
+
+    def hash(self, tiles):
+        keys = self.keys
+        value = 0
+        for index, tile in enumerate(tiles):
+            value ^= keys[tile][index]
+        return value
+
+    def update(self, value, tile, source, destination):
+        # Hash after tile moved from source to destination
+        keys = self.keys[tile]
+        return value ^ keys[source] ^ keys[destination]
+
+
+class TranspositionTable:
+    # Direct-mapped table of boards expanded in the current iteration
+    # Each slot packs iteration number << 8 | g. Replacement policy: a slot
+    # from an earlier iteration is free; a slot holding another board of this
+    # iteration is only taken by a board nearer the root (smaller g), whose
+    # subtree is larger and more likely to be reached again.
+
+    def __init__(self, width, height=None, max_bytes=TABLE_BYTES, seed=0):
+        if height is None:
+            height = width
+        self.width = width
+        self.height = height
+        self.zobrist = ZobristKeys(width, height, seed)
+        slots = max(MIN_TABLE_SLOTS, max_bytes // ENTRY_BYTES)
+        self.slots = 1 << (slots.bit_length() - 1)  # power of two, never above the cap
+        self.mask = self.slots - 1
+        self.clear()
+
+    def clear(self):
+        self.keys = array('Q', bytes(8 * self.slots))
+        self.values = array('I', bytes(4 * self.slots))
+        self.iteration = 1  # 0 marks the empty slots
+        self.current = self.iteration << 8
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.replaced = 0
+        self.rejected = 0
+
+    def get_size_bytes(self):
+        return self.keys.itemsize * len(self.keys) + self.values.itemsize * len(self.values)
+
+    def new_iteration(self):
+        # Forget every board (without touching the slots) before a new bound
+        if self.iteration + 1 >= MAX_ITERATIONS:
+            self.clear()
+            return
+        self.iteration += 1
+        self.current = self.iteration << 8
+
+    def visit(self, key, g):
+        # True if the board was already expanded at g or less in this
+        # iteration; otherwise it is recorded (if the policy allows) and False
+        self.probes += 1
+        index = key & self.mask
+        value = self.values[index]
+        current = self.current
+        if value >= current:
+            if self.keys[index] == key:
+                if value - current <= g:
+                    self.hits += 1
+                    return True
+            elif value - current <= g:
+                self.rejected += 1
+                return False
+            else:
+                self.replaced += 1
+        self.keys[index] = key
+        self.values[index] = current | g
+        self.stores += 1
+        return False
+
+    def get_used(self):
+        # Slots holding a board of the current iteration
+        current = self.current
+        return sum(1 for value in self.values if value >= current)
+
+    def stats(self):
+        # Counters for tuning; hit_rate is duplicates found per probe
+        return {
+            'slots': self.slots,
+            'bytes': self.get_size_bytes(),
+            'used': self.get_used(),
+            'probes': self.probes,
+            'hits': self.hits,
+            'hit_rate': self.hits / self.probes if self.probes else 0.0,
+            'stores': self.stores,
+            'replaced': self.replaced,
+            'rejected': self.rejected,
+        }
+
+
+def find_duplicate_sequences(max_length=PRUNER_LENGTH):
+    # Minimal move-code sequences (tuples) that have an equivalent kept
+    # sequence, found breadth-first on an unbounded board. Cells are (x, y)
+    # relative to the starting blank; a tile is named by its starting cell
+    forbidden = [(code, OPPOSITE_CODES[code]) for code in range(4)]
+    forbidden_set = set(forbidden)
+    lengths = {2}  # lengths of the forbidden sequences so far
+    origin = (0, 0)
+    # effect (blank, moved tiles) -> cell sets of the kept sequences with it
+    kept = {(origin, ()): [frozenset((origin,))]}
+    level = [((), origin, {}, frozenset((origin,)))]
+    for length in range(1, max_length + 1):
+        next_level = []
+        # 親は辞書順に並んでいるので、子も長さごと・辞書順に調べられる
+        for codes, blank, board, cells in level:
+            for code in range(4):
+                sequence = codes + (code,)
+                # 接頭辞は検査済みなので、新しい手で終わる部分列だけを見る
+                if any(sequence[-size:] in forbidden_set for size in lengths if size <= length):
+                    continue
+                step_x, step_y = BLANK_STEPS[code]
+                cell = (blank[0] + step_x, blank[1] + step_y)
+                child_board = dict(board)
+                tile = child_board.pop(cell, cell)
+                if tile != blank:
+                    child_board[blank] = tile
+                child_cells = cells | {cell}
+                effect = (cell, tuple(sorted(child_board.items())))
+                others = kept.setdefault(effect, [])
+                if any(other <= child_cells for other in others):
+                    forbidden.append(sequence)
+                    forbidden_set.add(sequence)
+                    lengths.add(length)
+                    continue
+                others.append(child_cells)
+                next_level.append((sequence, cell, child_board, child_cells))
+        level = next_level
+    return forbidden
+
+
+class MovePruner:
+    # Automaton over move codes: transitions[state][code] is the next state,
+    # or -1 when the move completes a forbidden sequence
+
+    def __init__(self, max_length=PRUNER_LENGTH):
+        self.max_length = max_length
+        self.patterns = find_duplicate_sequences(max_length)
+
+        # Aho-Corasick: a trie of the patterns with failure links
+        children = [{}]
+        terminal = [False]
+        for pattern in self.patterns:
+            node = 0
+            for code in pattern:
+                child = children[node].get(code)
+                if child is None:
+                    child = len(children)
+                    children[node][code] = child
+                    children.append({})
+                    terminal.append(False)
+                node = child
+            terminal[node] = True
+
+        goto = [[0] * 4 for node in children]
+        fail = [0] * len(children)
+        queue = deque()
+        for code in range(4):
+            child = children[0].get(code)
+            if child is not None:
+                goto[0][code] = child
+                queue.append(child)
+        while queue:
+            node = queue.popleft()
+            terminal[node] = terminal[node] or terminal[fail[node]]
+            for code in range(4):
+                child = children[node].get(code)
+                if child is None:
+                    goto[node][code] = goto[fail[node]][code]
+                else:
+                    fail[child] = goto[fail[node]][code]
+                    goto[node][code] = child
+                    queue.append(child)
+
+        # 到達できる (禁止でない) 状態だけに番号を付け直す
+        numbers = {0: 0}
+        order = [0]
+        for node in order:
+            for code in range(4):
+                child = goto[node][code]
+                if not terminal[child] and child not in numbers:
+                    numbers[child] = len(order)
+                    order.append(child)
+        self.transitions = tuple(
+            tuple(-1 if terminal[goto[node][code]] else numbers[goto[node][code]] for code in range(4))
+            for node in order)
+        self.start = 0
+
+    def __len__(self):
+        return len(self.transitions)
+
+    def walk(self, codes, state=None):
+        # State after a sequence of move codes, or -1 if it is pruned
+        if state is None:
+            state = self.start
+        for code in codes:
+            state = self.transitions[state][code]
+            if state < 0:
+                break
+        return state
+
+    def count_sequences(self, length):
+        # Sequences of the given length the automaton accepts (unbounded board)
+        counts = {self.start: 1}
+        for i in range(length):
+            next_counts = {}
+            for state, count in counts.items():
+                for next_state in self.transitions[state]:
+                    if next_state >= 0:
+                        next_counts[next_state] = next_counts.get(next_state, 0) + count
+            counts = next_counts
+        return sum(counts.values())
+
+
+_PRUNERS = {}
+
+
+def get_move_pruner(max_length=PRUNER_LENGTH):
+    # Pruners are built once per length and shared (they do not depend on the board size)
+    pruner = _PRUNERS.get(max_length)
+    if pruner is None:
+        pruner = MovePruner(max_length)
+        _PRUNERS[max_length] = pruner
+    return pruner
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build move pruners and show how many sequences they remove')
+    parser.add_argument('--length', type=int, nargs='+', default=[2, 6, PRUNER_LENGTH],
+                        help='longest duplicate sequence to look for (2 is the plain no-reverse rule)')
+    parser.add_argument('--depth', type=int, default=20, help='sequence length to count')
+    args = parser.parse_args(argv)
+
+    for length in args.length:
+        start = time.perf_counter()
+        pruner = MovePruner(length)
+        elapsed = time.perf_counter() - start
+        count = pruner.count_sequences(args.depth)
+        # 逆戻りだけを禁止したときの数 4 * 3^(depth - 1) と比べる
+        ratio = count / (4 * 3 ** (args.depth - 1))
+        print(f'length {length}: {len(pruner.patterns)} patterns, {len(pruner)} states, built in {elapsed:.2f}s; '
+              f'{count} sequences of {args.depth} moves ({ratio:.1%} of no-reverse)')
+
+
+if __name__ == '__main__':
+    main()